@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0005_alter_defect_confirmed_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defect',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1, verbose_name='Количество'),
+        ),
+    ]
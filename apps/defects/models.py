@@ -93,9 +93,42 @@ class Defect(models.Model):
     )
     penalty_applied = models.BooleanField('Штраф применен', default=False)
 
+    # Количество единиц брака в записи (см. Defect.create_for_task)
+    quantity = models.PositiveIntegerField('Количество', default=1)
+
     def __str__(self):
         return f"Брак: {self.product} ({self.user}) - {self.get_status_display()}"
 
+    @classmethod
+    def create_for_task(cls, task, count):
+        """Создаёт записи брака по задаче сотрудника через bulk_create.
+
+        По умолчанию каждая единица брака — отдельная запись (мастер
+        подтверждает их по одной); при DEFECTS_GROUP_UNITS = True N единиц
+        сохраняются одной записью с quantity=N.
+        """
+        from django.conf import settings
+
+        if count <= 0:
+            return []
+        stage = task.stage
+        if stage.order_item_id:
+            product_id = stage.order_item.product_id
+        else:
+            product_id = getattr(getattr(stage, 'order', None), 'product_id', None)
+        fields = dict(employee_task=task, product_id=product_id, user_id=task.employee_id, status=cls.DefectStatus.PENDING)
+        if getattr(settings, 'DEFECTS_GROUP_UNITS', False):
+            defects = [cls(quantity=count, **fields)]
+        else:
+            defects = [cls(**fields) for _ in range(count)]
+        defects = cls.objects.bulk_create(defects)
+
+        # bulk_create не вызывает post_save — дневную сводку помечаем явно
+        from apps.odashboard.facts import mark_dirty
+        from apps.odashboard.models import DailyProductionFact
+        mark_dirty(DailyProductionFact.SOURCE_DEFECT, defects[0].created_at, task.employee_id)
+        return defects
+
     def get_workshop(self):
         """Возвращает цех, в котором работает сотрудник, создавший брак"""
         return self.user.workshop if self.user else None
@@ -150,16 +183,20 @@ class Defect(models.Model):
         self.save()
     
     def _apply_penalty(self, amount=None):
-        """Применяет штраф за ручной брак к задаче сотрудника после подтверждения"""
+        """Применяет штраф за ручной брак к задаче сотрудника после подтверждения.
+
+        amount и штраф услуги цеха — за единицу брака: запись с quantity=N
+        (DEFECTS_GROUP_UNITS = True) штрафуется как N отдельных записей.
+        """
         if self.user and self.user.workshop and self.employee_task:
-            from apps.services.models import Service
+            from apps.services import resolver
             try:
+                if amount is None:
+                    service = resolver.workshop_service(self.user.workshop_id)
+                    if service:
+                        amount = service.defect_penalty
                 if amount is not None:
-                    self.penalty_amount = amount
-                else:
-                    service = Service.objects.filter(workshop=self.user.workshop, is_active=True).first()
-                    if service and hasattr(service, 'defect_penalty'):
-                        self.penalty_amount = service.defect_penalty
+                    self.penalty_amount = amount * (self.quantity or 1)
                 self.penalty_applied = True
                 
                 # Накопительно увеличиваем дополнительные штрафы, затем пересчитываем чистый заработок
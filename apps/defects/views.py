@@ -3,7 +3,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q, Count
+from django.db.models import Q, Sum
 from django.utils import timezone
 from .models import Defect
 from .serializers import DefectSerializer, DefectConfirmationSerializer, DefectRepairSerializer, DefectListSerializer
@@ -182,32 +182,27 @@ def close_defect(request, defect_id):
 def defects_stats(request):
     """Статистика браков"""
     try:
-        # Общая статистика
-        total_defects = Defect.objects.count()
-        pending_confirmation = Defect.objects.filter(status='pending').count()
-        repairable = Defect.objects.filter(status='repairable').count()
-        repaired = Defect.objects.filter(status='repaired').count()
-        irreparable = Defect.objects.filter(status='irreparable').count()
-        closed = Defect.objects.filter(status='closed').count()
-        
-        # Статистика по типам браков
-        technical_defects = Defect.objects.filter(defect_type='technical').count()
-        manual_defects = Defect.objects.filter(defect_type='manual').count()
+        # Общая статистика — в единицах брака: запись может хранить
+        # несколько единиц (quantity при DEFECTS_GROUP_UNITS = True)
+        totals = Defect.objects.aggregate(
+            total_defects=Sum('quantity', default=0),
+            pending_confirmation=Sum('quantity', default=0, filter=Q(status='pending')),
+            repairable=Sum('quantity', default=0, filter=Q(status='repairable')),
+            repaired=Sum('quantity', default=0, filter=Q(status='repaired')),
+            irreparable=Sum('quantity', default=0, filter=Q(status='irreparable')),
+            closed=Sum('quantity', default=0, filter=Q(status='closed')),
+            # Статистика по типам браков
+            technical_defects=Sum('quantity', default=0, filter=Q(defect_type='technical')),
+            manual_defects=Sum('quantity', default=0, filter=Q(defect_type='manual')),
+        )
         
         # Статистика по цехам
         workshop_stats = Defect.objects.values('user__workshop__name').annotate(
-            count=Count('id')
+            count=Sum('quantity', default=0)
         ).filter(user__workshop__name__isnull=False)
         
         return Response({
-            'total_defects': total_defects,
-            'pending_confirmation': pending_confirmation,
-            'repairable': repairable,
-            'repaired': repaired,
-            'irreparable': irreparable,
-            'closed': closed,
-            'technical_defects': technical_defects,
-            'manual_defects': manual_defects,
+            **totals,
             'workshop_stats': list(workshop_stats)
         })
         
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import EmployeeTask
+from .models import EmployeeTask, TaskSideEffect
 
 @admin.register(EmployeeTask)
 class EmployeeTaskAdmin(admin.ModelAdmin):
@@ -29,3 +29,11 @@ class EmployeeTaskAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'employee', 'stage__workshop', 'stage__order'
         )
+
+
+@admin.register(TaskSideEffect)
+class TaskSideEffectAdmin(admin.ModelAdmin):
+    list_display = ('key', 'task', 'completed_delta', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('key', 'task', 'completed_delta', 'attempts', 'error', 'created_at', 'processed_at')
+    ordering = ('-id',)
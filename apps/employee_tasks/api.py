@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -6,10 +8,13 @@ from django.db.models import Sum, Count, F, OuterRef, Subquery, DecimalField, Ex
 from django.db.models.functions import ExtractMonth, ExtractYear, Coalesce
 from django.contrib.auth import get_user_model
 from .models import EmployeeTask
-from apps.services.models import Service
+from .pricing import recalculate_tasks
+from . import stats
+from apps.services import resolver
 from .serializers import EmployeeTaskSerializer
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
  
 class EmployeeTaskAssignViewSet(viewsets.ModelViewSet):
     queryset = EmployeeTask.objects.all().order_by('-created_at', 'id')
@@ -107,166 +112,82 @@ class EmployeeTaskAssignViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def employee_earnings_stats(request, employee_id):
-    """Статистика заработка конкретного сотрудника"""
+    """Статистика заработка конкретного сотрудника (необязательно за период date_from/date_to)"""
     try:
         employee = User.objects.get(id=employee_id)
-        
-        # Базовый queryset задач сотрудника
-        tasks = EmployeeTask.objects.filter(employee=employee)
-        
-        # Простая статистика без сложных вычислений
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(completed_quantity__gt=0).count()
-        
-        # Пробуем получить базовые суммы
-        try:
-            total_earnings = tasks.aggregate(s=Sum('earnings'))['s'] or 0
-            total_penalties = tasks.aggregate(s=Sum('penalties'))['s'] or 0
-            total_net_earnings = tasks.aggregate(s=Sum('net_earnings'))['s'] or 0
-        except Exception as e:
-            total_earnings = 0
-            total_penalties = 0
-            total_net_earnings = 0
-        
-        # Простая статистика по цехам
-        try:
-            workshop_stats = list(tasks.values('stage__workshop__name').annotate(
-            total_earnings=Sum('earnings'),
-            total_penalties=Sum('penalties'),
-            total_net=Sum('net_earnings'),
-            task_count=Count('id')
-            ))
-        except Exception as e:
-            workshop_stats = []
-        
-        # Простая статистика по месяцам
-        try:
-            monthly_stats = list(
-                tasks
-                .annotate(year=ExtractYear('created_at'), month=ExtractMonth('created_at'))
-                .values('year', 'month')
-                .annotate(
-            total_earnings=Sum('earnings'),
-            total_penalties=Sum('penalties'),
-            total_net=Sum('net_earnings'),
-            task_count=Count('id')
-                )
-                .order_by('year', 'month')
-            )
-        except Exception as e:
-            monthly_stats = []
-        
+        date_from, date_to = stats.parse_period(request.GET)
+        data = stats.employee_stats(employee.id, date_from, date_to)
+
         return Response({
             'employee': {
                 'id': employee.id,
                 'name': employee.get_full_name() or employee.username,
                 'username': employee.username
             },
-            'overview': {
-                'total_earnings': total_earnings,
-                'total_penalties': total_penalties,
-                'total_net_earnings': total_net_earnings,
-                'total_tasks': total_tasks,
-                'completed_tasks': completed_tasks
-            },
+            'overview': data['overview'],
+            # Баланс не кэшируется: он меняется не только от задач
             'balance': employee.balance,
-            'workshop_stats': workshop_stats,
-            'monthly_stats': monthly_stats
+            'workshop_stats': data['workshop_stats'],
+            'monthly_stats': data['monthly_stats']
         })
-        
+
     except User.DoesNotExist:
         return Response({'error': 'Сотрудник не найден'}, status=404)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def workshop_earnings_stats(request, workshop_id):
-    """Статистика заработка по цеху"""
+    """Статистика заработка по цеху (необязательно за период date_from/date_to)"""
+    from apps.operations.workshops.models import Workshop
     try:
-        from apps.operations.workshops.models import Workshop
         workshop = Workshop.objects.get(id=workshop_id)
-        
-        # Базовый queryset по цеху
-        tasks = EmployeeTask.objects.filter(stage__workshop=workshop)
-        
-        # Простая статистика
-        try:
-            total_earnings = tasks.aggregate(s=Sum('earnings'))['s'] or 0
-            total_penalties = tasks.aggregate(s=Sum('penalties'))['s'] or 0
-            total_net_earnings = tasks.aggregate(s=Sum('net_earnings'))['s'] or 0
-        except Exception as e:
-            total_earnings = 0
-            total_penalties = 0
-            total_net_earnings = 0
-        
-        # Статистика по сотрудникам
-        try:
-            employee_stats = list(tasks.values('employee__username', 'employee__first_name', 'employee__last_name').annotate(
-            total_earnings=Sum('earnings'),
-            total_penalties=Sum('penalties'),
-            total_net=Sum('net_earnings'),
-            task_count=Count('id')
-            ))
-        except Exception as e:
-            employee_stats = []
-        
-        # Получаем услугу цеха
-        try:
-            service = Service.objects.get(workshop=workshop, is_active=True)
-            service_info = {
-                'name': service.name,
-                'price': service.service_price,
-                'defect_penalty': service.defect_penalty
-            }
-        except Service.DoesNotExist:
-            service_info = None
-        
+        date_from, date_to = stats.parse_period(request.GET)
+        data = stats.workshop_stats(workshop.id, date_from, date_to)
+
+        # Услуга цеха — из кэша услуг
+        service = resolver.workshop_service(workshop.id)
+        service_info = {
+            'name': service.name,
+            'price': service.service_price,
+            'defect_penalty': service.defect_penalty
+        } if service else None
+
         return Response({
             'workshop': {
                 'id': workshop.id,
                 'name': workshop.name
             },
-            'overview': {
-                'total_earnings': total_earnings,
-                'total_penalties': total_penalties,
-                'total_net_earnings': total_net_earnings,
-                'total_tasks': tasks.count()
-            },
-            'employee_stats': employee_stats,
+            'overview': data['overview'],
+            'employee_stats': data['employee_stats'],
             'service': service_info
         })
-        
+
     except Workshop.DoesNotExist:
         return Response({'error': 'Цех не найден'}, status=404)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Ошибка статистики цеха {workshop_id}: {e}")
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def top_earners(request):
-    """Топ сотрудников по заработку"""
+    """Топ сотрудников по заработку (необязательно за период date_from/date_to)"""
     try:
-        # Получаем топ-10 сотрудников по чистому заработку
-        top_employees = EmployeeTask.objects.values(
-            'employee__username', 
-            'employee__first_name', 
-            'employee__last_name'
-        ).annotate(
-            total_earnings=Sum('earnings'),
-            total_penalties=Sum('penalties'),
-            total_net=Sum('net_earnings'),
-            task_count=Count('id')
-        ).order_by('-total_net')[:10]
-        
+        date_from, date_to = stats.parse_period(request.GET)
         return Response({
-            'top_earners': top_employees
+            'top_earners': stats.top_earners(date_from, date_to)
         })
-        
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
-        return Response({'error': str(e)}, status=500) 
+        return Response({'error': str(e)}, status=500)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -588,38 +509,13 @@ def recalculate_employee_earnings(request, employee_id):
     """Принудительно пересчитывает заработок для сотрудника"""
     try:
         employee = User.objects.get(id=employee_id)
-        tasks = EmployeeTask.objects.filter(employee=employee)
-        
-        updated_count = 0
-        total_earnings = 0
-        total_penalties = 0
-        total_net = 0
-        
-        for task in tasks:
-            try:
-                # Сохраняем старые значения
-                old_earnings = task.earnings
-                old_penalties = task.penalties
-                old_net = task.net_earnings
-                
-                # Пересчитываем заработок
-                task.calculate_earnings()
-                
-                # Обновляем в базе
-                EmployeeTask.objects.filter(pk=task.pk).update(
-                    earnings=task.earnings,
-                    penalties=task.penalties,
-                    net_earnings=task.net_earnings
-                )
-                
-                updated_count += 1
-                total_earnings += float(task.earnings)
-                total_penalties += float(task.penalties)
-                total_net += float(task.net_earnings)
-                
-            except Exception as e:
-                print(f"Error recalculating task {task.id}: {e}")
-                continue
+        # Пакетный пересчёт: услуги загружаются заранее, запись через bulk_update,
+        # балансы сдвигаются на разницу чистого заработка
+        result = recalculate_tasks(EmployeeTask.objects.filter(employee=employee))
+        updated_count = result['processed']
+        total_earnings = float(result['total_earnings'])
+        total_penalties = float(result['total_penalties'])
+        total_net = float(result['total_net'])
         
         return Response({
             'success': True,
@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from apps.clients.models import Client
+from apps.employee_tasks.models import EmployeeTask
+from apps.employee_tasks.tracing import trace_earnings
+from apps.operations.workshops.models import Workshop
+from apps.orders.models import Order, OrderItem, OrderStage
+from apps.products.models import Product
+from apps.services.models import Service
+from apps.users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время сохранения задачи сотрудника (расчёт заработка) с трассировкой и без (данные откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saves', type=int, default=500, help='Сохранений в каждом режиме (по умолчанию 500)')
+        parser.add_argument('--sample-rate', type=float, default=0.01, help='Доля трассируемых сохранений в выборочном режиме')
+
+    def handle(self, *args, **options):
+        saves = options['saves']
+        try:
+            with transaction.atomic():
+                task = self._create_task()
+                self._measure('без трассировки', task, saves)
+                with override_settings(EARNINGS_TRACE_SAMPLE_RATE=options['sample_rate']):
+                    self._measure(f"выборочно {options['sample_rate']:.0%}", task, saves)
+                with trace_earnings():
+                    self._measure('трассировка всех', task, saves)
+                # Тестовые данные не сохраняем
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _create_task(self):
+        workshop = Workshop.objects.create(name='Benchmark workshop')
+        employee = User.objects.create(username='benchmark-worker', workshop=workshop)
+        product = Product.objects.create(name='Benchmark door')
+        service = Service.objects.create(name='Benchmark cut', workshop=workshop, service_price=10, defect_penalty=3)
+        product.services.add(service)
+        order = Order.objects.create(name='Benchmark order', client=Client.objects.create(name='Benchmark client'))
+        item = OrderItem.objects.create(order=order, product=product, quantity=10)
+        stage = OrderStage.objects.create(order=order, order_item=item, workshop=workshop, operation='Benchmark cut', sequence=1)
+        return EmployeeTask.objects.create(stage=stage, employee=employee, quantity=10)
+
+    def _measure(self, label, task, saves):
+        # Только расчёт заработка, без запросов сохранения
+        started = time.perf_counter()
+        for _ in range(saves):
+            task.calculate_earnings()
+        calculation = (time.perf_counter() - started) * 1000 / saves
+
+        timings = []
+        for n in range(saves):
+            task.completed_quantity = n % 10
+            started = time.perf_counter()
+            task.save()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {saves} сохранений, среднее {statistics.mean(timings):.2f} мс, '
+            f'медиана {statistics.median(timings):.2f} мс, p95 {p95:.2f} мс; '
+            f'calculate_earnings {calculation:.3f} мс'
+        ))
@@ -1,55 +1,52 @@
 from django.core.management.base import BaseCommand
 from apps.employee_tasks.models import EmployeeTask
-from decimal import Decimal
+from apps.employee_tasks.pricing import BATCH_SIZE, recalculate_tasks
 
 class Command(BaseCommand):
     help = 'Пересчитывает заработок для всех задач сотрудников'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--employee', type=int, help='Пересчитать только задачи сотрудника с этим ID')
+        parser.add_argument('--since', help='Пересчитать только задачи, созданные с этой даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Размер пакета записи в базу')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать изменения, не сохраняя их')
+
     def handle(self, *args, **options):
         self.stdout.write('Начинаю пересчет заработка...')
-        
+
         tasks = EmployeeTask.objects.all()
-        updated_count = 0
-        
-        for task in tasks:
-            try:
-                # Сохраняем старые значения для сравнения
-                old_earnings = task.earnings
-                old_penalties = task.penalties
-                old_net_earnings = task.net_earnings
-                
-                # Пересчитываем заработок
-                task.calculate_earnings()
-                
-                # Проверяем, изменились ли значения
-                if (task.earnings != old_earnings or 
-                    task.penalties != old_penalties or 
-                    task.net_earnings != old_net_earnings):
-                    
-                    # Сохраняем в базе
-                    EmployeeTask.objects.filter(pk=task.pk).update(
-                        earnings=task.earnings,
-                        penalties=task.penalties,
-                        net_earnings=task.net_earnings
-                    )
-                    updated_count += 1
-                    
-                    self.stdout.write(
-                        f'Задача {task.id}: {task.employee.username} - '
-                        f'Заработок: {old_earnings} → {task.earnings}, '
-                        f'Штрафы: {old_penalties} → {task.penalties}, '
-                        f'Чистый: {old_net_earnings} → {task.net_earnings}'
-                    )
-                
-            except Exception as e:
+        if options['employee']:
+            tasks = tasks.filter(employee_id=options['employee'])
+        if options['since']:
+            tasks = tasks.filter(created_at__date__gte=options['since'])
+
+        verbose = options['verbosity'] > 1
+
+        def report(task, old):
+            if verbose:
+                old_earnings, old_penalties, old_net_earnings = old
                 self.stdout.write(
-                    self.style.ERROR(
-                        f'Ошибка при обработке задачи {task.id}: {e}'
-                    )
+                    f'Задача {task.id}: сотрудник {task.employee_id} - '
+                    f'Заработок: {old_earnings} → {task.earnings}, '
+                    f'Штрафы: {old_penalties} → {task.penalties}, '
+                    f'Чистый: {old_net_earnings} → {task.net_earnings}'
                 )
-        
+
+        result = recalculate_tasks(
+            tasks,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            on_change=report,
+        )
+
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"Ошибок при обработке задач: {result['errors']}"))
+
+        prefix = 'Пробный пересчет (без сохранения)' if options['dry_run'] else 'Пересчет завершен'
         self.stdout.write(
             self.style.SUCCESS(
-                f'Пересчет завершен. Обновлено задач: {updated_count}'
+                f"{prefix}. Обработано задач: {result['processed']}, "
+                f"обновлено задач: {result['updated']}, "
+                f"изменено балансов: {len(result['balance_deltas'])}"
             )
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 05:30
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee_tasks', '0008_employeetask_additional_penalties_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSideEffect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Ключ')),
+                ('completed_delta', models.IntegerField(default=0, verbose_name='Приращение выполненного')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('done', 'Применено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Применено')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='side_effects', to='employee_tasks.employeetask', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Событие задачи',
+                'verbose_name_plural': 'События задач',
+                'indexes': [models.Index(fields=['status', 'id'], name='emptask_effect_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 05:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employee_tasks', '0009_task_side_effect'),
+        ('orders', '0012_orderstage_task_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employeetask',
+            index=models.Index(fields=['employee', 'created_at'], name='emptask_employee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeetask',
+            index=models.Index(fields=['stage', 'created_at'], name='emptask_stage_date_idx'),
+        ),
+    ]
@@ -0,0 +1,275 @@
+"""
+Расчёт заработка задач сотрудников.
+
+Цена единицы работы определяется по приоритету: индивидуальная цена задачи →
+услуга товара в цехе этапа → сумма по товарам заявки (агрегированный этап) →
+услуга цеха по названию операции → базовая ставка. PriceBook загружает услуги
+заранее, поэтому пакетный пересчёт recalculate_tasks не делает запросов на
+каждую задачу; CachedPriceBook применяет те же правила к отдельным задачам
+(EmployeeTask.calculate_earnings) через кэш apps.services.resolver.
+"""
+import logging
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.products.models import Product
+from apps.services import resolver
+from apps.services.models import Service
+from apps.users import ledger
+
+logger = logging.getLogger(__name__)
+
+# Базовые ставки, если услуга не найдена
+BASE_RATE = Decimal('100.00')
+BASE_PENALTY_RATE = Decimal('50.00')
+# Цех, в котором заработок умножается на количество слоёв
+LAYERED_WORKSHOP_ID = 7
+PRECISION = Decimal('0.1')
+
+BATCH_SIZE = 1000
+
+Earnings = namedtuple('Earnings', 'earnings penalties net_earnings price_source')
+
+
+def _service_rank(service):
+    """Порядок выбора услуги товара: сначала активные, затем по названию"""
+    return (not service.is_active, service.name, service.pk)
+
+
+def _to_decimal(value):
+    return Decimal(str(value or 0))
+
+
+class PriceBook:
+    """Услуги для расчёта заработка: (товар, цех) → услуга и цех → активные услуги"""
+
+    def __init__(self, product_services, workshop_services):
+        self._product_services = product_services
+        self._workshop_services = workshop_services
+
+    @classmethod
+    def load(cls, workshop_ids=None):
+        """Загружает услуги цехов (по умолчанию всех) двумя запросами"""
+        links = Product.services.through.objects.select_related('service')
+        services = Service.objects.filter(is_active=True).order_by('name', 'pk')
+        if workshop_ids is not None:
+            links = links.filter(service__workshop_id__in=workshop_ids)
+            services = services.filter(workshop_id__in=workshop_ids)
+
+        candidates = defaultdict(list)
+        for link in links:
+            candidates[(link.product_id, link.service.workshop_id)].append(link.service)
+        product_services = {key: min(items, key=_service_rank) for key, items in candidates.items()}
+
+        workshop_services = defaultdict(list)
+        for service in services:
+            workshop_services[service.workshop_id].append(service)
+        return cls(product_services, dict(workshop_services))
+
+    def product_service(self, product_id, workshop_id):
+        """Первая активная услуга товара в цехе, иначе любая его услуга в цехе"""
+        if not product_id or not workshop_id:
+            return None
+        return self._product_services.get((product_id, workshop_id))
+
+    def stage_service(self, workshop_id, operation=None):
+        """Услуга цеха по названию операции, иначе первая активная услуга цеха"""
+        services = self._workshop_services.get(workshop_id) if workshop_id else None
+        if not services:
+            return None
+        if operation and operation.strip():
+            for service in services:
+                if service.name == operation:
+                    return service
+        return services[0]
+
+    def real_cost(self, stage, completed_quantity, steps=None):
+        """Стоимость выполненного количества агрегированного этапа по товарам заявки.
+
+        Возвращает None, если не учтено ни одной единицы.
+        """
+        order = getattr(stage, 'order', None)
+        if not order or not stage.workshop_id:
+            return None
+        total = Decimal('0')
+        counted = 0
+        remaining = int(completed_quantity or 0)
+        for item in sorted(order.items.all(), key=lambda it: it.pk):
+            if remaining <= 0:
+                break
+            service = self.product_service(item.product_id, stage.workshop_id)
+            price = _to_decimal(service.service_price) if service else Decimal('0')
+            executed = min(remaining, int(item.quantity or 0))
+            if steps is not None:
+                steps.append({'step': 'order_item', 'item_id': item.pk, 'service_id': service.pk if service else None,
+                              'price': price, 'executed': executed})
+            if executed > 0:
+                total += price * Decimal(executed)
+                counted += executed
+                remaining -= executed
+        return total if counted > 0 else None
+
+    def compute(self, task, steps=None):
+        """Заработок, штрафы и чистый заработок задачи без записи в базу.
+
+        Если передан список steps, в него добавляются шаги выбора цены
+        (см. apps.employee_tasks.tracing).
+        """
+        stage = task.stage
+        workshop_id = stage.workshop_id
+        stage_service = self.stage_service(workshop_id, stage.operation)
+
+        unit_price = None
+        penalty_rate = None
+        real_cost = None
+        price_source = 'unknown'
+
+        if task.custom_unit_price is not None:
+            # 1) Индивидуальная цена от мастера
+            unit_price = _to_decimal(task.custom_unit_price)
+            price_source = 'custom_unit_price'
+            if steps is not None:
+                steps.append({'step': 'custom_unit_price', 'price': unit_price})
+        else:
+            # 2) Услуга конкретного товара в цехе этапа
+            product_id = stage.order_item.product_id if stage.order_item_id else None
+            service = self.product_service(product_id, workshop_id)
+            if steps is not None:
+                steps.append({'step': 'product_service', 'product_id': product_id, 'workshop_id': workshop_id,
+                              'service_id': service.pk if service else None})
+            if service:
+                unit_price = _to_decimal(service.service_price)
+                penalty_rate = _to_decimal(service.defect_penalty)
+                price_source = 'product_service'
+            else:
+                # 2b) Агрегированный этап: точная сумма по товарам заявки
+                real_cost = self.real_cost(stage, task.completed_quantity, steps)
+                if real_cost is not None:
+                    price_source = 'real_cost_by_products_sum'
+
+        # 3) Услуга цеха этапа или базовая ставка
+        if unit_price is None and real_cost is None:
+            if stage_service:
+                unit_price = _to_decimal(stage_service.service_price)
+                price_source = 'service.service_price'
+            else:
+                unit_price = BASE_RATE
+                price_source = 'BASE_RATE'
+        if penalty_rate is None:
+            penalty_rate = _to_decimal(stage_service.defect_penalty) if stage_service else BASE_PENALTY_RATE
+        if steps is not None:
+            steps.append({'step': 'stage_service', 'service_id': stage_service.pk if stage_service else None,
+                          'unit_price': unit_price, 'penalty_rate': penalty_rate})
+
+        layers = int(task.layers_per_unit or 1)
+        multiplier = Decimal(layers) if (workshop_id == LAYERED_WORKSHOP_ID and layers > 0) else Decimal(1)
+
+        if real_cost is not None:
+            gross = real_cost * multiplier
+        else:
+            gross = Decimal(int(task.completed_quantity or 0)) * unit_price * multiplier
+        earnings = gross.quantize(PRECISION)
+
+        penalties = (
+            Decimal(int(task.defective_quantity or 0)) * penalty_rate
+            + _to_decimal(task.additional_penalties)
+        ).quantize(PRECISION)
+
+        net_earnings = (earnings - penalties).quantize(PRECISION)
+        return Earnings(earnings, penalties, net_earnings, price_source)
+
+
+class CachedPriceBook(PriceBook):
+    """Те же правила, но услуги берутся из общего кэша apps.services.resolver.
+
+    Используется при расчёте отдельных задач (сохранение задачи, штраф за брак),
+    где загружать весь справочник услуг дороже, чем попасть в кэш.
+    """
+
+    def __init__(self):
+        super().__init__({}, {})
+
+    def product_service(self, product_id, workshop_id):
+        return resolver.product_service(product_id, workshop_id)
+
+    def stage_service(self, workshop_id, operation=None):
+        return resolver.workshop_service(workshop_id, operation)
+
+
+def recalculate_tasks(queryset, batch_size=BATCH_SIZE, dry_run=False, on_change=None):
+    """Пересчитывает заработок задач пакетно.
+
+    Новые значения пишутся через bulk_update, разница заработка и штрафов
+    проводится записями журнала начислений (apps.users.ledger). on_change(task, old) вызывается для каждой
+    изменившейся задачи, old — кортеж (earnings, penalties, net_earnings).
+    """
+    from .models import EmployeeTask
+
+    book = PriceBook.load()
+    tasks = (
+        queryset.select_related('stage__order_item')
+        .prefetch_related('stage__order__items')
+        .order_by('pk')
+    )
+    result = {
+        'processed': 0,
+        'updated': 0,
+        'errors': 0,
+        'total_earnings': Decimal('0'),
+        'total_penalties': Decimal('0'),
+        'total_net': Decimal('0'),
+    }
+    balance_deltas = defaultdict(Decimal)
+    entries = []
+    dirty_slices = {}
+    changed = []
+
+    def flush():
+        if changed and not dry_run:
+            EmployeeTask.objects.bulk_update(changed, ['earnings', 'penalties', 'net_earnings'])
+        changed.clear()
+
+    with transaction.atomic():
+        for task in tasks.iterator(chunk_size=batch_size):
+            try:
+                calculated = book.compute(task)
+            except Exception as e:
+                result['errors'] += 1
+                logger.warning(f"Ошибка пересчёта задачи {task.pk}: {e}")
+                continue
+            result['processed'] += 1
+            result['total_earnings'] += calculated.earnings
+            result['total_penalties'] += calculated.penalties
+            result['total_net'] += calculated.net_earnings
+
+            old = (task.earnings, task.penalties, task.net_earnings)
+            if old == calculated[:3]:
+                continue
+            balance_deltas[task.employee_id] += calculated.net_earnings - _to_decimal(task.net_earnings)
+            task.earnings, task.penalties, task.net_earnings = calculated[:3]
+            entries.extend(ledger.task_entries(task, old[2], old[1], comment='Пересчёт заработка'))
+            changed.append(task)
+            result['updated'] += 1
+            dirty_slices.setdefault((timezone.localdate(task.created_at), task.employee_id), task.created_at)
+            if on_change:
+                on_change(task, old)
+            if len(changed) >= batch_size:
+                flush()
+        flush()
+
+        if not dry_run:
+            ledger.post_entries(entries)
+            # bulk_update не вызывает сигналы — сбрасываем кэш статистики и пересобираем дневную сводку явно
+            from . import stats
+            stats.invalidate()
+            transaction.on_commit(stats.invalidate)
+            from apps.odashboard.facts import mark_dirty
+            from apps.odashboard.models import DailyProductionFact
+            for (_, employee_id), moment in dirty_slices.items():
+                mark_dirty(DailyProductionFact.SOURCE_TASK, moment, employee_id)
+
+    result['balance_deltas'] = {pk: delta for pk, delta in balance_deltas.items() if delta}
+    return result
@@ -0,0 +1,139 @@
+"""
+Побочные эффекты сохранения задачи сотрудника: заработок, баланс, сырьё.
+
+Режим задаёт настройка EMPLOYEE_TASK_SIDE_EFFECTS:
+- 'sync' — эффекты применяются сразу в post_save (так работают тесты);
+- 'async' — post_save в той же транзакции записывает компактное событие
+  TaskSideEffect (задача, приращение выполненного), после коммита Celery
+  разбирает outbox пачками (process_pending).
+
+Событие помечается применённым в той же транзакции, что и начисление, поэтому
+повторная доставка Celery-задачи не начислит баланс дважды. Строки задач
+блокируются на время разбора, а сохранения задач в режиме async не пишут
+колонки заработка (EmployeeTask.save), поэтому сохранённый заработок всегда
+соответствует проведённым начислениям. Заработок
+пересчитывается по текущему состоянию задачи, а разница с сохранёнными
+заработком и штрафами проводится записями журнала начислений
+(apps.users.ledger), так что несколько событий одной задачи сводятся в один
+пересчёт.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users import ledger
+
+from . import stats
+from .models import EmployeeTask, TaskSideEffect
+from .pricing import CachedPriceBook, PriceBook
+
+logger = logging.getLogger(__name__)
+
+PROCESS_TASK = 'apps.employee_tasks.tasks.process_task_side_effects'
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+
+
+def async_enabled():
+    return getattr(settings, 'EMPLOYEE_TASK_SIDE_EFFECTS', 'sync') == 'async'
+
+
+def apply_task_effects(task, completed_delta, price_book):
+    """Пересчитывает заработок задачи и списывает сырьё; возвращает записи журнала начислений"""
+    # Прежние значения запоминает pre_save; задача из базы хранит их сама
+    old_net = getattr(task, '_old_net_earnings', task.net_earnings)
+    old_penalties = getattr(task, '_old_penalties', task.penalties)
+    task.calculate_earnings(price_book)
+    if completed_delta > 0:
+        task.consume_materials(completed_delta)
+    # Обновляем агрегаты в базе без рекурсии
+    EmployeeTask.objects.filter(pk=task.pk).update(
+        earnings=task.earnings,
+        penalties=task.penalties,
+        net_earnings=task.net_earnings
+    )
+    task._old_net_earnings = task.net_earnings
+    task._old_penalties = task.penalties
+    return ledger.task_entries(task, old_net, old_penalties)
+
+
+def handle_task_saved(task, completed_delta):
+    """Точка входа post_save: применить эффекты сразу или записать событие"""
+    if not async_enabled():
+        with transaction.atomic():
+            ledger.post_entries(apply_task_effects(task, completed_delta, CachedPriceBook()))
+        return None
+    event = TaskSideEffect.objects.create(task=task, completed_delta=completed_delta)
+    transaction.on_commit(dispatch)
+    return event
+
+
+def dispatch():
+    """Будит consumer; при недоступном брокере разбирает outbox сразу"""
+    try:
+        from core.celery import app
+        app.send_task(PROCESS_TASK)
+    except Exception as e:
+        logger.warning(f"Не удалось поставить разбор событий задач в очередь, выполняем синхронно: {e}")
+        process_pending()
+
+
+def process_pending(limit=BATCH_SIZE):
+    """Применяет до limit ожидающих событий; возвращает число применённых"""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            TaskSideEffect.objects.select_for_update(skip_locked=True)
+            .filter(status=TaskSideEffect.STATUS_PENDING)
+            .order_by('pk')[:limit]
+        )
+        if not events:
+            return 0
+
+        by_task = defaultdict(list)
+        for event in events:
+            by_task[event.task_id].append(event)
+        # Блокируем задачи: заработок читается и перезаписывается до коммита начислений
+        tasks = EmployeeTask.objects.select_for_update(of=('self',)).select_related(
+            'stage__order_item'
+        ).in_bulk(list(by_task))
+        price_book = PriceBook.load()
+
+        entries = []
+        applied = []
+        for task_id, task_events in by_task.items():
+            task = tasks[task_id]
+            try:
+                # Точка сохранения: ошибка одной задачи не откатывает остальные
+                with transaction.atomic():
+                    task_entries = apply_task_effects(task, sum(e.completed_delta for e in task_events), price_book)
+            except Exception as e:
+                logger.error(f"Ошибка применения событий задачи {task_id}: {e}")
+                for event in task_events:
+                    event.attempts += 1
+                    event.error = str(e)
+                    if event.attempts >= MAX_ATTEMPTS:
+                        event.status = TaskSideEffect.STATUS_FAILED
+                TaskSideEffect.objects.bulk_update(task_events, ['attempts', 'error', 'status'])
+                continue
+            entries.extend(task_entries)
+            applied.extend(event.pk for event in task_events)
+
+        # Начисление и отметка о применении — в одной транзакции
+        ledger.post_entries(entries)
+        TaskSideEffect.objects.filter(pk__in=applied).update(
+            status=TaskSideEffect.STATUS_DONE, processed_at=now, error=''
+        )
+
+        # Заработок записан через update() — сигналов не было
+        stats.invalidate()
+        transaction.on_commit(stats.invalidate)
+        from apps.odashboard.facts import mark_dirty
+        from apps.odashboard.models import DailyProductionFact
+        for task_id in by_task:
+            task = tasks[task_id]
+            mark_dirty(DailyProductionFact.SOURCE_TASK, task.created_at, task.employee_id)
+    return len(applied)
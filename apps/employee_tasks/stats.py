@@ -0,0 +1,151 @@
+"""
+Статистика заработка для API (api.employee_earnings_stats, workshop_earnings_stats,
+top_earners).
+
+Итоги считаются одним совмещённым aggregate, разбивки — по одному сгруппированному
+запросу. Период date_from/date_to переводится в диапазон created_at, чтобы работали
+индексы (employee, created_at) и (stage, created_at). Результаты кэшируются на
+EARNINGS_STATS_CACHE_TIMEOUT секунд; ключ содержит поколение, которое
+увеличивается при любой записи задач (invalidate), поэтому после изменения
+заработка кэш не отдаёт старые суммы.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import EmployeeTask
+
+GENERATION_KEY = 'employee_tasks:stats:generation'
+KEY_PREFIX = 'employee_tasks:stats'
+TOP_EARNERS_LIMIT = 10
+
+_ZERO = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _timeout():
+    return getattr(settings, 'EARNINGS_STATS_CACHE_TIMEOUT', 60)
+
+
+def _boundary(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def parse_period(params):
+    """(date_from, date_to) из параметров запроса; ValueError при неверной дате"""
+    period = []
+    for name in ('date_from', 'date_to'):
+        raw = params.get(name)
+        value = parse_date(raw) if raw else None
+        if raw and value is None:
+            raise ValueError(f"Неверная дата {name}: ожидается ГГГГ-ММ-ДД")
+        period.append(value)
+    return tuple(period)
+
+
+def _filter_period(tasks, date_from, date_to):
+    if date_from:
+        tasks = tasks.filter(created_at__gte=_boundary(date_from))
+    if date_to:
+        tasks = tasks.filter(created_at__lt=_boundary(date_to + timedelta(days=1)))
+    return tasks
+
+
+def _totals(tasks):
+    """Суммы и счётчики одним запросом"""
+    return tasks.aggregate(
+        total_earnings=Coalesce(Sum('earnings'), _ZERO),
+        total_penalties=Coalesce(Sum('penalties'), _ZERO),
+        total_net_earnings=Coalesce(Sum('net_earnings'), _ZERO),
+        total_tasks=Count('id'),
+        completed_tasks=Count('id', filter=Q(completed_quantity__gt=0)),
+    )
+
+
+def _breakdown(tasks, *fields):
+    return tasks.values(*fields).annotate(
+        total_earnings=Sum('earnings'),
+        total_penalties=Sum('penalties'),
+        total_net=Sum('net_earnings'),
+        task_count=Count('id'),
+    )
+
+
+def invalidate():
+    """Новое поколение ключей: закэшированная статистика больше не читается"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time()), None)
+
+
+def _cached(name, period, compute):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_KEY, generation, None)
+    date_from, date_to = period
+    key = f'{KEY_PREFIX}:v{generation}:{name}:{date_from or ""}:{date_to or ""}'
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, _timeout())
+    return result
+
+
+def employee_stats(employee_id, date_from=None, date_to=None):
+    """Итоги, разбивка по цехам и по месяцам для сотрудника"""
+    def compute():
+        tasks = _filter_period(EmployeeTask.objects.filter(employee_id=employee_id), date_from, date_to)
+        monthly = (
+            _breakdown(
+                tasks.annotate(year=ExtractYear('created_at'), month=ExtractMonth('created_at')),
+                'year', 'month',
+            ).order_by('year', 'month')
+        )
+        return {
+            'overview': _totals(tasks),
+            'workshop_stats': list(_breakdown(tasks, 'stage__workshop__name')),
+            'monthly_stats': list(monthly),
+        }
+    return _cached(f'employee:{employee_id}', (date_from, date_to), compute)
+
+
+def workshop_stats(workshop_id, date_from=None, date_to=None):
+    """Итоги и разбивка по сотрудникам для цеха"""
+    def compute():
+        tasks = _filter_period(EmployeeTask.objects.filter(stage__workshop_id=workshop_id), date_from, date_to)
+        overview = _totals(tasks)
+        overview.pop('completed_tasks')
+        return {
+            'overview': overview,
+            'employee_stats': list(_breakdown(tasks, 'employee__username', 'employee__first_name', 'employee__last_name')),
+        }
+    return _cached(f'workshop:{workshop_id}', (date_from, date_to), compute)
+
+
+def top_earners(date_from=None, date_to=None, limit=TOP_EARNERS_LIMIT):
+    """Лучшие сотрудники по чистому заработку из дневной сводки"""
+    def compute():
+        from apps.odashboard.models import DailyProductionFact
+        facts = DailyProductionFact.objects.filter(source=DailyProductionFact.SOURCE_TASK)
+        if date_from:
+            facts = facts.filter(date__gte=date_from)
+        if date_to:
+            facts = facts.filter(date__lte=date_to)
+        return list(
+            facts.values('employee__username', 'employee__first_name', 'employee__last_name')
+            .annotate(
+                total_earnings=Sum('earnings'),
+                total_penalties=Sum('penalties'),
+                total_net=Sum('net_earnings'),
+                task_count=Sum('tasks_count'),
+            )
+            .order_by('-total_net')[:limit]
+        )
+    return _cached(f'top:{limit}', (date_from, date_to), compute)
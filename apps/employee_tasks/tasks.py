@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from .side_effects import BATCH_SIZE, process_pending
+
+
+@shared_task
+def process_task_side_effects(max_batches=20):
+    """Разбирает outbox событий задач сотрудников пачками по BATCH_SIZE"""
+    processed = 0
+    for _ in range(max_batches):
+        applied = process_pending(BATCH_SIZE)
+        processed += applied
+        if applied < BATCH_SIZE:
+            break
+    return processed
@@ -1,3 +1,392 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.defects.models import Defect
+from apps.inventory.models import MaterialConsumption, RawMaterial
+from apps.notifications.models import Notification
+from apps.odashboard.models import DailyProductionFact
+from apps.operations.workshops.models import Workshop
+from apps.orders.models import Order, OrderItem, OrderStage
+from apps.products.models import Product
+from apps.services.models import Service, ServiceMaterial
+from apps.users import ledger
+from apps.users.models import BalanceEntry, User
+from .models import EmployeeTask, TaskSideEffect
+from .pricing import BASE_RATE, PriceBook, recalculate_tasks
+from .side_effects import process_pending
+from .tracing import trace_earnings
+
+
+class EarningsTestCase(TestCase):
+    """Цех с услугами, заказ из двух товаров, обычный и агрегированный этапы"""
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.employee = User.objects.create_user(username='worker', password='testpass123', workshop=self.workshop)
+        client = Client.objects.create(name='Клиент')
+        self.door = Product.objects.create(name='Дверь', price=100)
+        self.frame = Product.objects.create(name='Коробка', price=50)
+        self.door_service = Service.objects.create(
+            name='Распил двери', workshop=self.workshop, service_price=10, defect_penalty=3,
+        )
+        self.frame_service = Service.objects.create(
+            name='Распил коробки', workshop=self.workshop, service_price=4, defect_penalty=1,
+        )
+        self.door.services.add(self.door_service)
+        self.frame.services.add(self.frame_service)
+        self.order = Order.objects.create(name='Заказ', client=client)
+        self.door_item = OrderItem.objects.create(order=self.order, product=self.door, quantity=2)
+        self.frame_item = OrderItem.objects.create(order=self.order, product=self.frame, quantity=5)
+        self.stage = OrderStage.objects.create(
+            order=self.order, order_item=self.door_item, workshop=self.workshop,
+            operation='Распил', sequence=1, plan_quantity=10,
+        )
+        # Агрегированный этап: без позиции, стоимость по товарам заявки
+        self.aggregated_stage = OrderStage.objects.create(
+            order=self.order, workshop=self.workshop, operation='Распил', sequence=2, plan_quantity=7,
+        )
+
+    def _task(self, **kwargs):
+        kwargs.setdefault('stage', self.stage)
+        return EmployeeTask.objects.create(employee=self.employee, **kwargs)
+
+
+class EarningsPricingTest(EarningsTestCase):
+    """Правила цены и пакетный пересчёт заработка"""
+
+    def test_price_rules(self):
+        book = PriceBook.load()
+        cases = [
+            # Услуга товара: 4 x 10, брак 1 x 3
+            (self._task(quantity=5, completed_quantity=4, defective_quantity=1), ('40.0', '3.0', '37.0')),
+            # Индивидуальная цена, штраф из услуги цеха
+            (self._task(quantity=5, completed_quantity=3, custom_unit_price=Decimal('7.50')), ('22.5', '0.0', '22.5')),
+            # Агрегированный этап: 2 двери x 10 + 2 коробки x 4
+            (self._task(stage=self.aggregated_stage, quantity=7, completed_quantity=4), ('28.0', '0.0', '28.0')),
+        ]
+        for task, expected in cases:
+            calculated = book.compute(task)
+            self.assertEqual(tuple(str(v) for v in calculated[:3]), expected)
+            # Сохранённые сигналом значения совпадают с расчётом по PriceBook
+            task.refresh_from_db()
+            self.assertEqual((task.earnings, task.penalties, task.net_earnings), calculated[:3])
+
+    def test_base_rate_without_workshop(self):
+        stage = OrderStage.objects.create(order=self.order, operation='Сборка', sequence=3, plan_quantity=2)
+        task = self._task(stage=stage, quantity=2, completed_quantity=2)
+        task.refresh_from_db()
+        self.assertEqual(task.earnings, 2 * BASE_RATE)
+
+    def test_recalculate_tasks_in_bulk(self):
+        tasks = [self._task(quantity=3, completed_quantity=2) for _ in range(20)]
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('400'))
+
+        # Смена цены в обход сигналов — заработок нужно пересчитать
+        Service.objects.filter(pk=self.door_service.pk).update(service_price=15)
+        with CaptureQueriesContext(connection) as ctx:
+            result = recalculate_tasks(EmployeeTask.objects.all())
+        self.assertEqual((result['processed'], result['updated']), (20, 20))
+        self.assertEqual(result['balance_deltas'], {self.employee.id: Decimal('200')})
+        # Число запросов не зависит от числа задач: услуги, задачи, bulk_update, баланс
+        self.assertLess(len(ctx.captured_queries), 15)
+
+        tasks[0].refresh_from_db()
+        self.assertEqual(tasks[0].net_earnings, Decimal('30'))
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('600'))
+
+        # Повторный пересчёт ничего не меняет
+        self.assertEqual(recalculate_tasks(EmployeeTask.objects.all())['updated'], 0)
+
+    def test_save_posts_ledger_entries(self):
+        task = self._task(quantity=5, completed_quantity=4, defective_quantity=1)
+        task.defective_quantity = 2
+        task.save()
+        entries = BalanceEntry.objects.filter(source=f'task:{task.pk}')
+        totals = {row['kind']: row['amount'] for row in entries.values('kind').annotate(amount=Sum('amount'))}
+        self.assertEqual(totals, {
+            BalanceEntry.Kind.TASK_EARNINGS: Decimal('40'),
+            BalanceEntry.Kind.PENALTY: Decimal('-6'),
+        })
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('34'))
+        # Проекция совпадает с журналом
+        self.assertEqual(ledger.rebuild_balance([self.employee.pk]), 0)
+
+    def test_recalculate_command_dry_run(self):
+        task = self._task(quantity=3, completed_quantity=2)
+        Service.objects.filter(pk=self.door_service.pk).update(service_price=15)
+        call_command('recalculate_earnings', '--dry-run', stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.net_earnings, Decimal('20'))
+        call_command('recalculate_earnings', stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.net_earnings, Decimal('30'))
+
+
+class EarningsTracingTest(EarningsTestCase):
+    """Трассировка расчёта заработка включается только явно"""
+
+    def test_disabled_by_default(self):
+        task = self._task(quantity=5, completed_quantity=4)
+        with self.assertNoLogs('apps.employee_tasks.earnings', level='INFO'):
+            task.calculate_earnings()
+
+    def test_trace_context_records_resolution_path(self):
+        task = self._task(stage=self.aggregated_stage, quantity=7, completed_quantity=4)
+        with trace_earnings() as records:
+            task.calculate_earnings()
+        self.assertEqual(len(records), 1)
+        entry = records[0]
+        self.assertEqual((entry['task_id'], entry['price_source'], str(entry['earnings'])), (task.pk, 'real_cost_by_products_sum', '28.0'))
+        self.assertEqual([step['step'] for step in entry['steps']], ['product_service', 'order_item', 'order_item', 'stage_service'])
+
+    @override_settings(EARNINGS_TRACE_SAMPLE_RATE=1)
+    def test_sampled_traces_are_logged(self):
+        with self.assertLogs('apps.employee_tasks.earnings', level='INFO') as logs:
+            self._task(quantity=5, completed_quantity=4)
+        self.assertEqual(logs.records[0].earnings_trace['price_source'], 'product_service')
+
+
+class TaskDefectsTest(EarningsTestCase):
+    """Брак по задаче создаётся пакетно, а не INSERT на каждую единицу"""
+
+    def _report_defects(self, task, count):
+        task.defective_quantity += count
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "defects_defect"')]
+
+    def test_defects_are_bulk_created(self):
+        task = self._task(quantity=300, completed_quantity=250)
+        inserts = self._report_defects(task, 200)
+        # bulk_create делит вставку только по лимиту параметров SQLite
+        self.assertLess(len(inserts), 10)
+        defects = Defect.objects.filter(employee_task=task)
+        self.assertEqual(defects.count(), 200)
+        self.assertEqual(set(defects.values_list('product_id', 'user_id', 'quantity')), {(self.door.id, self.employee.id, 1)})
+        fact = DailyProductionFact.objects.get(source=DailyProductionFact.SOURCE_DEFECT)
+        self.assertEqual(fact.defects_count, 200)
+
+    @override_settings(DEFECTS_GROUP_UNITS=True)
+    def test_grouped_defects(self):
+        task = self._task(quantity=300, completed_quantity=250)
+        self._report_defects(task, 200)
+        self._report_defects(task, 5)
+        self.assertEqual(list(Defect.objects.filter(employee_task=task).values_list('quantity', flat=True).order_by('quantity')), [5, 200])
+        fact = DailyProductionFact.objects.get(source=DailyProductionFact.SOURCE_DEFECT)
+        self.assertEqual(fact.defects_count, 205)
+
+    @override_settings(DEFECTS_GROUP_UNITS=True)
+    def test_grouped_defect_penalty_and_stats_count_units(self):
+        task = self._task(quantity=10, completed_quantity=8)
+        self._report_defects(task, 5)
+        self._report_defects(task, 1)
+        master = User.objects.create_user(username='master', password='testpass123', role=User.Role.MASTER, workshop=self.workshop)
+        defect = Defect.objects.get(employee_task=task, quantity=5)
+        defect.confirm_defect(master, is_repairable=False, defect_type=Defect.DefectType.MANUAL, penalty_amount=2)
+        # Штраф за единицу брака: запись из 5 единиц — как 5 записей
+        self.assertEqual(defect.penalty_amount, 10)
+        task.refresh_from_db()
+        self.assertEqual(task.additional_penalties, 10)
+
+        self.client.force_login(master)
+        stats = self.client.get(reverse('defects_stats')).json()
+        self.assertEqual((stats['total_defects'], stats['pending_confirmation'], stats['irreparable'], stats['manual_defects']), (6, 1, 5, 5))
+        self.assertEqual(stats['workshop_stats'], [{'user__workshop__name': 'Распиловка', 'count': 6}])
+
+
+class MaterialConsumptionTest(EarningsTestCase):
+    """Списание сырья по приращению выполненного количества"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.wood = RawMaterial.objects.create(name='Брус', unit='м', quantity=10)
+        self.glue = RawMaterial.objects.create(name='Клей', unit='кг', quantity=1)
+        # Услуга этапа — первая активная услуга цеха
+        ServiceMaterial.objects.create(service=self.door_service, material=self.wood, amount=2)
+        ServiceMaterial.objects.create(service=self.door_service, material=self.glue, amount=1)
+
+    def _complete(self, task, quantity):
+        task.completed_quantity += quantity
+        task.save()
+
+    def test_consumes_with_f_expressions(self):
+        task = self._task(quantity=10)
+        # Параллельный приход сырья не теряется при списании
+        RawMaterial.objects.filter(pk=self.wood.pk).update(quantity=20)
+        with CaptureQueriesContext(connection) as ctx:
+            self._complete(task, 3)
+        self.wood.refresh_from_db()
+        self.glue.refresh_from_db()
+        self.assertEqual((self.wood.quantity, self.glue.quantity), (Decimal('14'), Decimal('1')))
+        consumption = MaterialConsumption.objects.get(employee_task=task)
+        self.assertEqual((consumption.material_id, consumption.quantity), (self.wood.id, Decimal('6')))
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "factory_inventory_materialconsumption"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_low_stock_notifications_are_throttled(self):
+        task = self._task(quantity=10)
+        self._complete(task, 2)
+        self._complete(task, 2)
+        other = self._task(quantity=10)
+        self._complete(other, 1)
+        warnings = Notification.objects.filter(user=self.employee, title='Недостаточно сырья')
+        self.assertEqual(warnings.count(), 1)
+        self.assertIn('Клей', warnings.get().message)
+        # Последнему сохранению клея хватило
+        self.glue.refresh_from_db()
+        self.assertEqual(self.glue.quantity, Decimal('0'))
+
+
+@override_settings(EMPLOYEE_TASK_SIDE_EFFECTS='async')
+class TaskSideEffectsTest(EarningsTestCase):
+    """Асинхронное применение заработка и баланса через outbox"""
+
+    def _save(self, task=None, **kwargs):
+        def run_now(name, args=None, kwargs=None, **options):
+            from .tasks import process_task_side_effects
+            process_task_side_effects()
+
+        with mock.patch('core.celery.app.send_task', side_effect=run_now) as send_task, \
+                self.captureOnCommitCallbacks(execute=True):
+            if task is None:
+                task = self._task(**kwargs)
+            else:
+                for name, value in kwargs.items():
+                    setattr(task, name, value)
+                task.save()
+        self.assertTrue(send_task.called)
+        return task
+
+    def test_save_records_event_and_consumer_applies_it(self):
+        task = self._task(quantity=5, completed_quantity=2)
+        event = TaskSideEffect.objects.get(task=task)
+        self.assertEqual(event.status, TaskSideEffect.STATUS_PENDING)
+        task.refresh_from_db()
+        self.assertEqual(task.net_earnings, 0)
+
+        self.assertEqual(process_pending(), 1)
+        task.refresh_from_db()
+        self.employee.refresh_from_db()
+        self.assertEqual((task.net_earnings, self.employee.balance), (Decimal('20'), Decimal('20')))
+
+    def test_redelivery_does_not_double_credit(self):
+        task = self._save(quantity=5, completed_quantity=2)
+        self._save(task, completed_quantity=4)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('40'))
+        self.assertFalse(TaskSideEffect.objects.exclude(status=TaskSideEffect.STATUS_DONE).exists())
+
+        # Повторная доставка: применённые события пропускаются
+        self.assertEqual(process_pending(), 0)
+        # Даже повторно поставленное событие не начисляет баланс второй раз
+        TaskSideEffect.objects.update(status=TaskSideEffect.STATUS_PENDING)
+        process_pending()
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('40'))
+
+    def test_failed_event_is_retried(self):
+        task = self._task(quantity=5, completed_quantity=2)
+        with mock.patch.object(EmployeeTask, 'calculate_earnings', side_effect=RuntimeError('boom')):
+            self.assertEqual(process_pending(), 0)
+        event = TaskSideEffect.objects.get(task=task)
+        self.assertEqual((event.status, event.attempts, event.error), (TaskSideEffect.STATUS_PENDING, 1, 'boom'))
+        self.assertEqual(process_pending(), 1)
+
+    def test_penalty_written_by_caller_reaches_balance(self):
+        task = self._save(quantity=5, completed_quantity=2)
+        # Как Defect._apply_penalty: пересчёт и запись заработка вызывающим кодом
+        task.additional_penalties = Decimal('5')
+        task.calculate_earnings()
+        with mock.patch('core.celery.app.send_task'), self.captureOnCommitCallbacks(execute=True):
+            task.save(update_fields=['earnings', 'penalties', 'net_earnings', 'additional_penalties'])
+        process_pending()
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.balance, Decimal('15'))
+
+    def test_stale_save_does_not_double_credit(self):
+        from django.db.models.signals import pre_save
+        task = self._save(quantity=10, completed_quantity=2)
+        with mock.patch('core.celery.app.send_task'), self.captureOnCommitCallbacks(execute=True):
+            task.completed_quantity = 5
+            task.save()
+        # Экземпляр прочитан до применения события: заработок в нём старый (20)
+        stale = EmployeeTask.objects.get(pk=task.pk)
+        self.assertEqual(stale.net_earnings, Decimal('20'))
+
+        def consumer_commits(sender, instance, **kwargs):
+            # Consumer применяет событие между чтением в pre_save и UPDATE сохранения
+            pre_save.disconnect(consumer_commits, sender=EmployeeTask)
+            self.assertEqual(process_pending(), 1)
+
+        pre_save.connect(consumer_commits, sender=EmployeeTask)
+        try:
+            with mock.patch('core.celery.app.send_task'), self.captureOnCommitCallbacks(execute=True):
+                stale.save()
+        finally:
+            pre_save.disconnect(consumer_commits, sender=EmployeeTask)
+        process_pending()
+
+        task.refresh_from_db()
+        self.employee.refresh_from_db()
+        total = BalanceEntry.objects.filter(user=self.employee).aggregate(total=Sum('amount'))['total']
+        self.assertEqual(task.net_earnings, Decimal('50'))
+        self.assertEqual((total, self.employee.balance), (Decimal('50'), Decimal('50')))
+
+
+class EarningsStatsApiTest(EarningsTestCase):
+    """Статистика заработка: один aggregate, фильтр по периоду, кэш со сбросом"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.employee)
+        self.url = f'/employee_tasks/api/earnings/employee/{self.employee.pk}/'
+        self.old_task = self._task(quantity=5, completed_quantity=2)
+        EmployeeTask.objects.filter(pk=self.old_task.pk).update(
+            created_at=timezone.now() - timedelta(days=40)
+        )
+        self._task(quantity=5, completed_quantity=3, defective_quantity=1)
+
+    def test_overview_and_period_filter(self):
+        overview = self.client.get(self.url).json()['overview']
+        self.assertEqual(Decimal(str(overview['total_net_earnings'])), Decimal('47'))
+        self.assertEqual((overview['total_tasks'], overview['completed_tasks']), (2, 2))
+
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        overview = self.client.get(self.url, {'date_from': since}).json()['overview']
+        self.assertEqual(Decimal(str(overview['total_net_earnings'])), Decimal('27'))
+        self.assertEqual(overview['total_tasks'], 1)
+
+        self.assertEqual(self.client.get(self.url, {'date_to': 'вчера'}).status_code, 400)
+
+    def test_cached_until_task_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertFalse([q for q in ctx.captured_queries if 'employee_tasks_employeetask' in q['sql']])
+
+        self._task(quantity=1, completed_quantity=1)
+        overview = self.client.get(self.url).json()['overview']
+        self.assertEqual(overview['total_tasks'], 3)
+
+    def test_workshop_stats(self):
+        response = self.client.get(f'/employee_tasks/api/earnings/workshop/{self.workshop.pk}/')
+        data = response.json()
+        self.assertEqual(data['overview']['total_tasks'], 2)
+        self.assertEqual(data['service']['name'], self.door_service.name)
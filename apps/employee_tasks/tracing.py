@@ -0,0 +1,67 @@
+"""
+Трассировка расчёта заработка.
+
+По умолчанию выключена: calculate_earnings не форматирует строк и ничего не
+пишет. Включается на блок кода контекстным менеджером trace_earnings() или
+выборочно настройкой EARNINGS_TRACE_SAMPLE_RATE (доля сохранений от 0 до 1).
+Запись — словарь с входными данными задачи, шагами выбора цены и результатом;
+она уходит в логгер apps.employee_tasks.earnings (extra={'earnings_trace': ...})
+и в список активного trace_earnings().
+"""
+import logging
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('apps.employee_tasks.earnings')
+
+_state = threading.local()
+
+
+def enabled():
+    """Нужно ли трассировать текущий расчёт"""
+    if getattr(_state, 'records', None) is not None:
+        return True
+    rate = getattr(settings, 'EARNINGS_TRACE_SAMPLE_RATE', 0)
+    return bool(rate) and random.random() < rate
+
+
+@contextmanager
+def trace_earnings():
+    """Трассирует все расчёты внутри блока; отдаёт список записей"""
+    previous = getattr(_state, 'records', None)
+    records = []
+    _state.records = records
+    try:
+        yield records
+    finally:
+        _state.records = previous
+
+
+def record(task, result, steps):
+    """Сохраняет запись о расчёте задачи"""
+    stage = task.stage
+    entry = {
+        'task_id': task.pk,
+        'employee_id': task.employee_id,
+        'stage_id': task.stage_id,
+        'workshop_id': getattr(stage, 'workshop_id', None),
+        'operation': getattr(stage, 'operation', None),
+        'completed_quantity': task.completed_quantity,
+        'defective_quantity': task.defective_quantity,
+        'custom_unit_price': task.custom_unit_price,
+        'layers_per_unit': task.layers_per_unit,
+        'additional_penalties': task.additional_penalties,
+        'steps': steps,
+        'price_source': result.price_source,
+        'earnings': result.earnings,
+        'penalties': result.penalties,
+        'net_earnings': result.net_earnings,
+    }
+    records = getattr(_state, 'records', None)
+    if records is not None:
+        records.append(entry)
+    logger.info('Расчет заработка задачи %s: %s', task.pk, result.price_source, extra={'earnings_trace': entry})
+    return entry
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from apps.users.models import User
 from django.utils import timezone
-from .utils import calculate_employee_stats
+from .utils import RECENT_NOTIFICATIONS, RECENT_TASKS, calculate_employee_stats, employee_list_context
 from django.db.models import Sum
 from apps.employee_tasks.models import EmployeeTask
 
@@ -19,6 +19,20 @@ class WorkScheduleField(serializers.Field):
             'monday': '', 'tuesday': '', 'wednesday': '', 'thursday': '', 'friday': '', 'saturday': '', 'sunday': ''
         }
 
+class EmployeeListSerializer(serializers.ListSerializer):
+    """Список сотрудников: связанные данные и статистика загружаются пакетом на всю страницу"""
+
+    def to_representation(self, data):
+        employees = list(data.all() if hasattr(data, 'all') else data)
+        if 'employee_bundle' not in self.context:
+            try:
+                self.context['employee_bundle'] = employee_list_context(employees)
+            except Exception:
+                # Без пакета сериализатор загрузит данные по каждому сотруднику
+                self.context['employee_bundle'] = {}
+        return super().to_representation(employees)
+
+
 class EmployeeSerializer(serializers.ModelSerializer):
     role_display = serializers.CharField(source='get_role_display', read_only=True)
     workshop_name = serializers.CharField(source='workshop.name', read_only=True)
@@ -56,6 +70,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
+        list_serializer_class = EmployeeListSerializer
         fields = [
             'id', 'username', 'first_name', 'last_name', 'name', 'full_name', 'position', 'phone', 'email', 'status',
             'workshop', 'workshop_name', 'passportNumber', 'taxId', 'startDate', 'firedDate',
@@ -70,6 +85,13 @@ class EmployeeSerializer(serializers.ModelSerializer):
     def get_status(self, obj):
         return 'active' if obj.is_active else 'inactive'
     
+    def _bundled(self, name, obj, default=None):
+        """Данные сотрудника из пакета списка (default, если у сотрудника их нет); None без пакета"""
+        bundle = self.context.get('employee_bundle') or {}
+        if name not in bundle:
+            return None
+        return bundle[name].get(obj.pk, default)
+
     def _calc_stats(self, obj):
         try:
             return calculate_employee_stats(obj)
@@ -92,7 +114,10 @@ class EmployeeSerializer(serializers.ModelSerializer):
         cached = getattr(obj, '_computed_employee_stats', None)
         if cached is not None:
             return cached
-        stats = calculate_employee_stats(obj)
+        # Для списка статистика уже посчитана пакетом (EmployeeListSerializer)
+        stats = self._bundled('employee_stats', obj)
+        if stats is None:
+            stats = calculate_employee_stats(obj)
         setattr(obj, '_computed_employee_stats', stats)
         return stats
 
@@ -101,6 +126,9 @@ class EmployeeSerializer(serializers.ModelSerializer):
         cached = getattr(obj, '_task_aggregates', None)
         if cached is not None:
             return cached
+        bundled = self._bundled('task_aggregates', obj, {'total_defects': 0, 'total_net': 0})
+        if bundled is not None:
+            return bundled
         agg = EmployeeTask.objects.filter(employee=obj).aggregate(
             total_defects=Sum('defective_quantity'),
             total_net=Sum('net_earnings'),
@@ -147,7 +175,9 @@ class EmployeeSerializer(serializers.ModelSerializer):
     
     def get_tasks(self, obj):
         """Получить задачи сотрудника"""
-        tasks = obj.tasks.all()[:10]  # Ограничиваем до 10 последних задач
+        tasks = self._bundled('recent_tasks', obj, [])
+        if tasks is None:
+            tasks = obj.tasks.all()[:RECENT_TASKS]  # Ограничиваем до 10 последних задач
         return [
             {
                 'id': task.id,
@@ -161,7 +191,9 @@ class EmployeeSerializer(serializers.ModelSerializer):
     
     def get_notifications(self, obj):
         """Получить уведомления сотрудника"""
-        notifications = obj.notifications.all()[:5]  # Ограничиваем до 5 последних уведомлений
+        notifications = self._bundled('recent_notifications', obj, [])
+        if notifications is None:
+            notifications = obj.notifications.all()[:RECENT_NOTIFICATIONS]  # Ограничиваем до 5 последних уведомлений
         return [
             {
                 'id': notification.id,
@@ -175,7 +207,9 @@ class EmployeeSerializer(serializers.ModelSerializer):
     
     def get_documents(self, obj):
         """Получить документы сотрудника"""
-        documents = obj.documents.all()
+        documents = self._bundled('documents', obj, [])
+        if documents is None:
+            documents = obj.documents.all()
         return [
             {
                 'id': doc.id,
@@ -1,3 +1,104 @@
+from datetime import timedelta
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.employee_tasks.models import EmployeeTask
+from apps.operations.workshops.models import Workshop
+from apps.orders.models import Order, OrderStage
+from apps.services.models import Service
+from apps.users.models import User
+from .models import EmployeeDocument, EmployeeNotification, EmployeeStatistics
+from .models import EmployeeTask as EmployeeTodo
+from .utils import calculate_employee_stats, calculate_employees_stats
+
+
+class EmployeeStatsTest(TestCase):
+    """Статистика сотрудников сгруппированными запросами"""
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        Service.objects.create(name='Распил', workshop=self.workshop, service_price=10, defect_penalty=3)
+        order = Order.objects.create(name='Заказ', client=Client.objects.create(name='Клиент'))
+        self.stage = OrderStage.objects.create(
+            order=order, workshop=self.workshop, operation='Распил', sequence=1, plan_quantity=100,
+            deadline=timezone.localdate() + timedelta(days=1),
+        )
+        self.employees = [
+            User.objects.create_user(username=f'worker{i}', password='testpass123', workshop=self.workshop)
+            for i in range(5)
+        ]
+
+    def _task(self, employee, **kwargs):
+        return EmployeeTask.objects.create(employee=employee, stage=self.stage, **kwargs)
+
+    def test_stats_values(self):
+        employee = self.employees[0]
+        finished = self._task(employee, quantity=4, completed_quantity=4, defective_quantity=1)
+        # Завершена через 10 часов после создания: 2 часа переработки
+        EmployeeTask.objects.filter(pk=finished.pk).update(completed_at=finished.created_at + timedelta(hours=10))
+        self._task(employee, quantity=5, completed_quantity=2)
+
+        stats = calculate_employee_stats(employee)
+        self.assertEqual((stats['completed_works'], stats['defects']), (6, 1))
+        self.assertEqual(stats['monthly_salary'], 6 * 10 - 1 * 3)
+        self.assertEqual(stats['active_tasks'], 1)
+        self.assertEqual((stats['hours_worked'], stats['overtime_hours']), (10, 2))
+        self.assertEqual(stats['deadline_compliance'], 100)
+        self.assertEqual(stats['productivity_chart'][-1], 6)
+        self.assertEqual(len(stats['monthly_productivity']), 30)
+        self.assertEqual(stats['salary_history'][-1], 600)
+
+    def test_batch_query_count_does_not_depend_on_employees(self):
+        for employee in self.employees:
+            self._task(employee, quantity=3, completed_quantity=2)
+        calculate_employees_stats(self.employees[:1])
+
+        with CaptureQueriesContext(connection) as ctx:
+            stats = calculate_employees_stats(self.employees)
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertEqual({pk: s['completed_works'] for pk, s in stats.items()},
+                         {employee.pk: 2 for employee in self.employees})
+
+
+class EmployeeListQueriesTest(TestCase):
+    """Список сотрудников загружается фиксированным числом запросов"""
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Сборка')
+        self.url = '/employees/api/employees/'
+
+    def _add_employees(self, count):
+        for _ in range(count):
+            index = User.objects.count()
+            employee = User.objects.create_user(
+                username=f'staff{index}', password='testpass123', workshop=self.workshop, last_name=f'Сотрудник{index}',
+            )
+            EmployeeStatistics.objects.create(employee=employee)
+            EmployeeDocument.objects.create(employee=employee, document_type='other')
+            for i in range(12):
+                EmployeeTodo.objects.create(employee=employee, text=f'Задача {i}')
+            for i in range(7):
+                EmployeeNotification.objects.create(employee=employee, title=f'Уведомление {i}', text='')
+
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()['results']
 
-# Create your tests here.
+    def test_query_count_does_not_grow_with_page(self):
+        self._add_employees(2)
+        small, _ = self._list_queries()
+        self._add_employees(8)
+        large, results = self._list_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(results[0]['tasks']), 10)
+        self.assertEqual(len(results[0]['notifications']), 5)
+        self.assertEqual(len(results[0]['documents']), 1)
+        # Последние задачи — от новых к старым
+        self.assertEqual(results[0]['tasks'][0]['text'], 'Задача 11')
@@ -1,149 +1,209 @@
+from collections import defaultdict
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Sum, F, Q, Count, Avg
+from django.db.models import (
+    Case, Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum, Value, When, Window, prefetch_related_objects,
+)
+from django.db.models.functions import RowNumber, TruncDate, TruncMonth
 from apps.employee_tasks.models import EmployeeTask
-from apps.orders.models import OrderStage
 
-def calculate_employee_stats(employee, period_days=30):
-    from apps.services.models import Service
+# Длина смены: всё, что дольше, считается переработкой
+WORKDAY = timedelta(hours=8)
+CHART_DAYS = 7
+MONTHLY_DAYS = 30
+SALARY_MONTHS = 6
+# Сколько последних задач и уведомлений отдаёт EmployeeSerializer
+RECENT_TASKS = 10
+RECENT_NOTIFICATIONS = 5
+
+
+def _quality_score(defect_rate):
+    """Качество продукции (0-10) по проценту брака"""
+    if defect_rate < 5:
+        return 10
+    if defect_rate < 10:
+        return 8
+    if defect_rate < 20:
+        return 6
+    return 4
+
+
+def _shift_month(month_start, months):
+    """Первое число месяца, отстоящего на months от month_start"""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def calculate_employees_stats(employees, period_days=30):
+    """Статистика сразу для списка сотрудников: {employee_id: stats}.
+
+    Несколько сгруппированных запросов на весь список вместо обхода задач
+    каждого сотрудника: итоги за период с разбивкой по услуге этапа, счётчики
+    по завершённым задачам, выполненное по дням и по месяцам.
+    """
+    from apps.services import resolver
+    ids = [getattr(employee, 'pk', employee) for employee in employees]
+    if not ids:
+        return {}
     now = timezone.now()
     period_start = now - timedelta(days=period_days)
-
-    # Все задачи сотрудника за период
-    tasks = EmployeeTask.objects.filter(
-        employee=employee,
-        created_at__gte=period_start
+    today = timezone.localdate()
+    tasks = EmployeeTask.objects.filter(employee_id__in=ids)
+    period_tasks = tasks.filter(created_at__gte=period_start)
+
+    completed = defaultdict(int)
+    defects = defaultdict(int)
+    salary = defaultdict(float)
+    penalty = defaultdict(float)
+    # Итоги за период по (цех, операция) этапа — цена услуги одна на группу
+    rows = period_tasks.values('employee_id', 'stage__workshop_id', 'stage__operation').annotate(
+        completed=Sum('completed_quantity'),
+        defective=Sum('defective_quantity'),
     )
-
-    completed_works = 0
-    defects = 0
-    total_salary = 0
-    total_penalty = 0
-
-    for task in tasks.select_related('stage__workshop'):
-        completed = task.completed_quantity or 0
-        defect = task.defective_quantity or 0
-        completed_works += completed
-        defects += defect
-        service = None
-        if task.stage and task.stage.operation and task.stage.workshop:
-            service = Service.objects.filter(
-                name=task.stage.operation,
-                workshop=task.stage.workshop
-            ).first()
+    for row in rows:
+        employee_id = row['employee_id']
+        done = row['completed'] or 0
+        defect = row['defective'] or 0
+        completed[employee_id] += done
+        defects[employee_id] += defect
+        service = resolver.named_service(row['stage__workshop_id'], row['stage__operation'])
         if service:
-            total_salary += completed * float(service.service_price)
-            total_penalty += defect * float(service.defect_penalty)
-        else:
-            # Если услуга не найдена, можно логировать или считать по 0
-            pass
-
-    monthly_salary = total_salary - total_penalty
-
-    # Активные задачи (не завершены полностью)
-    active_tasks = EmployeeTask.objects.filter(
-        employee=employee,
-        completed_quantity__lt=F('quantity')
-    ).count()
-
-    # Средняя производительность (ед./день)
-    days = max((now - period_start).days, 1)
-    avg_productivity = round(completed_works / days, 2) if days else 0
-
-    # Процент брака
-    defect_rate = round(defects / completed_works * 100, 2) if completed_works else 0
-
-    # Часы работы (если есть completed_at и created_at)
-    hours_worked = 0
-    overtime_hours = 0
-    if tasks.exists():
-        for t in tasks.filter(completed_quantity=F('quantity'), completed_at__isnull=False):
-            delta = t.completed_at - t.created_at
-            hours = delta.total_seconds() / 3600
-            hours_worked += hours
-            if hours > 8:
-                overtime_hours += hours - 8
-        hours_worked = int(hours_worked)
-        overtime_hours = int(overtime_hours)
-
-    # Качество продукции (0-10)
-    if defect_rate < 5:
-        quality_score = 10
-    elif defect_rate < 10:
-        quality_score = 8
-    elif defect_rate < 20:
-        quality_score = 6
-    else:
-        quality_score = 4
-
-    # Соблюдение сроков (%)
-    total_with_deadline = 0
-    on_time = 0
-    for t in tasks.filter(completed_quantity=F('quantity'), completed_at__isnull=False):
-        if t.stage and t.stage.deadline:
-            total_with_deadline += 1
-            if t.completed_at.date() <= t.stage.deadline:
-                on_time += 1
-    deadline_compliance = round(on_time / total_with_deadline * 100, 2) if total_with_deadline else 0
-
-    # Инициативность и командная работа — пока среднее
-    initiative_score = 7
-    teamwork_score = 7
-
-    # График производительности (7 дней)
-    productivity_chart = []
-    for i in range(7):
-        day_start = now - timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-        day_tasks = tasks.filter(created_at__gte=day_start.replace(hour=0, minute=0, second=0, microsecond=0),
-                                created_at__lt=day_end.replace(hour=0, minute=0, second=0, microsecond=0))
-        day_completed = day_tasks.aggregate(total=Sum('completed_quantity'))['total'] or 0
-        productivity_chart.insert(0, day_completed)
-
-    # Производительность за месяц (30 дней)
-    monthly_productivity = []
-    for i in range(30):
-        day_start = now - timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-        day_tasks = tasks.filter(created_at__gte=day_start.replace(hour=0, minute=0, second=0, microsecond=0),
-                                created_at__lt=day_end.replace(hour=0, minute=0, second=0, microsecond=0))
-        day_completed = day_tasks.aggregate(total=Sum('completed_quantity'))['total'] or 0
-        monthly_productivity.insert(0, day_completed)
-
-    # История зарплаты (6 месяцев)
-    salary_history = []
-    for i in range(6):
-        month_start = (now.replace(day=1) - timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1)
-        month_tasks = EmployeeTask.objects.filter(
-            employee=employee,
-            created_at__gte=month_start,
-            created_at__lt=month_end
+            salary[employee_id] += done * float(service.service_price)
+            penalty[employee_id] += defect * float(service.defect_penalty)
+
+    # Активные задачи за всё время, часы и соблюдение сроков по завершённым за период
+    finished = Q(created_at__gte=period_start, completed_quantity=F('quantity'), completed_at__isnull=False)
+    duration = ExpressionWrapper(F('completed_at') - F('created_at'), output_field=DurationField())
+    counters = {
+        row['employee_id']: row
+        for row in tasks.values('employee_id').annotate(
+            active_tasks=Count('pk', filter=Q(completed_quantity__lt=F('quantity'))),
+            worked=Sum(duration, filter=finished),
+            overtime=Sum(
+                Case(
+                    When(completed_at__gt=F('created_at') + WORKDAY, then=duration - Value(WORKDAY)),
+                    output_field=DurationField(),
+                ),
+                filter=finished,
+            ),
+            with_deadline=Count('pk', filter=finished & Q(stage__deadline__isnull=False)),
+            on_time=Count('pk', filter=finished & Q(completed_at__date__lte=F('stage__deadline'))),
         )
-        month_completed = month_tasks.aggregate(total=Sum('completed_quantity'))['total'] or 0
-        salary_history.insert(0, month_completed * 100)
+    }
+
+    # Выполненное по дням (графики за 7 и 30 дней)
+    first_day = today - timedelta(days=MONTHLY_DAYS - 1)
+    daily = defaultdict(dict)
+    rows = (
+        period_tasks.annotate(day=TruncDate('created_at'))
+        .filter(day__gte=first_day)
+        .values('employee_id', 'day')
+        .annotate(total=Sum('completed_quantity'))
+    )
+    for row in rows:
+        daily[row['employee_id']][row['day']] = row['total'] or 0
+
+    # Выполненное по месяцам (история зарплаты)
+    first_month = _shift_month(today.replace(day=1), -(SALARY_MONTHS - 1))
+    monthly = defaultdict(dict)
+    rows = (
+        tasks.annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .filter(month__gte=first_month)
+        .values('employee_id', 'month')
+        .annotate(total=Sum('completed_quantity'))
+    )
+    for row in rows:
+        monthly[row['employee_id']][row['month']] = row['total'] or 0
+
+    days = max(period_days, 1)
+    chart_days = [today - timedelta(days=i) for i in range(MONTHLY_DAYS - 1, -1, -1)]
+    months = [_shift_month(first_month, i) for i in range(SALARY_MONTHS)]
+    result = {}
+    for employee_id in ids:
+        completed_works = completed[employee_id]
+        employee_defects = defects[employee_id]
+        row = counters.get(employee_id, {})
+        defect_rate = round(employee_defects / completed_works * 100, 2) if completed_works else 0
+        with_deadline = row.get('with_deadline') or 0
+        monthly_productivity = [daily[employee_id].get(day, 0) for day in chart_days]
+        result[employee_id] = {
+            'completed_works': completed_works,
+            'defects': employee_defects,
+            'monthly_salary': salary[employee_id] - penalty[employee_id],
+            'efficiency': round((completed_works - employee_defects) / completed_works * 100) if completed_works else 0,
+            'active_tasks': row.get('active_tasks') or 0,
+            'avg_productivity': round(completed_works / days, 2),
+            'defect_rate': defect_rate,
+            'hours_worked': int((row.get('worked') or timedelta()).total_seconds() / 3600),
+            'overtime_hours': int((row.get('overtime') or timedelta()).total_seconds() / 3600),
+            'quality_score': _quality_score(defect_rate),
+            'deadline_compliance': round((row.get('on_time') or 0) / with_deadline * 100, 2) if with_deadline else 0,
+            # Инициативность и командная работа — пока среднее
+            'initiative_score': 7,
+            'teamwork_score': 7,
+            'productivity_chart': monthly_productivity[-CHART_DAYS:],
+            'monthly_productivity': monthly_productivity,
+            'salary_history': [monthly[employee_id].get(month, 0) * 100 for month in months],
+        }
+    return result
+
 
-    # Эффективность
-    if completed_works > 0:
-        efficiency = round((completed_works - defects) / completed_works * 100)
-    else:
-        efficiency = 0
+def calculate_employee_stats(employee, period_days=30):
+    """Статистика одного сотрудника (см. calculate_employees_stats)"""
+    return calculate_employees_stats([employee], period_days)[employee.pk]
+
+
+def _latest_per_employee(queryset, ids, limit):
+    """Последние limit записей каждого сотрудника одним запросом: {employee_id: [записи]}"""
+    rows = (
+        queryset.filter(employee_id__in=ids)
+        .annotate(row_number=Window(
+            RowNumber(),
+            partition_by=[F('employee_id')],
+            order_by=[F('created_at').desc(), F('pk').desc()],
+        ))
+        .filter(row_number__lte=limit)
+        .order_by('employee_id', 'row_number')
+    )
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.employee_id].append(row)
+    return grouped
+
+
+def employee_list_context(employees):
+    """Данные EmployeeSerializer для всей страницы списка за фиксированное число запросов.
+
+    Цех и статистика подгружаются на сами объекты, остальное возвращается
+    словарями {employee_id: ...} для контекста сериализатора.
+    """
+    from . import models as employee_models
+    employees = list(employees)
+    ids = [employee.pk for employee in employees]
+    if not ids:
+        return {}
+    prefetch_related_objects(employees, 'workshop', 'statistics')
+
+    task_aggregates = {
+        row['employee_id']: {
+            'total_defects': row['total_defects'] or 0,
+            'total_net': row['total_net'] or 0,
+        }
+        for row in EmployeeTask.objects.filter(employee_id__in=ids).values('employee_id').annotate(
+            total_defects=Sum('defective_quantity'),
+            total_net=Sum('net_earnings'),
+        )
+    }
+    documents = defaultdict(list)
+    for document in employee_models.EmployeeDocument.objects.filter(employee_id__in=ids).order_by('pk'):
+        documents[document.employee_id].append(document)
 
     return {
-        'completed_works': completed_works,
-        'defects': defects,
-        'monthly_salary': monthly_salary,
-        'efficiency': efficiency,
-        'active_tasks': active_tasks,
-        'avg_productivity': avg_productivity,
-        'defect_rate': defect_rate,
-        'hours_worked': hours_worked,
-        'overtime_hours': overtime_hours,
-        'quality_score': quality_score,
-        'deadline_compliance': deadline_compliance,
-        'initiative_score': initiative_score,
-        'teamwork_score': teamwork_score,
-        'productivity_chart': productivity_chart,
-        'monthly_productivity': monthly_productivity,
-        'salary_history': salary_history,
-    } 
\ No newline at end of file
+        'task_aggregates': task_aggregates,
+        'recent_tasks': _latest_per_employee(employee_models.EmployeeTask.objects.all(), ids, RECENT_TASKS),
+        'recent_notifications': _latest_per_employee(
+            employee_models.EmployeeNotification.objects.all(), ids, RECENT_NOTIFICATIONS
+        ),
+        'documents': documents,
+        'employee_stats': calculate_employees_stats(ids),
+    }
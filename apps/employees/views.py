@@ -15,7 +15,7 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from apps.operations.workshops.models import Workshop, WorkshopMaster
 from apps.operations.workshops.views import WorkshopSerializer
-from .utils import calculate_employee_stats
+from .utils import calculate_employee_stats, calculate_employees_stats
 
 MOBILE_UA_KEYWORDS = [
     'Mobile', 'Android', 'iPhone', 'iPad', 'iPod', 'Opera Mini', 'IEMobile', 'BlackBerry', 'webOS'
@@ -129,7 +129,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         total_employees = queryset.count()
         
         # Агрегируем данные из EmployeeStatistics
-        all_stats = [calculate_employee_stats(emp) for emp in queryset]
+        all_stats = list(calculate_employees_stats(queryset).values())
         total_completed_works = sum(s['completed_works'] for s in all_stats)
         total_defects = sum(s['defects'] for s in all_stats)
         total_salary = sum(s['monthly_salary'] for s in all_stats)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'user', 'filename', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('kind', 'filename', 'user__username')
+    readonly_fields = ('id', 'fingerprint', 'params', 'created_at', 'started_at', 'finished_at', 'error')
+    ordering = ('-created_at',)
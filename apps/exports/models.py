@@ -0,0 +1,68 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.urls import reverse
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка (Excel/CSV/XML): параметры, статус и готовый файл в MEDIA_ROOT/exports"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Формируется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING, STATUS_DONE)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField('Тип выгрузки', max_length=50)
+    params = models.JSONField('Параметры', default=dict, blank=True)
+    fingerprint = models.CharField('Отпечаток параметров', max_length=64)
+    status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='export_jobs', verbose_name='Пользователь'
+    )
+    file = models.FileField('Файл', upload_to='exports/%Y/%m/%d/', blank=True)
+    filename = models.CharField('Имя файла', max_length=255, blank=True)
+    content_type = models.CharField('Тип содержимого', max_length=100, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    started_at = models.DateTimeField('Начато', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка'
+        verbose_name_plural = 'Выгрузки'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['fingerprint', 'created_at'], name='exports_job_fp_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.get_status_display()})"
+
+    @property
+    def is_ready(self):
+        return self.status == self.STATUS_DONE and bool(self.file) and os.path.exists(self.file.path)
+
+    def as_dict(self):
+        return {
+            'id': str(self.pk),
+            'kind': self.kind,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'filename': self.filename,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'status_url': reverse('exports:job_status', args=[self.pk]),
+            'download_url': reverse('exports:job_download', args=[self.pk]),
+        }
@@ -0,0 +1,103 @@
+"""
+Фоновые выгрузки.
+
+Представление вызывает export_response(): по типу выгрузки и параметрам
+ищется готовый или формирующийся файл с теми же параметрами за последние
+EXPORT_JOB_REUSE_TTL секунд, иначе создаётся ExportJob и после коммита
+ставится задача apps.exports.tasks.run_export_job в очередь "exports".
+Клиент опрашивает exports:job_status или получает уведомление, когда файл
+готов. Если брокер недоступен, выгрузка формируется синхронно.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+RUN_EXPORT_TASK = 'apps.exports.tasks.run_export_job'
+
+# Тип выгрузки -> функция (params, fileobj) -> (имя файла, content type)
+EXPORT_KINDS = {
+    'requests_excel': 'apps.orders.exports.export_requests',
+    'client_requests_excel': 'apps.orders.exports.export_client_requests',
+    'financial_report_excel': 'apps.finance.exports.export_financial_report_excel',
+    'financial_report_csv': 'apps.finance.exports.export_financial_report_csv',
+    'journal_entry': 'apps.finance.exports.export_journal_entry',
+}
+
+DEFAULT_REUSE_TTL = 600
+
+
+def export_fingerprint(kind, params):
+    payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def find_reusable_job(kind, params):
+    """Готовая или ещё формирующаяся выгрузка с теми же параметрами в пределах TTL"""
+    ttl = getattr(settings, 'EXPORT_JOB_REUSE_TTL', DEFAULT_REUSE_TTL)
+    jobs = ExportJob.objects.filter(
+        fingerprint=export_fingerprint(kind, params),
+        status__in=ExportJob.ACTIVE_STATUSES,
+        created_at__gte=timezone.now() - timedelta(seconds=ttl),
+    ).order_by('-created_at')
+    for job in jobs:
+        # Файл могли удалить с диска — такую выгрузку не переиспользуем
+        if job.status != ExportJob.STATUS_DONE or job.is_ready:
+            return job
+    return None
+
+
+def start_export(kind, params, user=None):
+    """Возвращает (выгрузка, создана ли новая)"""
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Неизвестный тип выгрузки: {kind}")
+    job = find_reusable_job(kind, params)
+    if job:
+        return job, False
+    job = ExportJob.objects.create(
+        kind=kind,
+        params=params,
+        fingerprint=export_fingerprint(kind, params),
+        user=user if user is not None and user.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: dispatch_export_job(job.pk))
+    return job, True
+
+
+def dispatch_export_job(job_id):
+    """Ставит задачу в очередь; при недоступном брокере выполняет её сразу"""
+    try:
+        from core.celery import app
+        app.send_task(RUN_EXPORT_TASK, args=[str(job_id)])
+    except Exception as e:
+        logger.warning(f"Не удалось поставить выгрузку {job_id} в очередь, выполняем синхронно: {e}")
+        from .tasks import run_export_job
+        run_export_job(str(job_id))
+
+
+def wants_json(request):
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or 'application/json' in request.headers.get('accept', '')
+    )
+
+
+def export_response(request, kind, params):
+    """
+    Ответ представления выгрузки: JSON со статусом для AJAX-клиентов,
+    иначе редирект на страницу скачивания (она ждёт готовности файла).
+    """
+    job, _ = start_export(kind, params, request.user)
+    if wants_json(request):
+        return JsonResponse(job.as_dict(), status=200 if job.is_ready else 202)
+    return redirect('exports:job_download', job_id=job.pk)
@@ -0,0 +1,100 @@
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files import File
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ExportJob
+from .services import EXPORT_KINDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILE_RETENTION = 86400
+
+
+@shared_task
+def run_export_job(job_id):
+    """Формирует файл выгрузки и уведомляет пользователя"""
+    # Забираем выгрузку атомарно: повторная доставка задачи не формирует файл дважды
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+        status=ExportJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return 'skipped'
+
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        build = import_string(EXPORT_KINDS[job.kind])
+        with tempfile.TemporaryFile() as tmp:
+            filename, content_type = build(job.params, tmp)
+            tmp.seek(0)
+            extension = os.path.splitext(filename)[1]
+            job.file.save(f"{job.pk}{extension}", File(tmp), save=False)
+        job.filename = filename
+        job.content_type = content_type
+        job.status = ExportJob.STATUS_DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'filename', 'content_type', 'status', 'finished_at'])
+    except Exception as e:
+        logger.exception(f"Ошибка формирования выгрузки {job_id}")
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+
+    notify_export_finished(job)
+    return job.status
+
+
+def notify_export_finished(job):
+    if not job.user_id:
+        return
+    from apps.notifications.models import Notification
+    from apps.notifications.utils import NotificationService
+
+    if job.status == ExportJob.STATUS_DONE:
+        title = 'Выгрузка готова'
+        message = f"Файл {job.filename} готов к скачиванию"
+        notification_type = 'success'
+    else:
+        title = 'Ошибка выгрузки'
+        message = f"Не удалось сформировать выгрузку: {job.error}"
+        notification_type = 'error'
+
+    download_url = reverse('exports:job_download', args=[job.pk])
+    notification = NotificationService().send_notification(
+        recipient=job.user,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        action_url=download_url,
+        action_text='Скачать',
+    )
+    if notification is None:
+        # NotificationService не смог создать уведомление — пишем напрямую
+        Notification.objects.create(
+            user=job.user,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+        )
+
+
+@shared_task
+def cleanup_old_exports():
+    """Удаляет выгрузки и их файлы старше EXPORT_FILE_RETENTION секунд"""
+    retention = getattr(settings, 'EXPORT_FILE_RETENTION', DEFAULT_FILE_RETENTION)
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    deleted = 0
+    for job in ExportJob.objects.filter(created_at__lt=cutoff).iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return f"Удалено выгрузок: {deleted}"
@@ -0,0 +1,118 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.finance.models import FinancialReport
+from apps.notifications.models import Notification
+from apps.users.models import User
+from .models import ExportJob
+from .services import start_export
+from .tasks import cleanup_old_exports, run_export_job
+
+
+def run_eagerly(name, args):
+    run_export_job(*args)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExportJobTest(TestCase):
+    """Фоновые выгрузки: постановка в очередь, статус, скачивание, повторное использование"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='accountant', password='testpass123')
+        self.client.force_login(self.user)
+        self.report = FinancialReport.objects.create(
+            title='Отчет', report_type='monthly', created_by=self.user,
+            start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+        )
+        self.csv_url = reverse('finance:financial_report_export_csv', args=[self.report.pk])
+
+    def _request(self, url, **extra):
+        with mock.patch('core.celery.app.send_task', side_effect=run_eagerly) as send_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url, **extra)
+        return response, send_task
+
+    def test_view_enqueues_job_and_returns_status(self):
+        with mock.patch('core.celery.app.send_task') as send_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(self.csv_url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get()
+        send_task.assert_called_once_with('apps.exports.tasks.run_export_job', args=[str(job.pk)])
+        self.assertEqual(response.json()['status'], 'pending')
+
+        status = self.client.get(reverse('exports:job_status', args=[job.pk]))
+        self.assertEqual(status.json()['status'], 'pending')
+        # Пока файл не готов — страница ожидания
+        self.assertEqual(self.client.get(reverse('exports:job_download', args=[job.pk])).status_code, 202)
+
+    def test_job_writes_file_and_notifies(self):
+        response, _ = self._request(self.csv_url)
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('exports:job_download', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertTrue(job.file.name.startswith('exports/'))
+
+        download = self.client.get(response['Location'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('financial_report_', download['Content-Disposition'])
+        content = b''.join(download.streaming_content).decode('utf-8')
+        self.assertIn('Название,Отчет', content)
+        self.assertTrue(Notification.objects.filter(user=self.user, title='Выгрузка готова').exists())
+
+    def test_identical_params_reuse_artifact(self):
+        self._request(self.csv_url)
+        response, send_task = self._request(self.csv_url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ExportJob.objects.count(), 1)
+        send_task.assert_not_called()
+
+        # Другие параметры — новая выгрузка
+        self._request(reverse('finance:financial_report_export_excel', args=[self.report.pk]))
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+    def test_expired_artifact_is_regenerated(self):
+        self._request(self.csv_url)
+        ExportJob.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self._request(self.csv_url)
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+    def test_failed_job(self):
+        job, _ = start_export('financial_report_csv', {'report_id': 999999}, self.user)
+        run_export_job(str(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        # Упавшая выгрузка не переиспользуется
+        new_job, created = start_export('financial_report_csv', {'report_id': 999999}, self.user)
+        self.assertTrue(created)
+        self.assertNotEqual(new_job.pk, job.pk)
+
+    def test_broker_unavailable_runs_synchronously(self):
+        with mock.patch('core.celery.app.send_task', side_effect=ConnectionError('broker down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(self.csv_url)
+        self.assertEqual(ExportJob.objects.get().status, ExportJob.STATUS_DONE)
+
+    def test_journal_entry_export(self):
+        url = reverse('finance:journal_entry_export', args=['xml'])
+        self._request(url + '?date=2025-01-05&memo=Тест&line_1_account=50&line_1_debit=100')
+        job = ExportJob.objects.get()
+        self.assertEqual(job.params['lines'][0]['debit'], 100.0)
+        with job.file.open('rb') as f:
+            self.assertIn('<account>50</account>', f.read().decode('utf-8'))
+        self.assertEqual(self.client.get(reverse('finance:journal_entry_export', args=['pdf'])).status_code, 400)
+
+    def test_cleanup_old_exports(self):
+        self._request(self.csv_url)
+        job = ExportJob.objects.get()
+        path = job.file.path
+        ExportJob.objects.update(created_at=timezone.now() - timedelta(days=2))
+        cleanup_old_exports()
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,27 @@
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+
+from .models import ExportJob
+
+
+@login_required
+def job_status(request, job_id):
+    """Лёгкий статус выгрузки для опроса клиентом"""
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return JsonResponse(job.as_dict())
+
+
+@login_required
+def job_download(request, job_id):
+    """Отдаёт готовый файл; пока выгрузка формируется — страница ожидания"""
+    job = get_object_or_404(ExportJob, pk=job_id)
+    if job.is_ready:
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=job.filename,
+            content_type=job.content_type or None,
+        )
+    status = 500 if job.status == ExportJob.STATUS_FAILED else 202
+    return render(request, 'exports/job_wait.html', {'job': job}, status=status)
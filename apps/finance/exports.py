@@ -0,0 +1,118 @@
+"""
+Финансовые выгрузки, формируемые в фоне (см. apps.exports).
+Каждая функция принимает параметры выгрузки и файловый объект и
+возвращает (имя файла, content type).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from .models import Expense, FinancialReport, Income
+
+JOURNAL_EXPORT_FORMATS = ('json', 'xml')
+
+
+def export_financial_report_excel(params, fileobj):
+    report = FinancialReport.objects.get(pk=params['report_id'])
+    report.calculate_totals()
+    # Генерируем HTML-таблицу, совместимую с Excel
+    html = []
+    html.append('<html><head><meta charset="utf-8"></head><body>')
+    html.append(f'<h2>{report.title}</h2>')
+    html.append(f'<p>Период: {report.start_date} - {report.end_date}</p>')
+    html.append('<table border="1" cellspacing="0" cellpadding="4">')
+    html.append('<tr><th>Показатель</th><th>Значение</th></tr>')
+    html.append(f'<tr><td>Общий доход</td><td>{report.total_income}</td></tr>')
+    html.append(f'<tr><td>Общий расход</td><td>{report.total_expenses}</td></tr>')
+    html.append(f'<tr><td>Чистая прибыль</td><td>{report.net_income}</td></tr>')
+    html.append(f'<tr><td>Операционный доход</td><td>{report.operating_income}</td></tr>')
+    html.append(f'<tr><td>Общие активы</td><td>{report.total_assets}</td></tr>')
+    html.append('</table>')
+    # Детализация доходов/расходов
+    incomes = Income.objects.filter(date__range=[report.start_date, report.end_date]).order_by('-amount')[:500]
+    expenses = Expense.objects.filter(
+        date__range=[report.start_date, report.end_date]
+    ).select_related('category', 'supplier').order_by('-amount')[:500]
+    html.append('<h3>Доходы</h3>')
+    html.append('<table border="1" cellspacing="0" cellpadding="4">')
+    html.append('<tr><th>Дата</th><th>Тип</th><th>Сумма</th><th>Описание</th></tr>')
+    for inc in incomes:
+        html.append(f'<tr><td>{inc.date}</td><td>{inc.get_income_type_display()}</td><td>{inc.amount}</td><td>{inc.description}</td></tr>')
+    html.append('</table>')
+    html.append('<h3>Расходы</h3>')
+    html.append('<table border="1" cellspacing="0" cellpadding="4">')
+    html.append('<tr><th>Дата</th><th>Категория</th><th>Поставщик</th><th>Сумма</th><th>Описание</th></tr>')
+    for exp in expenses:
+        cat = exp.category.name if exp.category_id else ''
+        supp = exp.supplier.name if exp.supplier_id else ''
+        html.append(f'<tr><td>{exp.date}</td><td>{cat}</td><td>{supp}</td><td>{exp.amount}</td><td>{exp.description}</td></tr>')
+    html.append('</table>')
+    html.append('</body></html>')
+    fileobj.write(''.join(html).encode('utf-8'))
+    return f'financial_report_{report.pk}.xls', 'application/vnd.ms-excel; charset=utf-8'
+
+
+def export_financial_report_csv(params, fileobj):
+    report = FinancialReport.objects.get(pk=params['report_id'])
+    # Ensure totals are up to date
+    report.calculate_totals()
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(['Название', report.title])
+    writer.writerow(['Период', f"{report.start_date} - {report.end_date}"])
+    writer.writerow([])
+    writer.writerow(['Показатель', 'Значение'])
+    writer.writerow(['Общий доход', report.total_income])
+    writer.writerow(['Общий расход', report.total_expenses])
+    writer.writerow(['Чистая прибыль', report.net_income])
+    writer.writerow(['Операционный доход', report.operating_income])
+    writer.writerow(['Общие активы', report.total_assets])
+    text.flush()
+    # Файл закрывает вызывающий код
+    text.detach()
+    return f'financial_report_{report.pk}.csv', 'text/csv; charset=utf-8'
+
+
+def export_journal_entry(params, fileobj):
+    """Экспорт журнальной операции (параметры собирает journal_entry_export)"""
+    export_format = params['format']
+    date = params.get('date', '')
+    memo = params.get('memo', '')
+    posted = params.get('posted', False)
+    lines = params.get('lines', [])
+    exported_at = datetime.now().isoformat()
+
+    if export_format == 'json':
+        operation_data = {
+            'date': date,
+            'memo': memo,
+            'posted': posted,
+            'lines': lines,
+            'exported_at': exported_at,
+            'export_format': export_format
+        }
+        fileobj.write(json.dumps(operation_data, indent=2, ensure_ascii=False).encode('utf-8'))
+        return f'journal_entry_{date}.json', 'application/json'
+
+    xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+<journal_entry>
+	<date>{date}</date>
+	<memo>{memo}</memo>
+	<posted>{posted}</posted>
+	<lines>"""
+    for line in lines:
+        xml_content += f"""
+		<line>
+			<account>{line['account']}</account>
+			<debit>{line['debit']}</debit>
+			<credit>{line['credit']}</credit>
+			<description>{line['description']}</description>
+		</line>"""
+    xml_content += """
+	</lines>
+	<exported_at>{}</exported_at>
+	<export_format>{}</export_format>
+</journal_entry>""".format(exported_at, export_format)
+    fileobj.write(xml_content.encode('utf-8'))
+    return f'journal_entry_{date}.xml', 'application/xml'
@@ -4,6 +4,11 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 from django.utils import timezone
+from django.db import transaction
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -638,45 +643,99 @@ class Request(models.Model):
     
     def approve_and_create_order(self, admin_user):
         """Одобряет заявку и создает заказ"""
-        from apps.orders.models import Order, OrderItem, create_order_stages
-        
-        if self.status != 'pending':
-            return False, "Заявка уже не в статусе ожидания"
-        
-        # Создаем заказ
-        order = Order.objects.create(
-            name=self.name,
-            client=self.client,
-            status='production',
-            comment=self.comment
-        )
+        result = Request.bulk_approve_and_create_orders([self.pk], admin_user)[0]
+        if result['success']:
+            self.refresh_from_db(fields=['status', 'order', 'updated_at'])
+        return result['success'], result['message']
+    
+    @classmethod
+    def bulk_approve_and_create_orders(cls, request_ids, admin_user):
+        """
+        Одобряет несколько заявок за один вызов.
         
-        # Создаем позиции заказа из заявки
-        for item in self.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                size=item.size,
-                color=item.color,
-                glass_type=item.glass_type,
-                paint_type=item.paint_type,
-                paint_color=item.paint_color,
-                cnc_specs=item.cnc_specs,
-                cutting_specs=item.cutting_specs,
-                preparation_specs=item.preparation_specs,
-                packaging_notes=item.packaging_notes
-            )
+        Все заявки обрабатываются в одной транзакции, каждая — в своей точке
+        сохранения, поэтому ошибка в одной заявке не откатывает остальные.
+        На заявку приходится постоянное число запросов: заказ, позиции и
+        стартовые этапы создаются через bulk_create независимо от числа позиций.
         
-        # Создаем этапы заказа
-        create_order_stages(order)
+        Возвращает список словарей (в порядке request_ids):
+        request_id, success, message, order_id, duration_ms.
+        """
+        from apps.odashboard.facts import mark_dirty
+        from apps.odashboard.models import DailyProductionFact
+        from apps.orders.charts import invalidate_day
+        from apps.orders.models import Order, OrderItem, build_initial_stages
+        from apps.orders.workflow import create_stages
         
-        # Обновляем статус заявки
-        self.status = 'in_production'
-        self.order = order
-        self.save()
+        results = []
+        with transaction.atomic():
+            requests = cls.objects.select_for_update().filter(pk__in=request_ids).select_related('client')
+            requests = {req.pk: req for req in requests.prefetch_related(
+                models.Prefetch('items', queryset=RequestItem.objects.select_related('product').order_by('id'))
+            )}
+            
+            for request_id in request_ids:
+                started = time.perf_counter()
+                req = requests.get(request_id)
+                result = {'request_id': request_id, 'success': False, 'order_id': None}
+                if req is None:
+                    result['message'] = "Заявка не найдена"
+                elif req.status != 'pending':
+                    result['message'] = "Заявка уже не в статусе ожидания"
+                else:
+                    try:
+                        with transaction.atomic():
+                            # bulk_create не вызывает post_save Order: этапы строим сами
+                            order = Order.objects.bulk_create([Order(
+                                name=req.name,
+                                client=req.client,
+                                status='production',
+                                comment=req.comment,
+                            )])[0]
+                            
+                            order_items = OrderItem.objects.bulk_create([
+                                OrderItem(
+                                    order=order,
+                                    product=item.product,
+                                    quantity=item.quantity,
+                                    size=item.size,
+                                    color=item.color,
+                                    # Как в OrderItem.save(): стеклу по умолчанию пескоструйный тип
+                                    glass_type=item.glass_type or ('sandblasted' if item.product.is_glass else ''),
+                                    paint_type=item.paint_type,
+                                    paint_color=item.paint_color,
+                                    cnc_specs=item.cnc_specs,
+                                    cutting_specs=item.cutting_specs,
+                                    preparation_specs=item.preparation_specs,
+                                    packaging_notes=item.packaging_notes,
+                                )
+                                for item in req.items.all()
+                            ])
+                            
+                            create_stages(build_initial_stages(order, order_items))
+                            # bulk_create не вызывает и post_save OrderItem: продажи
+                            # дня заказа в сводке и графике выручки обновляем сами
+                            mark_dirty(DailyProductionFact.SOURCE_ORDER_ITEM, order.created_at)
+                            invalidate_day(order.created_at)
+                            
+                            cls.objects.filter(pk=req.pk).update(
+                                status='in_production',
+                                order=order,
+                                updated_at=timezone.now(),
+                            )
+                            req.status = 'in_production'
+                        result.update(
+                            success=True,
+                            order_id=order.id,
+                            message=f"Заявка одобрена, создан заказ #{order.id}",
+                        )
+                    except Exception as e:
+                        logger.warning(f"Ошибка одобрения заявки {request_id}: {e}")
+                        result['message'] = f"Ошибка одобрения заявки: {e}"
+                result['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                results.append(result)
         
-        return True, f"Заявка одобрена, создан заказ #{order.id}"
+        return results
 
 
 class RequestItem(models.Model):
@@ -2,6 +2,7 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from decimal import Decimal
+from django.db.models import Sum
 from datetime import date, timedelta
 
 User = get_user_model()
@@ -451,3 +452,76 @@ class FinanceFormsTestCase(TestCase):
         form = MoneyMovementForm(data=data)
         self.assertFalse(form.is_valid())
         self.assertIn('amount', form.errors)
+
+
+class RequestBulkApprovalTestCase(TestCase):
+    """Тесты пакетного одобрения заявок"""
+    
+    def setUp(self):
+        from apps.clients.models import Client as FactoryClient
+        from apps.operations.workshops.models import Workshop
+        from apps.products.models import Product
+        from .models import Request, RequestItem
+        
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        client = FactoryClient.objects.create(name='Клиент')
+        for pk, name in [(1, 'Распиловка'), (4, 'Пресс')]:
+            Workshop.objects.create(pk=pk, name=name)
+        door = Product.objects.create(name='Дверь')
+        glass = Product.objects.create(name='Стеклянная дверь', is_glass=True)
+        
+        self.regular_request = Request.objects.create(name='Обычная', client=client)
+        for _ in range(50):
+            RequestItem.objects.create(request=self.regular_request, product=door, quantity=2)
+        self.glass_request = Request.objects.create(name='Со стеклом', client=client)
+        RequestItem.objects.create(request=self.glass_request, product=door, quantity=1)
+        RequestItem.objects.create(request=self.glass_request, product=glass, quantity=3)
+    
+    def test_bulk_approve_creates_orders_items_and_stages(self):
+        from .models import Request
+        
+        results = Request.bulk_approve_and_create_orders(
+            [self.regular_request.pk, self.glass_request.pk, self.regular_request.pk], self.admin
+        )
+        self.assertEqual([r['success'] for r in results], [True, True, False])
+        self.assertTrue(all('duration_ms' in r for r in results))
+        
+        self.regular_request.refresh_from_db()
+        self.assertEqual(self.regular_request.status, 'in_production')
+        order = self.regular_request.order
+        self.assertEqual(order.items.count(), 50)
+        stages = order.stages.order_by('workshop_id')
+        self.assertEqual([s.workshop_id for s in stages], [1, 4])
+        self.assertTrue(all(s.plan_quantity == 100 and s.parallel_group is None for s in stages))
+        
+        glass_order = Request.objects.get(pk=self.glass_request.pk).order
+        self.assertEqual(set(glass_order.stages.values_list('parallel_group', flat=True)), {1})
+        self.assertEqual(glass_order.items.get(product__is_glass=True).glass_type, 'sandblasted')
+    
+    def test_bulk_approve_updates_sales_facts(self):
+        from apps.odashboard.models import DailyProductionFact
+        from .models import Request
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Request.bulk_approve_and_create_orders([self.regular_request.pk, self.glass_request.pk], self.admin)
+        sales = DailyProductionFact.objects.filter(source=DailyProductionFact.SOURCE_ORDER_ITEM).aggregate(
+            total=Sum('sales_quantity')
+        )['total']
+        self.assertEqual(sales, 104)
+    
+    def test_query_count_does_not_depend_on_items(self):
+        from .models import Request
+        
+        # Прогреваем кэш цехов маршрутизации
+        from apps.orders.routing import start_steps
+        start_steps(None)
+        with self.assertNumQueries(10):
+            Request.bulk_approve_and_create_orders([self.regular_request.pk], self.admin)
+    
+    def test_single_approval_delegates(self):
+        success, message = self.glass_request.approve_and_create_order(self.admin)
+        self.assertTrue(success)
+        self.assertEqual(self.glass_request.status, 'in_production')
+        self.assertIn(str(self.glass_request.order_id), message)
+        success, _ = self.glass_request.approve_and_create_order(self.admin)
+        self.assertFalse(success)
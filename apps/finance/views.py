@@ -543,44 +543,9 @@ def financial_report_create(request):
 
 @login_required
 def financial_report_export_excel(request, pk):
+	from apps.exports.services import export_response
 	report = get_object_or_404(FinancialReport, pk=pk)
-	report.calculate_totals()
-	from django.http import HttpResponse
-	# Генерируем HTML-таблицу, совместимую с Excel
-	html = []
-	html.append('<html><head><meta charset="utf-8"></head><body>')
-	html.append(f'<h2>{report.title}</h2>')
-	html.append(f'<p>Период: {report.start_date} - {report.end_date}</p>')
-	html.append('<table border="1" cellspacing="0" cellpadding="4">')
-	html.append('<tr><th>Показатель</th><th>Значение</th></tr>')
-	html.append(f'<tr><td>Общий доход</td><td>{report.total_income}</td></tr>')
-	html.append(f'<tr><td>Общий расход</td><td>{report.total_expenses}</td></tr>')
-	html.append(f'<tr><td>Чистая прибыль</td><td>{report.net_income}</td></tr>')
-	html.append(f'<tr><td>Операционный доход</td><td>{report.operating_income}</td></tr>')
-	html.append(f'<tr><td>Общие активы</td><td>{report.total_assets}</td></tr>')
-	html.append('</table>')
-	# Детализация доходов/расходов
-	incomes = Income.objects.filter(date__range=[report.start_date, report.end_date]).order_by('-amount')[:500]
-	expenses = Expense.objects.filter(date__range=[report.start_date, report.end_date]).order_by('-amount')[:500]
-	html.append('<h3>Доходы</h3>')
-	html.append('<table border="1" cellspacing="0" cellpadding="4">')
-	html.append('<tr><th>Дата</th><th>Тип</th><th>Сумма</th><th>Описание</th></tr>')
-	for inc in incomes:
-		html.append(f'<tr><td>{inc.date}</td><td>{inc.get_income_type_display()}</td><td>{inc.amount}</td><td>{inc.description}</td></tr>')
-	html.append('</table>')
-	html.append('<h3>Расходы</h3>')
-	html.append('<table border="1" cellspacing="0" cellpadding="4">')
-	html.append('<tr><th>Дата</th><th>Категория</th><th>Поставщик</th><th>Сумма</th><th>Описание</th></tr>')
-	for exp in expenses:
-		cat = exp.category.name if exp.category_id else ''
-		supp = exp.supplier.name if exp.supplier_id else ''
-		html.append(f'<tr><td>{exp.date}</td><td>{cat}</td><td>{supp}</td><td>{exp.amount}</td><td>{exp.description}</td></tr>')
-	html.append('</table>')
-	html.append('</body></html>')
-	content = ''.join(html)
-	response = HttpResponse(content, content_type='application/vnd.ms-excel; charset=utf-8')
-	response['Content-Disposition'] = f'attachment; filename="financial_report_{report.pk}.xls"'
-	return response
+	return export_response(request, 'financial_report_excel', {'report_id': report.pk})
 
 # Уточним детальный отчет: добавим разбивки и топы
 @login_required
@@ -644,24 +609,9 @@ def financial_report_delete(request, pk):
 
 @login_required
 def financial_report_export_csv(request, pk):
+	from apps.exports.services import export_response
 	report = get_object_or_404(FinancialReport, pk=pk)
-	# Ensure totals are up to date
-	report.calculate_totals()
-	import csv
-	from django.http import HttpResponse
-	response = HttpResponse(content_type='text/csv; charset=utf-8')
-	response['Content-Disposition'] = f'attachment; filename="financial_report_{report.pk}.csv"'
-	writer = csv.writer(response)
-	writer.writerow(['Название', report.title])
-	writer.writerow(['Период', f"{report.start_date} - {report.end_date}"])
-	writer.writerow([])
-	writer.writerow(['Показатель', 'Значение'])
-	writer.writerow(['Общий доход', report.total_income])
-	writer.writerow(['Общий расход', report.total_expenses])
-	writer.writerow(['Чистая прибыль', report.net_income])
-	writer.writerow(['Операционный доход', report.operating_income])
-	writer.writerow(['Общие активы', report.total_assets])
-	return response
+	return export_response(request, 'financial_report_csv', {'report_id': report.pk})
 
 # ==================== API ДЛЯ AJAX ====================
 @login_required
@@ -1019,10 +969,9 @@ def journal_entry_add_line(request, pk):
 
 @login_required
 def journal_entry_export(request, format):
-	"""Экспорт журнальной операции в различных форматах"""
-	from django.http import JsonResponse, HttpResponse
-	import json
-	from datetime import datetime
+	"""Экспорт журнальной операции в различных форматах (фоновая выгрузка, см. apps.exports)"""
+	from apps.exports.services import export_response
+	from .exports import JOURNAL_EXPORT_FORMATS
 	
 	# Получаем данные из запроса
 	date = request.GET.get('date', '')
@@ -1034,8 +983,8 @@ def journal_entry_export(request, format):
 	line_index = 1
 	while True:
 		account = request.GET.get(f'line_{line_index}_account', '')
-		debit = request.GET.get(f'line_{line_index}_debit', '0')
-		credit = request.GET.get(f'line_{line_index}_credit', '0')
+		debit = request.GET.get(f'line_{line_index}_debit', '')
+		credit = request.GET.get(f'line_{line_index}_credit', '')
 		description = request.GET.get(f'line_{line_index}_description', '')
 		
 		if not account and not debit and not credit:
@@ -1049,46 +998,16 @@ def journal_entry_export(request, format):
 		})
 		line_index += 1
 	
-	# Формируем данные операции
-	operation_data = {
+	if format not in JOURNAL_EXPORT_FORMATS:
+		return JsonResponse({'error': 'Неподдерживаемый формат экспорта'}, status=400)
+	
+	return export_response(request, 'journal_entry', {
+		'format': format,
 		'date': date,
 		'memo': memo,
 		'posted': posted,
 		'lines': lines,
-		'exported_at': datetime.now().isoformat(),
-		'export_format': format
-	}
-	
-	if format == 'json':
-		return JsonResponse(operation_data, json_dumps_params={'indent': 2})
-	elif format == 'xml':
-		xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<journal_entry>
-	<date>{date}</date>
-	<memo>{memo}</memo>
-	<posted>{posted}</posted>
-	<lines>"""
-		
-		for line in lines:
-			xml_content += f"""
-		<line>
-			<account>{line['account']}</account>
-			<debit>{line['debit']}</debit>
-			<credit>{line['credit']}</credit>
-			<description>{line['description']}</description>
-		</line>"""
-		
-		xml_content += """
-	</lines>
-	<exported_at>{}</exported_at>
-	<export_format>{}</export_format>
-</journal_entry>""".format(datetime.now().isoformat(), format)
-		
-		response = HttpResponse(xml_content, content_type='application/xml')
-		response['Content-Disposition'] = f'attachment; filename="journal_entry_{date}.xml"'
-		return response
-	else:
-		return JsonResponse({'error': 'Неподдерживаемый формат экспорта'}, status=400)
+	})
 
 @login_required
 def trial_balance(request):
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from . import counters, delivery
 from .models import (
     Notification, NotificationType, NotificationTemplate,
     NotificationGroup, NotificationPreference, NotificationLog
@@ -49,7 +50,7 @@ class NotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read']
     
     def mark_as_read(self, request, queryset):
-        updated = queryset.update(is_read=True)
+        updated = counters.mark_read(queryset)
         self.message_user(request, f'{updated} уведомлений отмечено как прочитанные')
     mark_as_read.short_description = 'Отметить как прочитанные'
 
@@ -207,6 +208,13 @@ class NotificationLogAdmin(admin.ModelAdmin):
         return mark_safe(f'<div style="white-space:pre-wrap;">{obj.error_message or "-"}</div>')
     error_display.short_description = 'Ошибка'
     
+    actions = ['requeue']
+    
+    def requeue(self, request, queryset):
+        requeued = delivery.requeue(queryset)
+        self.message_user(request, f'{requeued} недоставленных уведомлений возвращено в очередь')
+    requeue.short_description = 'Повторить доставку недоставленных'
+    
     def get_queryset(self, request):
         """Оптимизация запросов"""
         return super().get_queryset(request).select_related('notification')
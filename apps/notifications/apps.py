@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.notifications'
-    verbose_name = 'Уведомления' 
\ No newline at end of file
+    verbose_name = 'Уведомления'
+
+    def ready(self):
+        # Счётчики непрочитанных (apps.notifications.counters)
+        import apps.notifications.signals  # noqa: F401
@@ -0,0 +1,128 @@
+"""
+Каналы доставки уведомлений: email, push, SMS.
+
+Адаптер канала отправляет пачку уведомлений за один вызов и возвращает
+{notification_id: текст ошибки или None}; ошибка одного получателя не мешает
+остальным. Набор адаптеров задаёт настройка NOTIFICATION_CHANNEL_BACKEND:
+'live' — настоящая отправка (email через Django email backend, одно
+SMTP-соединение на пачку); 'local' — LocalChannel в памяти процесса, без сети
+(тесты, разработка).
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+
+logger = logging.getLogger(__name__)
+
+EMAIL = 'email'
+PUSH = 'push'
+SMS = 'sms'
+# Канал -> поле NotificationPreference, которое его включает
+PREFERENCE_FIELDS = {
+    EMAIL: 'email_notifications',
+    PUSH: 'push_notifications',
+    SMS: 'sms_notifications',
+}
+
+
+class EmailChannel:
+    """Письма через Django email backend, одно соединение на пачку"""
+    name = EMAIL
+
+    def _message(self, notification):
+        context = {'notification': notification, 'user': notification.user}
+        email = EmailMultiAlternatives(
+            subject=f"Уведомление: {notification.title}",
+            body=render_to_string('notifications/email/notification.txt', context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.user.email],
+        )
+        email.attach_alternative(render_to_string('notifications/email/notification.html', context), 'text/html')
+        return email
+
+    def send(self, notifications):
+        results = {}
+        connection = get_connection()
+        try:
+            connection.open()
+            for notification in notifications:
+                if not notification.user.email:
+                    results[notification.pk] = "У пользователя не указан email"
+                    continue
+                try:
+                    connection.send_messages([self._message(notification)])
+                    results[notification.pk] = None
+                except Exception as e:
+                    logger.error(f"Ошибка отправки email уведомления {notification.pk}: {e}")
+                    results[notification.pk] = str(e)
+        except Exception as e:
+            # Не удалось подключиться — вся пачка уйдёт на повтор
+            logger.error(f"Ошибка подключения к почтовому серверу: {e}")
+            for notification in notifications:
+                results.setdefault(notification.pk, str(e))
+        finally:
+            connection.close()
+        return results
+
+
+class LogChannel:
+    """Канал без подключённого провайдера: только пишет в лог"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def send(self, notifications):
+        # Здесь должна быть логика отправки через провайдера (FCM, Web Push, SMS-шлюз)
+        for notification in notifications:
+            logger.info(f"{self.name}: уведомление {notification.pk} для пользователя {notification.user_id}")
+        return {notification.pk: None for notification in notifications}
+
+
+class LocalChannel:
+    """Канал в памяти процесса: отправленное копится в outbox, сбои задаются fail_next"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.outbox = []
+        self._failures = 0
+
+    def fail_next(self, count=1):
+        """Следующие count отправок завершатся ошибкой"""
+        with self._lock:
+            self._failures = count
+
+    def send(self, notifications):
+        with self._lock:
+            if self._failures:
+                self._failures -= 1
+                return {notification.pk: f"{self.name}: канал недоступен" for notification in notifications}
+            self.outbox.extend((notification.pk, notification.user_id, notification.title) for notification in notifications)
+        return {notification.pk: None for notification in notifications}
+
+    def clear(self):
+        with self._lock:
+            self.outbox = []
+            self._failures = 0
+
+
+_backends = {
+    'live': {EMAIL: EmailChannel(), PUSH: LogChannel(PUSH), SMS: LogChannel(SMS)},
+    'local': {EMAIL: LocalChannel(EMAIL), PUSH: LocalChannel(PUSH), SMS: LocalChannel(SMS)},
+}
+
+
+def get(name):
+    """Адаптер канала name для текущей настройки NOTIFICATION_CHANNEL_BACKEND"""
+    return _backends[getattr(settings, 'NOTIFICATION_CHANNEL_BACKEND', 'live')][name]
+
+
+def enabled(preference, user):
+    """Каналы, включённые в настройках пользователя (без настроек — значения по умолчанию)"""
+    return [
+        name for name, field in PREFERENCE_FIELDS.items()
+        if getattr(preference, field) and (name != EMAIL or user.email)
+    ]
@@ -0,0 +1,172 @@
+"""
+Счётчики непрочитанных уведомлений.
+
+Число непрочитанных хранится в Django cache по ключу на пользователя и меняется
+на месте: +1 при создании уведомления (сигнал post_save), -N при отметке
+прочитанными (Notification.mark_as_read, mark_read). Сдвиги делаются после
+коммита, чтобы откат транзакции не сбивал счётчик. Если ключа нет, он
+заполняется одним COUNT при чтении; любое другое изменение уведомления
+(редактирование, удаление) просто сбрасывает ключ.
+
+reconcile() периодически сверяет закэшированные счётчики с базой и исправляет
+расхождения (гонки между COUNT и сдвигом, записи в обход модели).
+
+Счётчик в кэше имеет смысл, только если кэш общий для процессов (CACHE_SHARED,
+Redis): иначе уведомление, созданное в Celery или другом воркере gunicorn, не
+сдвинет счётчики остальных процессов. Без общего кэша unread_count() — COUNT
+по базе (индекс notif_user_read_date_idx), сдвиги и сверка ничего не делают.
+
+При включённой настройке NOTIFICATIONS_UNREAD_STREAM вкладки не опрашивают
+счётчик: event_stream() отдаёт событие Server-Sent Events unread при подключении
+и при каждом изменении, читая только cache.
+"""
+import json
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'notifications:unread'
+# Пользователей в одной сверке get_many/set_many
+RECONCILE_BATCH_SIZE = 500
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def _enabled():
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATIONS_UNREAD_CACHE_TIMEOUT', 86400)
+
+
+def _count(user_id):
+    from .models import Notification
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    """Число непрочитанных уведомлений пользователя; без ключа — один COUNT"""
+    if not _enabled():
+        return _count(user_id)
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = _count(user_id)
+        # add, а не set: сдвиг, успевший записать ключ, не затирается
+        if not cache.add(_key(user_id), count, _timeout()):
+            count = cache.get(_key(user_id), count)
+    return max(count, 0)
+
+
+def _shift(deltas):
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(user_id), delta)
+        except ValueError:
+            # Ключа нет — следующее чтение посчитает по базе
+            pass
+
+
+def shift(deltas):
+    """Сдвигает счётчики на {user_id: delta} после коммита текущей транзакции"""
+    deltas = dict(deltas)
+    if deltas and _enabled():
+        transaction.on_commit(lambda: _shift(deltas))
+
+
+def forget(user_id):
+    """Сбрасывает счётчик пользователя: следующее чтение посчитает по базе"""
+    if not _enabled():
+        return
+    cache.delete(_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def mark_read(notifications):
+    """Отмечает прочитанными уведомления из queryset; возвращает число отмеченных"""
+    from .models import Notification
+    rows = list(notifications.filter(is_read=False).values_list('pk', 'user_id'))
+    if not rows:
+        return 0
+    updated = Notification.objects.filter(pk__in=[pk for pk, _ in rows], is_read=False).update(is_read=True)
+    users = Counter(user_id for _, user_id in rows)
+    if updated == len(rows):
+        shift({user_id: -count for user_id, count in users.items()})
+    else:
+        # Часть уведомлений отметил параллельный запрос — точный сдвиг неизвестен
+        for user_id in users:
+            forget(user_id)
+    return updated
+
+
+def reconcile(user_ids=None):
+    """Сверяет закэшированные счётчики с базой; возвращает число исправленных"""
+    if not _enabled():
+        return 0
+    from .models import Notification
+    notifications = Notification.objects.all()
+    if user_ids is not None:
+        notifications = notifications.filter(user_id__in=user_ids)
+    actual = dict(
+        notifications.values('user_id')
+        .annotate(unread=Count('pk', filter=Q(is_read=False)))
+        .values_list('user_id', 'unread')
+    )
+    if user_ids is not None:
+        for user_id in user_ids:
+            actual.setdefault(user_id, 0)
+
+    fixed = 0
+    items = list(actual.items())
+    for start in range(0, len(items), RECONCILE_BATCH_SIZE):
+        chunk = dict(items[start:start + RECONCILE_BATCH_SIZE])
+        cached = cache.get_many([_key(user_id) for user_id in chunk])
+        stale = {}
+        for user_id, unread in chunk.items():
+            value = cached.get(_key(user_id))
+            # Незакэшированные счётчики не заполняем: их посчитает первое чтение
+            if value is not None and value != unread:
+                logger.warning(f"Счётчик непрочитанных пользователя {user_id} расходится с базой: {value} != {unread}")
+                stale[_key(user_id)] = unread
+        cache.set_many(stale, _timeout())
+        fixed += len(stale)
+    return fixed
+
+
+def _event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+
+def event_stream(user_id, poll_interval=None, duration=None):
+    """SSE-поток счётчика: текущее значение при подключении, дальше только изменения.
+
+    Проверка изменения — чтение ключа из cache, без запросов к базе. Поток
+    закрывается через duration секунд (меньше timeout воркера gunicorn),
+    EventSource переподключается сам (retry).
+    """
+    poll_interval = poll_interval or getattr(settings, 'NOTIFICATIONS_UNREAD_POLL_INTERVAL', 5)
+    duration = duration or getattr(settings, 'NOTIFICATIONS_UNREAD_STREAM_DURATION', 25)
+    deadline = time.monotonic() + duration
+
+    current = unread_count(user_id)
+    yield f"retry: {int(poll_interval * 1000)}\n\n"
+    yield _event('unread', {'unread_count': current})
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        previous, current = current, unread_count(user_id)
+        if current == previous:
+            # Комментарий держит соединение через прокси
+            yield ": keepalive\n\n"
+            continue
+        yield _event('unread', {'unread_count': current})
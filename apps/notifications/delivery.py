@@ -0,0 +1,231 @@
+"""
+Доставка уведомлений по каналам.
+
+Запрос только сохраняет уведомление и ставит доставку в очередь: queue_logs()
+пишет запись NotificationLog (pending) на каждый включённый у пользователя
+канал и после коммита передаёт их id пачками по NOTIFICATION_DELIVERY_BATCH_SIZE
+в Celery-задачу своего канала (tasks.deliver_email/deliver_push/deliver_sms).
+
+Режим задаёт настройка NOTIFICATION_DELIVERY:
+- 'async' — Celery; при недоступном брокере пачка доставляется сразу;
+- 'sync' — сразу после коммита в том же процессе (так работают тесты).
+
+deliver() работает в три шага, чтобы не держать транзакцию и блокировки строк
+на время сетевых вызовов: короткой транзакцией забирает записи из очереди
+(статус sending), отправляет пачку через адаптер канала
+(apps.notifications.channels) вне транзакции и второй транзакцией записывает
+итог: sent; retrying — задача повторится с экспоненциальной задержкой; dead —
+после MAX_ATTEMPTS попыток. Недоставленные (dead) можно вернуть в очередь из
+админки (requeue).
+
+sent_at — время последней смены статуса воркером. Записи, которые дольше
+NOTIFICATION_DELIVERY_STALE_AFTER висят в pending/sending/retrying (задача
+потеряна брокером, воркер упал посреди отправки), периодическая задача
+tasks.retry_stalled_deliveries возвращает в очередь через sweep_stalled();
+старше NOTIFICATION_DELIVERY_MAX_AGE — помечает недоставленными.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import channels
+from .models import NotificationLog, NotificationPreference
+
+logger = logging.getLogger(__name__)
+
+DELIVER_TASKS = {
+    channels.EMAIL: 'apps.notifications.tasks.deliver_email',
+    channels.PUSH: 'apps.notifications.tasks.deliver_push',
+    channels.SMS: 'apps.notifications.tasks.deliver_sms',
+}
+MAX_ATTEMPTS = 5
+
+
+def async_enabled():
+    return getattr(settings, 'NOTIFICATION_DELIVERY', 'sync') == 'async'
+
+
+def _batch_size():
+    return getattr(settings, 'NOTIFICATION_DELIVERY_BATCH_SIZE', 100)
+
+
+def _stale_after():
+    return getattr(settings, 'NOTIFICATION_DELIVERY_STALE_AFTER', 900)
+
+
+def _max_age():
+    return getattr(settings, 'NOTIFICATION_DELIVERY_MAX_AGE', 86400)
+
+
+def backoff(attempt):
+    """Задержка перед повтором после попытки attempt (с нуля): 30 с, 60 с, 120 с..."""
+    return getattr(settings, 'NOTIFICATION_RETRY_BACKOFF', 30) * 2 ** attempt
+
+
+def queue_logs(notifications, preferences=None):
+    """Записи лога pending по включённым каналам и постановка их в очередь после коммита.
+
+    preferences — {user_id: NotificationPreference}; без него настройки читаются
+    одним запросом. Возвращает созданные записи.
+    """
+    if preferences is None:
+        preferences = {
+            preference.user_id: preference
+            for preference in NotificationPreference.objects.filter(
+                user_id__in={notification.user_id for notification in notifications}
+            )
+        }
+    logs = []
+    for notification in notifications:
+        # Без сохранённых настроек — значения по умолчанию модели
+        preference = preferences.get(notification.user_id) or NotificationPreference()
+        logs.extend(
+            NotificationLog(
+                notification=notification,
+                delivery_method=channel,
+                delivery_status=NotificationLog.STATUS_PENDING
+            )
+            for channel in channels.enabled(preference, notification.user)
+        )
+    NotificationLog.objects.bulk_create(logs, batch_size=_batch_size())
+    schedule(logs)
+    return logs
+
+
+def schedule(logs):
+    """Передаёт записи в задачи своих каналов пачками после коммита"""
+    by_channel = defaultdict(list)
+    for log in logs:
+        by_channel[log.delivery_method].append(log.pk)
+    size = _batch_size()
+    for channel, log_ids in by_channel.items():
+        for start in range(0, len(log_ids), size):
+            chunk = log_ids[start:start + size]
+            transaction.on_commit(lambda channel=channel, chunk=chunk: dispatch(channel, chunk))
+
+
+def dispatch(channel, log_ids):
+    """Ставит пачку в Celery; в режиме sync или без брокера доставляет сразу"""
+    if not async_enabled():
+        deliver_now(channel, log_ids)
+        return
+    try:
+        from core.celery import app
+        app.send_task(DELIVER_TASKS[channel], args=[log_ids])
+    except Exception as e:
+        logger.warning(f"Не удалось поставить доставку {channel} в очередь, выполняем синхронно: {e}")
+        deliver_now(channel, log_ids)
+
+
+def deliver_now(channel, log_ids):
+    """Все попытки подряд, без задержек (режим sync и недоступный брокер)"""
+    attempt = 0
+    while log_ids:
+        log_ids = deliver(channel, log_ids, attempt)
+        attempt += 1
+
+
+def _claim(channel, log_ids):
+    """Забирает записи пачки из очереди (статус sending) короткой транзакцией.
+
+    Берутся только записи в очереди и не заблокированные другим воркером,
+    поэтому повторная доставка той же задачи Celery не отправит уведомление дважды.
+    """
+    with transaction.atomic():
+        logs = list(
+            NotificationLog.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('notification__user')
+            .filter(pk__in=log_ids, delivery_method=channel, delivery_status__in=NotificationLog.QUEUED_STATUSES)
+        )
+        if logs:
+            NotificationLog.objects.filter(pk__in=[log.pk for log in logs]).update(
+                delivery_status=NotificationLog.STATUS_SENDING,
+                sent_at=timezone.now()
+            )
+    return logs
+
+
+def deliver(channel, log_ids, attempt=0):
+    """Отправляет пачку через адаптер канала; возвращает id записей для повтора"""
+    logs = _claim(channel, log_ids)
+    if not logs:
+        return []
+    # Сетевые вызовы — вне транзакции
+    try:
+        results = channels.get(channel).send([log.notification for log in logs])
+    except Exception as e:
+        logger.error(f"Ошибка канала {channel}: {e}")
+        results = {log.notification_id: str(e) for log in logs}
+
+    final = attempt + 1 >= MAX_ATTEMPTS
+    now = timezone.now()
+    retry = []
+    for log in logs:
+        error = results.get(log.notification_id, "Канал не вернул результат")
+        log.sent_at = now
+        if error is None:
+            log.delivery_status = NotificationLog.STATUS_SENT
+            log.error_message = ''
+            continue
+        log.error_message = f"Попытка {attempt + 1}: {error}"
+        if final:
+            log.delivery_status = NotificationLog.STATUS_DEAD
+            logger.error(f"Уведомление {log.notification_id} не доставлено ({channel}): {error}")
+        else:
+            log.delivery_status = NotificationLog.STATUS_RETRYING
+            retry.append(log.pk)
+    with transaction.atomic():
+        NotificationLog.objects.bulk_update(logs, ['delivery_status', 'sent_at', 'error_message'])
+    return retry
+
+
+def requeue(logs):
+    """Возвращает недоставленные записи в очередь; возвращает их число"""
+    logs = list(logs.filter(delivery_status=NotificationLog.STATUS_DEAD))
+    with transaction.atomic():
+        NotificationLog.objects.filter(pk__in=[log.pk for log in logs]).update(
+            delivery_status=NotificationLog.STATUS_PENDING,
+            sent_at=timezone.now()
+        )
+        schedule(logs)
+    return len(logs)
+
+
+def sweep_stalled():
+    """Возвращает в очередь зависшие записи; слишком старые помечает недоставленными.
+
+    Возвращает {'requeued': N, 'dead': M}.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        logs = list(
+            NotificationLog.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('notification')
+            .filter(
+                delivery_status__in=NotificationLog.UNFINISHED_STATUSES,
+                sent_at__lt=now - timedelta(seconds=_stale_after())
+            )
+        )
+        expired_before = now - timedelta(seconds=_max_age())
+        dead = [log for log in logs if log.notification.created_at < expired_before]
+        stalled = [log for log in logs if log.notification.created_at >= expired_before]
+        if dead:
+            logger.error(f"Не доставлено за {_max_age()} с, записей лога: {len(dead)}")
+            NotificationLog.objects.filter(pk__in=[log.pk for log in dead]).update(
+                delivery_status=NotificationLog.STATUS_DEAD,
+                sent_at=now,
+                error_message="Доставка не завершилась вовремя"
+            )
+        if stalled:
+            # Запись в sending могла уйти до падения воркера: повтор отправит её ещё раз
+            logger.warning(f"Возвращаем в очередь зависшие записи лога: {len(stalled)}")
+            NotificationLog.objects.filter(pk__in=[log.pk for log in stalled]).update(
+                delivery_status=NotificationLog.STATUS_PENDING,
+                sent_at=now
+            )
+            schedule(stalled)
+    return {'requeued': len(stalled), 'dead': len(dead)}
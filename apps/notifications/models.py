@@ -68,14 +68,24 @@ class Notification(models.Model):
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
         ordering = ['-created_at']
+        indexes = [
+            # Список и счётчик непрочитанных пользователя
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user}"
     
     def mark_as_read(self):
-        """Отмечает уведомление как прочитанное"""
+        """Отмечает уведомление как прочитанное и уменьшает счётчик непрочитанных"""
+        from . import counters
+        if self.is_read:
+            return
+        # Условный UPDATE: повторная отметка из другой вкладки не уменьшит счётчик дважды
+        updated = Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True)
         self.is_read = True
-        self.save()
+        if updated:
+            counters.shift({self.user_id: -1})
     
     def is_expired(self):
         """Проверить, истекло ли уведомление"""
@@ -244,6 +254,26 @@ class NotificationPreference(models.Model):
 
 class NotificationLog(models.Model):
     """Лог отправленных уведомлений"""
+    # Запись создаётся в очереди (pending) и меняет статус в воркере доставки
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_RETRYING = 'retrying'
+    STATUS_FAILED = 'failed'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_SENDING, 'Отправляется'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_RETRYING, 'Повтор'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_DEAD, 'Не доставлено'),
+    ]
+    # Ещё ждут отправки воркером
+    QUEUED_STATUSES = (STATUS_PENDING, STATUS_RETRYING)
+    # Не доставлены окончательно: зависшие в них записи подбирает delivery.sweep_stalled
+    UNFINISHED_STATUSES = (STATUS_PENDING, STATUS_SENDING, STATUS_RETRYING)
+    
     notification = models.ForeignKey(
         Notification,
         on_delete=models.CASCADE,
@@ -259,6 +289,7 @@ class NotificationLog(models.Model):
     )
     delivery_status = models.CharField(
         max_length=20,
+        choices=STATUS_CHOICES,
         verbose_name='Статус доставки'
     )
     error_message = models.TextField(
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_counter(sender, instance, created, **kwargs):
+    """Новое непрочитанное уведомление +1 к счётчику, прочие изменения сбрасывают его"""
+    if created:
+        if not instance.is_read:
+            counters.shift({instance.user_id: 1})
+    else:
+        counters.forget(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def forget_unread_counter(sender, instance, **kwargs):
+    counters.forget(instance.user_id)
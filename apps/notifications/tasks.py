@@ -0,0 +1,41 @@
+from celery import shared_task
+
+from . import channels, delivery
+from .counters import reconcile
+
+
+@shared_task
+def reconcile_unread_counters():
+    """Сверяет закэшированные счётчики непрочитанных уведомлений с базой"""
+    return reconcile()
+
+
+@shared_task
+def retry_stalled_deliveries():
+    """Возвращает в очередь доставки, зависшие в pending/sending/retrying"""
+    return delivery.sweep_stalled()
+
+
+def _deliver(task, channel, log_ids):
+    retry = delivery.deliver(channel, log_ids, attempt=task.request.retries)
+    if retry:
+        raise task.retry(args=[retry], countdown=delivery.backoff(task.request.retries))
+    return len(log_ids)
+
+
+@shared_task(bind=True, max_retries=delivery.MAX_ATTEMPTS - 1)
+def deliver_email(self, log_ids):
+    """Доставляет пачку email-уведомлений одним SMTP-соединением"""
+    return _deliver(self, channels.EMAIL, log_ids)
+
+
+@shared_task(bind=True, max_retries=delivery.MAX_ATTEMPTS - 1)
+def deliver_push(self, log_ids):
+    """Доставляет пачку push-уведомлений"""
+    return _deliver(self, channels.PUSH, log_ids)
+
+
+@shared_task(bind=True, max_retries=delivery.MAX_ATTEMPTS - 1)
+def deliver_sms(self, log_ids):
+    """Доставляет пачку SMS-уведомлений"""
+    return _deliver(self, channels.SMS, log_ids)
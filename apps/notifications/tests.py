@@ -681,4 +681,310 @@ class NotificationIntegrationTest(TestCase):
         
         # Заголовок + 3 уведомления
         self.assertEqual(len(lines), 4)
-        self.assertIn('ID,Заголовок,Сообщение,Тип,Приоритет,Статус,Дата создания,Дата прочтения', lines[0]) 
\ No newline at end of file
+        self.assertIn('ID,Заголовок,Сообщение,Тип,Приоритет,Статус,Дата создания,Дата прочтения', lines[0]) 
+
+class UnreadCounterTest(TestCase):
+    """Счётчики непрочитанных в кэше"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='counteruser', password='testpass123')
+
+    def _notify(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notification.objects.create(user=self.user, title=f'Уведомление {i}', message='Текст')
+                for i in range(count)
+            ]
+
+    def test_counter_follows_create_and_mark_as_read(self):
+        from . import counters
+        self.assertEqual(counters.unread_count(self.user.pk), 0)
+        notifications = self._notify(3)
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.unread_count(self.user.pk), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications[0].mark_as_read()
+            notifications[0].mark_as_read()
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.unread_count(self.user.pk), 2)
+
+        self.client.login(username='counteruser', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/notifications/api/notifications/mark_as_read/',
+                {'ids': [n.pk for n in notifications]},
+                content_type='application/json',
+            )
+        self.assertEqual(response.json()['marked_count'], 2)
+        response = self.client.get(reverse('notifications:unread_count'))
+        self.assertEqual(response.json()['unread_count'], 0)
+
+    def test_reconcile_fixes_drift(self):
+        from django.core.cache import cache
+        from . import counters
+        self._notify(2)
+        self.assertEqual(counters.unread_count(self.user.pk), 2)
+        # Запись в обход модели — счётчик расходится с базой
+        Notification.objects.filter(user=self.user).update(is_read=True)
+        self.assertEqual(counters.unread_count(self.user.pk), 2)
+
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(counters.unread_count(self.user.pk), 0)
+        self.assertEqual(counters.reconcile(), 0)
+        # Незакэшированные счётчики сверка не заполняет
+        cache.clear()
+        self.assertEqual(counters.reconcile(), 0)
+
+    def test_event_stream_pushes_changes(self):
+        from . import counters
+        self._notify()
+        stream = counters.event_stream(self.user.pk, poll_interval=0.01, duration=60)
+        self.assertTrue(next(stream).startswith('retry:'))
+        self.assertEqual(next(stream), 'event: unread\ndata: {"unread_count": 1}\n\n')
+        self.assertEqual(next(stream), ': keepalive\n\n')
+        self._notify(2)
+        self.assertEqual(next(stream), 'event: unread\ndata: {"unread_count": 3}\n\n')
+
+    def test_counts_from_database_without_shared_cache(self):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from . import counters
+        # Счётчик, оставшийся в памяти другого процесса, не должен читаться
+        cache.set(counters._key(self.user.pk), 99)
+        with override_settings(CACHE_SHARED=False):
+            self._notify(2)
+            self.assertEqual(counters.unread_count(self.user.pk), 2)
+            Notification.objects.filter(user=self.user).update(is_read=True)
+            self.assertEqual(counters.unread_count(self.user.pk), 0)
+            self.assertEqual(counters.reconcile(), 0)
+        self.assertEqual(cache.get(counters._key(self.user.pk)), 99)
+
+    def test_stream_is_off_by_default(self):
+        from django.test import override_settings
+        self.client.login(username='counteruser', password='testpass123')
+        # С синхронными воркерами gunicorn дашборды запрашивают счётчик один раз
+        self.assertEqual(self.client.get(reverse('notifications:unread_stream')).status_code, 404)
+        with override_settings(NOTIFICATIONS_UNREAD_STREAM=True):
+            response = self.client.get(reverse('notifications:unread_stream'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.close()
+
+
+class BulkNotificationTest(TestCase):
+    """Массовая отправка без запросов на каждого получателя"""
+
+    def setUp(self):
+        self.notification_type = NotificationType.objects.create(name='Успех', code='success')
+        self.service = NotificationService()
+
+    def _users(self, count, prefix):
+        users = [
+            User.objects.create_user(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com')
+            for i in range(count)
+        ]
+        NotificationPreference.objects.bulk_create([
+            NotificationPreference(user=user, email_notifications=False, push_notifications=True)
+            for user in users
+        ])
+        return users
+
+    def _send(self, users):
+        return self.service.send_bulk_notifications(
+            title='Объявление',
+            message='Текст объявления',
+            recipient_ids=[user.id for user in users],
+            notification_type=self.notification_type
+        )
+
+    def test_queries_do_not_depend_on_recipients(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        few, many = self._users(2, 'few'), self._users(30, 'many')
+        with CaptureQueriesContext(connection) as few_queries:
+            self.assertEqual(self._send(few), 2)
+        with CaptureQueriesContext(connection) as many_queries:
+            self.assertEqual(self._send(many), 30)
+        self.assertEqual(len(few_queries), len(many_queries))
+
+        self.assertEqual(Notification.objects.filter(user__in=many, notification_type='success').count(), 30)
+        self.assertEqual(
+            NotificationLog.objects.filter(notification__user__in=many, delivery_method='push').count(), 30
+        )
+        self.assertFalse(NotificationLog.objects.filter(delivery_method='email').exists())
+
+    def test_quiet_hours_and_counters(self):
+        from . import counters
+        users = self._users(3, 'quiet')
+        now = timezone.localtime()
+        NotificationPreference.objects.filter(user=users[0]).update(
+            quiet_hours_start=(now - timedelta(hours=1)).time(),
+            quiet_hours_end=(now + timedelta(hours=1)).time(),
+        )
+        for user in users:
+            counters.unread_count(user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._send(users), 2)
+        self.assertFalse(Notification.objects.filter(user=users[0]).exists())
+        self.assertEqual([counters.unread_count(user.pk) for user in users], [0, 1, 1])
+
+    def test_group_notification_uses_bulk_path(self):
+        users = self._users(5, 'group')
+        group = NotificationGroup.objects.create(name='Цех', notification_type=self.notification_type)
+        group.recipients.add(*users)
+        with self.assertNumQueries(8):
+            count = self.service.send_group_notification('Цех', 'Собрание', 'В 15:00')
+        self.assertEqual(count, 5)
+
+
+class NotificationDeliveryTest(TestCase):
+    """Доставка по каналам из очереди: повторы, недоставленные, пачки"""
+
+    def setUp(self):
+        from . import channels
+        for name in channels.PREFERENCE_FIELDS:
+            channels.get(name).clear()
+        self.user = User.objects.create_user(username='deliveryuser', email='delivery@example.com')
+        self.service = NotificationService()
+
+    def _logs(self, notification):
+        return dict(
+            NotificationLog.objects.filter(notification=notification).values_list('delivery_method', 'delivery_status')
+        )
+
+    def test_request_path_only_persists_and_enqueues(self):
+        from . import channels
+        notification = self.service.send_notification(recipient=self.user, title='Готово', message='Текст')
+        self.assertEqual(self._logs(notification), {'email': 'pending', 'push': 'pending'})
+        self.assertEqual(channels.get('email').outbox, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = self.service.send_notification(
+                recipient=self.user, title='Готово', message='Текст', notification_type='success'
+            )
+        self.assertEqual(notification.notification_type, 'success')
+        self.assertEqual(self._logs(notification), {'email': 'sent', 'push': 'sent'})
+        self.assertEqual(channels.get('push').outbox, [(notification.pk, self.user.pk, 'Готово')])
+
+    def test_failed_delivery_is_retried_then_dead_lettered(self):
+        from . import channels, delivery
+        channels.get('push').fail_next(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = self.service.send_notification(recipient=self.user, title='Повтор', message='Текст')
+        self.assertEqual(self._logs(notification)['push'], 'sent')
+
+        channels.get('push').fail_next(delivery.MAX_ATTEMPTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = self.service.send_notification(recipient=self.user, title='Сбой', message='Текст')
+        log = NotificationLog.objects.get(notification=notification, delivery_method='push')
+        self.assertEqual(log.delivery_status, NotificationLog.STATUS_DEAD)
+        self.assertTrue(log.error_message.startswith(f'Попытка {delivery.MAX_ATTEMPTS}:'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(delivery.requeue(NotificationLog.objects.all()), 1)
+        log.refresh_from_db()
+        self.assertEqual(log.delivery_status, NotificationLog.STATUS_SENT)
+
+    def test_async_mode_enqueues_channel_batches(self):
+        from unittest.mock import patch
+        from django.test import override_settings
+        users = [self.user] + [User.objects.create_user(username=f'async{i}') for i in range(2)]
+        with override_settings(NOTIFICATION_DELIVERY='async', NOTIFICATION_DELIVERY_BATCH_SIZE=2), \
+                patch('core.celery.app.send_task') as send_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.service.send_bulk_notifications('Объявление', 'Текст', [user.pk for user in users])
+        calls = [(call.args[0], len(call.kwargs['args'][0])) for call in send_task.call_args_list]
+        self.assertEqual(sorted(calls), [
+            ('apps.notifications.tasks.deliver_email', 1),
+            ('apps.notifications.tasks.deliver_push', 1),
+            ('apps.notifications.tasks.deliver_push', 2),
+        ])
+        self.assertFalse(NotificationLog.objects.exclude(delivery_status='pending').exists())
+
+    def test_worker_retries_with_exponential_backoff(self):
+        from types import SimpleNamespace
+        from unittest.mock import Mock
+        from celery.exceptions import Retry
+        from . import channels, tasks
+        notification = self.service.send_notification(recipient=self.user, title='Воркер', message='Текст')
+        log = NotificationLog.objects.get(notification=notification, delivery_method='push')
+
+        channels.get('push').fail_next()
+        task = SimpleNamespace(request=SimpleNamespace(retries=2), retry=Mock(return_value=Retry()))
+        with self.assertRaises(Retry):
+            tasks._deliver(task, 'push', [log.pk])
+        task.retry.assert_called_once_with(args=[[log.pk]], countdown=120)
+        log.refresh_from_db()
+        self.assertEqual(log.delivery_status, NotificationLog.STATUS_RETRYING)
+
+        self.assertEqual(tasks.deliver_push.apply(args=[[log.pk]]).get(), 1)
+        log.refresh_from_db()
+        self.assertEqual(log.delivery_status, NotificationLog.STATUS_SENT)
+
+    def test_channel_is_called_outside_the_claim_transaction(self):
+        from unittest.mock import patch
+        from django.db import connection
+        from . import channels, delivery
+        notification = self.service.send_notification(recipient=self.user, title='Вне транзакции', message='Текст')
+        log = NotificationLog.objects.get(notification=notification, delivery_method='push')
+        depth = len(connection.atomic_blocks)
+        seen = {}
+
+        def send(notifications):
+            # Записи уже забраны и сохранены, своя транзакция доставки не открыта
+            seen['status'] = NotificationLog.objects.get(pk=log.pk).delivery_status
+            seen['depth'] = len(connection.atomic_blocks)
+            # Вторая задача с той же пачкой не забирает записи, пока идёт отправка
+            seen['second'] = delivery.deliver('push', [log.pk])
+            return {n.pk: None for n in notifications}
+
+        with patch.object(channels.get('push'), 'send', side_effect=send):
+            self.assertEqual(delivery.deliver('push', [log.pk]), [])
+        self.assertEqual(seen, {'status': NotificationLog.STATUS_SENDING, 'depth': depth, 'second': []})
+        log.refresh_from_db()
+        self.assertEqual(log.delivery_status, NotificationLog.STATUS_SENT)
+
+    def test_sweep_requeues_stalled_and_dead_letters_expired(self):
+        from . import channels, delivery, tasks
+        stalled = {}
+        for status in NotificationLog.UNFINISHED_STATUSES:
+            notification = self.service.send_notification(recipient=self.user, title=status, message='Текст')
+            NotificationLog.objects.filter(notification=notification).update(delivery_status=status)
+            stalled[status] = notification
+        expired = self.service.send_notification(recipient=self.user, title='Старое', message='Текст')
+        Notification.objects.filter(pk=expired.pk).update(created_at=timezone.now() - timedelta(days=2))
+        fresh = self.service.send_notification(recipient=self.user, title='Свежее', message='Текст')
+        NotificationLog.objects.exclude(notification=fresh).update(sent_at=timezone.now() - timedelta(hours=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = tasks.retry_stalled_deliveries.apply().get()
+        self.assertEqual(result, {'requeued': 6, 'dead': 2})
+        for notification in stalled.values():
+            self.assertEqual(self._logs(notification), {'email': 'sent', 'push': 'sent'})
+        self.assertEqual(self._logs(expired), {'email': 'dead', 'push': 'dead'})
+        # Только что поставленные в очередь записи не трогаются
+        self.assertEqual(self._logs(fresh), {'email': 'pending', 'push': 'pending'})
+        self.assertEqual(len(channels.get('push').outbox), 3)
+        self.assertEqual(delivery.sweep_stalled(), {'requeued': 0, 'dead': 0})
+
+    def test_email_channel_uses_one_connection_per_batch(self):
+        from unittest.mock import patch
+        from django.core import mail
+        from django.core.mail import get_connection
+        from .channels import EmailChannel
+        users = [self.user] + [
+            User.objects.create_user(username=f'mail{i}', email=f'mail{i}@example.com') for i in range(2)
+        ]
+        notifications = [
+            Notification.objects.create(user=user, title='Письмо', message='Текст письма') for user in users
+        ]
+        with patch('apps.notifications.channels.get_connection', wraps=get_connection) as connection:
+            results = EmailChannel().send(notifications)
+        connection.assert_called_once()
+        self.assertEqual(results, {notification.pk: None for notification in notifications})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('Текст письма', mail.outbox[0].body)
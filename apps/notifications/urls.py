@@ -35,6 +35,7 @@ urlpatterns = [
 	# Компоненты
 	path('bell/', views.notification_bell, name='bell'),
 	path('unread-count/', views.unread_count, name='unread_count'),
+	path('unread-stream/', views.unread_stream, name='unread_stream'),
 ]
 
 # Добавляем API маршруты
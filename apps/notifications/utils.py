@@ -1,5 +1,3 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -9,14 +7,18 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import json
 
+from . import counters, delivery
 from .models import (
     Notification, NotificationType, NotificationTemplate,
-    NotificationGroup, NotificationLog
+    NotificationGroup, NotificationPreference, NotificationLog
 )
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Уведомлений и записей лога в одном INSERT при массовой отправке
+BULK_BATCH_SIZE = 500
+
 
 class NotificationService:
     """Сервис для работы с уведомлениями"""
@@ -64,10 +66,14 @@ class NotificationService:
             
         Returns:
             Созданное уведомление или None в случае ошибки
+        
+        Модель Notification не хранит приоритет, действие, срок, metadata и
+        связанный объект — параметры оставлены для совместимости.
         """
         try:
             # Проверяем настройки пользователя
-            if not self._should_send_notification(recipient):
+            preference = NotificationPreference.objects.filter(user=recipient).first()
+            if self._in_quiet_hours(preference, timezone.localtime().time()):
                 logger.info(f"Уведомления отключены для пользователя {recipient.username}")
                 return None
             
@@ -75,36 +81,17 @@ class NotificationService:
             if not notification_type:
                 notification_type = self.default_notification_type
             
-            if not notification_type:
-                logger.error("Не указан тип уведомления и нет типа по умолчанию")
-                return None
-            
-            # Создаем уведомление
-            notification = Notification.objects.create(
-                recipient=recipient,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                priority=priority,
-                action_url=action_url or '',
-                action_text=action_text or '',
-                expires_at=expires_at,
-                metadata=metadata or {}
-            )
-            
-            # Если указан связанный объект, связываем его
-            if content_object:
-                from django.contrib.contenttypes.models import ContentType
-                notification.content_type = ContentType.objects.get_for_model(content_object)
-                notification.object_id = content_object.id
-                notification.save()
-            
-            # Отправляем уведомления по различным каналам
-            self._send_email_notification(notification)
-            self._send_push_notification(notification)
-            self._send_sms_notification(notification)
+            # Сохраняем уведомление, доставка по каналам — в очереди после коммита
+            with transaction.atomic():
+                notification = Notification.objects.create(
+                    user=recipient,
+                    title=title,
+                    message=message,
+                    notification_type=self._notification_kind(notification_type)
+                )
+                delivery.queue_logs([notification], {recipient.id: preference} if preference else {})
             
-            logger.info(f"Уведомление отправлено: {notification.id} для {recipient.username}")
+            logger.info(f"Уведомление поставлено в очередь: {notification.id} для {recipient.username}")
             return notification
             
         except Exception as e:
@@ -139,27 +126,45 @@ class NotificationService:
             
         Returns:
             Количество созданных уведомлений
+        
+        Запросы не зависят от числа получателей: настройки читаются одним
+        запросом, тихие часы проверяются в памяти, уведомления и лог доставки
+        пишутся bulk_create. Доставка по каналам — в очереди (apps.notifications.delivery).
         """
         created_count = 0
         
         try:
-            recipients = User.objects.filter(id__in=recipient_ids)
+            if not notification_type:
+                notification_type = self.default_notification_type
             
-            for recipient in recipients:
-                notification = self.send_notification(
-                    recipient=recipient,
-                    title=title,
-                    message=message,
-                    notification_type=notification_type,
-                    priority=priority,
-                    action_url=action_url,
-                    action_text=action_text,
-                    expires_at=expires_at,
-                    metadata=metadata
+            recipients = list(User.objects.filter(id__in=recipient_ids).only('id', 'username', 'email'))
+            preferences = {
+                preference.user_id: preference
+                for preference in NotificationPreference.objects.filter(
+                    user_id__in=[recipient.id for recipient in recipients]
                 )
-                
-                if notification:
-                    created_count += 1
+            }
+            now = timezone.localtime().time()
+            recipients = [
+                recipient for recipient in recipients
+                if not self._in_quiet_hours(preferences.get(recipient.id), now)
+            ]
+            if not recipients:
+                return 0
+            
+            kind = self._notification_kind(notification_type)
+            with transaction.atomic():
+                notifications = Notification.objects.bulk_create(
+                    [
+                        Notification(user=recipient, title=title, message=message, notification_type=kind)
+                        for recipient in recipients
+                    ],
+                    batch_size=BULK_BATCH_SIZE
+                )
+                # bulk_create не отправляет post_save — счётчики непрочитанных сдвигаем сами
+                counters.shift({recipient.id: 1 for recipient in recipients})
+                delivery.queue_logs(notifications, preferences)
+            created_count = len(notifications)
             
             logger.info(f"Массовая отправка завершена: {created_count} уведомлений")
             
@@ -239,7 +244,7 @@ class NotificationService:
             Количество отправленных уведомлений
         """
         try:
-            group = NotificationGroup.objects.get(
+            group = NotificationGroup.objects.select_related('notification_type').get(
                 name=group_name,
                 is_active=True
             )
@@ -264,133 +269,26 @@ class NotificationService:
     
     def _should_send_notification(self, user: User) -> bool:
         """Проверить, следует ли отправлять уведомление пользователю"""
-        try:
-            preferences = NotificationPreference.objects.get(user=user)
-            
-            # Проверяем время тишины
-            if preferences.quiet_hours_start and preferences.quiet_hours_end:
-                now = timezone.now().time()
-                if preferences.quiet_hours_start <= preferences.quiet_hours_end:
-                    # Обычный день (например, 9:00 - 18:00)
-                    if preferences.quiet_hours_start <= now <= preferences.quiet_hours_end:
-                        return False
-                else:
-                    # Переход через полночь (например, 22:00 - 6:00)
-                    if now >= preferences.quiet_hours_start or now <= preferences.quiet_hours_end:
-                        return False
-            
-            return True
-            
-        except NotificationPreference.DoesNotExist:
-            # Если настройки не найдены, отправляем по умолчанию
-            return True
-    
-    def _send_email_notification(self, notification: Notification):
-        """Отправить email уведомление"""
-        try:
-            preferences = NotificationPreference.objects.get(user=notification.recipient)
-            
-            if not preferences.email_notifications:
-                return
-            
-            # Формируем email
-            subject = f"Уведомление: {notification.title}"
-            
-            context = {
-                'notification': notification,
-                'user': notification.recipient
-            }
-            
-            html_message = render_to_string(
-                'notifications/email/notification.html',
-                context
-            )
-            
-            plain_message = render_to_string(
-                'notifications/email/notification.txt',
-                context
-            )
-            
-            # Отправляем email
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[notification.recipient.email],
-                html_message=html_message,
-                fail_silently=True
-            )
-            
-            # Логируем отправку
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='email',
-                delivery_status='sent'
-            )
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки email: {e}")
-            # Логируем ошибку
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='email',
-                delivery_status='failed',
-                error_message=str(e)
-            )
+        # Если настройки не найдены, отправляем по умолчанию
+        preferences = NotificationPreference.objects.filter(user=user).first()
+        return not self._in_quiet_hours(preferences, timezone.localtime().time())
     
-    def _send_push_notification(self, notification: Notification):
-        """Отправить push уведомление"""
-        try:
-            preferences = NotificationPreference.objects.get(user=notification.recipient)
-            
-            if not preferences.push_notifications:
-                return
-            
-            # Здесь должна быть логика отправки push уведомлений
-            # Например, через Firebase Cloud Messaging или Web Push API
-            
-            # Логируем отправку
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='push',
-                delivery_status='sent'
-            )
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки push: {e}")
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='push',
-                delivery_status='failed',
-                error_message=str(e)
-            )
+    @staticmethod
+    def _in_quiet_hours(preferences: Optional[NotificationPreference], now) -> bool:
+        """Попадает ли время now в тихие часы пользователя"""
+        if not preferences or not (preferences.quiet_hours_start and preferences.quiet_hours_end):
+            return False
+        if preferences.quiet_hours_start <= preferences.quiet_hours_end:
+            # Обычный день (например, 9:00 - 18:00)
+            return preferences.quiet_hours_start <= now <= preferences.quiet_hours_end
+        # Переход через полночь (например, 22:00 - 6:00)
+        return now >= preferences.quiet_hours_start or now <= preferences.quiet_hours_end
     
-    def _send_sms_notification(self, notification: Notification):
-        """Отправить SMS уведомление"""
-        try:
-            preferences = NotificationPreference.objects.get(user=notification.recipient)
-            
-            if not preferences.sms_notifications:
-                return
-            
-            # Здесь должна быть логика отправки SMS
-            # Например, через внешний SMS сервис
-            
-            # Логируем отправку
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='sms',
-                delivery_status='sent'
-            )
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки SMS: {e}")
-            NotificationLog.objects.create(
-                notification=notification,
-                delivery_method='sms',
-                delivery_status='failed',
-                error_message=str(e)
-            )
+    @staticmethod
+    def _notification_kind(notification_type) -> str:
+        """Значение Notification.notification_type по типу или его коду; неизвестные коды — 'info'"""
+        code = getattr(notification_type, 'code', notification_type)
+        return code if code in dict(Notification.NOTIFICATION_TYPES) else 'info'
     
     def cleanup_expired_notifications(self):
         """Очистка истекших уведомлений"""
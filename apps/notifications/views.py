@@ -1,7 +1,8 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -35,6 +36,7 @@ from .serializers import (
     MarkAsReadSerializer, NotificationFilterSerializer
 )
 from .utils import NotificationService
+from . import counters
 
 
 # ==================== DJANGO VIEWS ====================
@@ -53,10 +55,7 @@ class NotificationListView(LoginRequiredMixin, ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['unread_count'] = Notification.objects.filter(
-            user=self.request.user,
-            is_read=False
-        ).count()
+        context['unread_count'] = counters.unread_count(self.request.user.pk)
         context['page_title'] = 'Уведомления'
         return context
 
@@ -128,10 +127,7 @@ class NotificationDashboardView(LoginRequiredMixin, TemplateView):
         context['total_notifications'] = Notification.objects.filter(
             user=user
         ).count()
-        context['unread_count'] = Notification.objects.filter(
-            user=user,
-            is_read=False
-        ).count()
+        context['unread_count'] = counters.unread_count(user.pk)
         context['recent_notifications'] = Notification.objects.filter(
             user=user
         )[:10]
@@ -162,10 +158,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_as_read(self, request):
         """Отметить уведомления как прочитанные"""
         ids = request.data if isinstance(request.data, list) else request.data.get('ids', [])
-        qs = self.get_queryset().filter(id__in=ids)
-        for n in qs:
-            n.mark_as_read()
-        return Response({'marked_count': qs.count()})
+        marked = counters.mark_read(self.get_queryset().filter(id__in=ids))
+        return Response({'marked_count': marked})
 
 
 class NotificationTypeViewSet(viewsets.ModelViewSet):
@@ -218,10 +212,7 @@ class NotificationPreferenceViewSet(viewsets.ModelViewSet):
 @login_required
 def notification_bell(request):
     """Страница уведомлений (мобильная)"""
-    unread_count = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).count()
+    unread_count = counters.unread_count(request.user.pk)
     
     notifications = Notification.objects.filter(
         user=request.user
@@ -238,8 +229,24 @@ def notification_bell(request):
 @require_http_methods(["GET"])
 def unread_count(request):
     """Простой endpoint для получения количества непрочитанных уведомлений"""
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'unread_count': count}) 
+    return JsonResponse({'unread_count': counters.unread_count(request.user.pk)})
+
+
+@login_required
+@require_http_methods(["GET"])
+def unread_stream(request):
+    """Поток Server-Sent Events со счётчиком непрочитанных вместо опроса unread_count.
+
+    Включается настройкой NOTIFICATIONS_UNREAD_STREAM: подключение занимает
+    воркер, поэтому поток отдаётся только с асинхронными воркерами gunicorn (gevent).
+    """
+    if not getattr(settings, 'NOTIFICATIONS_UNREAD_STREAM', False):
+        raise Http404("Поток счётчика уведомлений отключён")
+    response = StreamingHttpResponse(counters.event_stream(request.user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class NotificationsComingSoonView(TemplateView):
@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import DailyProductionFact
 
-# Register your models here.
+
+@admin.register(DailyProductionFact)
+class DailyProductionFactAdmin(admin.ModelAdmin):
+    list_display = ('date', 'source', 'workshop', 'employee', 'product', 'completed_quantity', 'defective_quantity', 'net_earnings', 'revenue')
+    list_filter = ('source', 'date', 'workshop')
+    search_fields = ('employee__username', 'product__name')
+    ordering = ('-date',)
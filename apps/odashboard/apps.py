@@ -5,3 +5,7 @@ class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.odashboard'
     label = 'operations_dashboard'  # Уникальный label для устранения конфликта
+
+    def ready(self):
+        # Инкрементальное обновление дневной сводки производства
+        import apps.odashboard.signals  # noqa: F401
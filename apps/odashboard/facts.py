@@ -0,0 +1,205 @@
+"""
+Наполнение DailyProductionFact.
+
+Сводка собирается срезами: для задачи — (день создания, сотрудник), для
+брака — (день, сотрудник, создавший брак), для браков и позиций заказов —
+день. Сохранения источников помечают срез «грязным» (signals.py), после
+коммита срез пересобирается из исходных строк одним сгруппированным
+запросом. Ночная задача tasks.backfill_production_facts пересобирает
+последние дни целиком и страхует от изменений в обход сигналов
+(QuerySet.update, смена цены продукта и т.п.).
+
+Функции пересборки принимают реестр моделей (registry): по умолчанию это
+django.apps.apps, миграция 0002 передаёт исторические модели и так заполняет
+сводку по уже накопленным данным при развёртывании.
+"""
+import logging
+import threading
+from datetime import datetime, time, timedelta
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductionFact
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def _fact_model(registry=None):
+    return (registry or global_apps).get_model('operations_dashboard', 'DailyProductionFact')
+
+
+def _sources(registry=None):
+    """Описание источников: модель, поле даты, поле среза, измерения и агрегаты"""
+    registry = registry or global_apps
+    Defect = registry.get_model('defects', 'Defect')
+    EmployeeTask = registry.get_model('employee_tasks', 'EmployeeTask')
+    OrderDefect = registry.get_model('orders', 'OrderDefect')
+    OrderItem = registry.get_model('orders', 'OrderItem')
+
+    return {
+        DailyProductionFact.SOURCE_TASK: {
+            'model': EmployeeTask,
+            'date_field': 'created_at',
+            'slice_field': 'employee_id',
+            'dimensions': {
+                'workshop': 'stage__workshop_id',
+                'employee': 'employee_id',
+                'product': 'stage__order_item__product_id',
+            },
+            'aggregates': {
+                'tasks_count': Count('id'),
+                'assigned_quantity': Sum('quantity'),
+                'completed_quantity': Sum('completed_quantity'),
+                'defective_quantity': Sum('defective_quantity'),
+                'earnings': Sum('earnings'),
+                'penalties': Sum('penalties'),
+                'net_earnings': Sum('net_earnings'),
+            },
+        },
+        DailyProductionFact.SOURCE_DEFECT: {
+            'model': Defect,
+            'date_field': 'created_at',
+            'slice_field': 'user_id',
+            'dimensions': {
+                # Цех брака — цех сотрудника, создавшего брак (как Defect.get_workshop)
+                'workshop': 'user__workshop_id',
+                'employee': 'user_id',
+                'product': 'product_id',
+            },
+            'aggregates': {
+                # Единицы брака: запись может хранить несколько единиц (Defect.quantity)
+                'defects_count': Sum('quantity'),
+            },
+        },
+        DailyProductionFact.SOURCE_ORDER_DEFECT: {
+            'model': OrderDefect,
+            'date_field': 'date',
+            'slice_field': None,
+            'dimensions': {
+                'workshop': 'workshop_id',
+            },
+            'aggregates': {
+                'order_defects_quantity': Sum('quantity'),
+            },
+        },
+        DailyProductionFact.SOURCE_ORDER_ITEM: {
+            'model': OrderItem,
+            'date_field': 'order__created_at',
+            'slice_field': None,
+            'dimensions': {
+                'product': 'product_id',
+            },
+            'aggregates': {
+                'sales_quantity': Sum('quantity'),
+                'revenue': Sum(
+                    F('product__price') * F('quantity'),
+                    output_field=DecimalField(max_digits=15, decimal_places=2),
+                ),
+            },
+        },
+    }
+
+
+def _day_bounds(start, end):
+    since = timezone.make_aware(datetime.combine(start, time.min))
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    return since, until
+
+
+def build_facts(source, start, end, registry=None, **slice_filter):
+    """Несохранённые строки сводки источника за дни [start, end]"""
+    spec = _sources(registry)[source]
+    fact_model = _fact_model(registry)
+    since, until = _day_bounds(start, end)
+    date_field = spec['date_field']
+    queryset = spec['model'].objects.filter(**{
+        f'{date_field}__gte': since,
+        f'{date_field}__lt': until,
+        **slice_filter,
+    })
+    dimensions = {f'fact_{name}': F(path) for name, path in spec['dimensions'].items()}
+    rows = (
+        queryset.annotate(fact_date=TruncDate(date_field))
+        .values('fact_date', **dimensions)
+        .annotate(**spec['aggregates'])
+        .order_by()
+    )
+    facts = []
+    for row in rows:
+        fact = fact_model(date=row['fact_date'], source=source)
+        for name in spec['dimensions']:
+            setattr(fact, f'{name}_id', row[f'fact_{name}'])
+        for name in spec['aggregates']:
+            if row[name] is not None:
+                setattr(fact, name, row[name])
+        facts.append(fact)
+    return facts
+
+
+def refresh_slice(source, day, slice_value=None):
+    """Пересобирает строки одного среза (день + сотрудник для задач и браков)"""
+    spec = _sources()[source]
+    slice_filter = {}
+    fact_filter = {'source': source, 'date': day}
+    if spec['slice_field']:
+        slice_filter[spec['slice_field']] = slice_value
+        fact_filter['employee_id'] = slice_value
+    with transaction.atomic():
+        DailyProductionFact.objects.filter(**fact_filter).delete()
+        facts = build_facts(source, day, day, **slice_filter)
+        DailyProductionFact.objects.bulk_create(facts, batch_size=BULK_BATCH_SIZE)
+    return len(facts)
+
+
+def rebuild_facts(start, end, registry=None):
+    """Полностью пересобирает сводку за дни [start, end]; возвращает число строк"""
+    fact_model = _fact_model(registry)
+    created = 0
+    with transaction.atomic():
+        fact_model.objects.filter(date__gte=start, date__lte=end).delete()
+        for source in _sources(registry):
+            facts = build_facts(source, start, end, registry)
+            fact_model.objects.bulk_create(facts, batch_size=BULK_BATCH_SIZE)
+            created += len(facts)
+    return created
+
+
+def history_start(registry=None):
+    """Самый ранний день, за который есть исходные данные"""
+    dates = []
+    for spec in _sources(registry).values():
+        first = spec['model'].objects.order_by(spec['date_field']).values_list(spec['date_field'], flat=True).first()
+        if first:
+            dates.append(timezone.localdate(first))
+    return min(dates) if dates else None
+
+
+def mark_dirty(source, moment, slice_value=None):
+    """Помечает срез для пересборки после коммита текущей транзакции"""
+    if moment is None:
+        return
+    if not hasattr(_pending, 'slices'):
+        _pending.slices = set()
+    _pending.slices.add((source, timezone.localdate(moment), slice_value))
+    # flush_pending идемпотентен: первый вызов обрабатывает всё накопленное
+    transaction.on_commit(flush_pending)
+
+
+def flush_pending():
+    slices = getattr(_pending, 'slices', None)
+    if not slices:
+        return
+    _pending.slices = set()
+    for source, day, slice_value in slices:
+        try:
+            refresh_slice(source, day, slice_value)
+        except Exception as e:
+            logger.error(f"Ошибка пересборки сводки {source} за {day}: {e}")
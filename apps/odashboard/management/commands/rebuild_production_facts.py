@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.odashboard.facts import history_start, rebuild_facts
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает дневную сводку производства (DailyProductionFact) из задач, браков и заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Пересобрать только последние N дней (по умолчанию вся история)'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['days']:
+            start = today - timedelta(days=options['days'] - 1)
+        else:
+            start = history_start()
+            if start is None:
+                self.stdout.write('Нет данных для сводки')
+                return
+        created = rebuild_facts(start, today)
+        self.stdout.write(self.style.SUCCESS(f'Сводка пересобрана с {start} по {today}: {created} строк'))
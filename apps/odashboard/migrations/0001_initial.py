@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 05:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('operations_workshops', '0002_alter_workshop_manager_workshopmaster'),
+        ('products', '0005_remove_product_is_3_floor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductionFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('source', models.CharField(choices=[('task', 'Задачи сотрудников'), ('defect', 'Браки'), ('order_defect', 'Браки заказов'), ('order_item', 'Позиции заказов')], max_length=20, verbose_name='Источник')),
+                ('tasks_count', models.PositiveIntegerField(default=0, verbose_name='Задач')),
+                ('assigned_quantity', models.PositiveIntegerField(default=0, verbose_name='Назначено')),
+                ('completed_quantity', models.PositiveIntegerField(default=0, verbose_name='Выполнено')),
+                ('defective_quantity', models.PositiveIntegerField(default=0, verbose_name='Брак в задачах')),
+                ('defects_count', models.PositiveIntegerField(default=0, verbose_name='Записей брака')),
+                ('order_defects_quantity', models.PositiveIntegerField(default=0, verbose_name='Брак заказов')),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Заработок')),
+                ('penalties', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Штрафы')),
+                ('net_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Чистый заработок')),
+                ('sales_quantity', models.PositiveIntegerField(default=0, verbose_name='Продано')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Выручка')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='production_facts', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='production_facts', to='products.product', verbose_name='Продукт')),
+                ('workshop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='production_facts', to='operations_workshops.workshop', verbose_name='Цех')),
+            ],
+            options={
+                'verbose_name': 'Дневная сводка производства',
+                'verbose_name_plural': 'Дневные сводки производства',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'workshop'], name='odash_fact_date_workshop_idx'), models.Index(fields=['workshop', 'date'], name='odash_fact_workshop_date_idx'), models.Index(fields=['employee', 'date'], name='odash_fact_employee_date_idx'), models.Index(fields=['source', 'date'], name='odash_fact_source_date_idx')],
+            },
+        ),
+    ]
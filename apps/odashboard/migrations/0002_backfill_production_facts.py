@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 09:12
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_facts(apps, schema_editor):
+    # Сводка по данным, накопленным до её появления: иначе дашборды
+    # показывают нули до первого запуска ночной задачи
+    from apps.odashboard.facts import history_start, rebuild_facts
+
+    start = history_start(apps)
+    if start:
+        rebuild_facts(start, timezone.localdate(), apps)
+
+
+def clear_facts(apps, schema_editor):
+    apps.get_model('operations_dashboard', 'DailyProductionFact').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations_dashboard', '0001_initial'),
+        ('defects', '0006_defect_quantity'),
+        ('employee_tasks', '0010_task_stats_indexes'),
+        ('orders', '0012_orderstage_task_counters'),
+        ('products', '0005_remove_product_is_3_floor'),
+        ('users', '0007_balance_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_facts, clear_facts),
+    ]
@@ -1,3 +1,62 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class DailyProductionFact(models.Model):
+    """
+    Дневная сводка производства (дата × цех × сотрудник × продукт) для дашбордов.
+    Строки пересобираются срезами из задач, браков и позиций заказов
+    (см. apps.odashboard.facts), source указывает, из чего собрана строка.
+    """
+
+    SOURCE_TASK = 'task'
+    SOURCE_DEFECT = 'defect'
+    SOURCE_ORDER_DEFECT = 'order_defect'
+    SOURCE_ORDER_ITEM = 'order_item'
+    SOURCE_CHOICES = [
+        (SOURCE_TASK, 'Задачи сотрудников'),
+        (SOURCE_DEFECT, 'Браки'),
+        (SOURCE_ORDER_DEFECT, 'Браки заказов'),
+        (SOURCE_ORDER_ITEM, 'Позиции заказов'),
+    ]
+
+    date = models.DateField('Дата')
+    source = models.CharField('Источник', max_length=20, choices=SOURCE_CHOICES)
+    workshop = models.ForeignKey(
+        'operations_workshops.Workshop', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='production_facts', verbose_name='Цех'
+    )
+    employee = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='production_facts', verbose_name='Сотрудник'
+    )
+    product = models.ForeignKey(
+        'products.Product', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='production_facts', verbose_name='Продукт'
+    )
+
+    tasks_count = models.PositiveIntegerField('Задач', default=0)
+    assigned_quantity = models.PositiveIntegerField('Назначено', default=0)
+    completed_quantity = models.PositiveIntegerField('Выполнено', default=0)
+    defective_quantity = models.PositiveIntegerField('Брак в задачах', default=0)
+    defects_count = models.PositiveIntegerField('Записей брака', default=0)
+    order_defects_quantity = models.PositiveIntegerField('Брак заказов', default=0)
+    earnings = models.DecimalField('Заработок', max_digits=14, decimal_places=2, default=0)
+    penalties = models.DecimalField('Штрафы', max_digits=14, decimal_places=2, default=0)
+    net_earnings = models.DecimalField('Чистый заработок', max_digits=14, decimal_places=2, default=0)
+    sales_quantity = models.PositiveIntegerField('Продано', default=0)
+    revenue = models.DecimalField('Выручка', max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Дневная сводка производства'
+        verbose_name_plural = 'Дневные сводки производства'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'workshop'], name='odash_fact_date_workshop_idx'),
+            models.Index(fields=['workshop', 'date'], name='odash_fact_workshop_date_idx'),
+            models.Index(fields=['employee', 'date'], name='odash_fact_employee_date_idx'),
+            models.Index(fields=['source', 'date'], name='odash_fact_source_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.get_source_display()}"
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.defects.models import Defect
+from apps.employee_tasks.models import EmployeeTask
+from apps.orders.charts import invalidate_day
+from apps.orders.models import OrderDefect, OrderItem
+
+from .facts import mark_dirty
+from .models import DailyProductionFact
+
+
+@receiver(post_save, sender=EmployeeTask)
+@receiver(post_delete, sender=EmployeeTask)
+def refresh_task_facts(sender, instance, **kwargs):
+    mark_dirty(DailyProductionFact.SOURCE_TASK, instance.created_at, instance.employee_id)
+    # Брак задач входит в график выручки
+    invalidate_day(instance.created_at)
+    old_employee_id = getattr(instance, '_old_employee_id', None)
+    if old_employee_id and old_employee_id != instance.employee_id:
+        mark_dirty(DailyProductionFact.SOURCE_TASK, instance.created_at, old_employee_id)
+
+
+@receiver(post_save, sender=Defect)
+@receiver(post_delete, sender=Defect)
+def refresh_defect_facts(sender, instance, **kwargs):
+    mark_dirty(DailyProductionFact.SOURCE_DEFECT, instance.created_at, instance.user_id)
+
+
+@receiver(post_save, sender=OrderDefect)
+@receiver(post_delete, sender=OrderDefect)
+def refresh_order_defect_facts(sender, instance, **kwargs):
+    mark_dirty(DailyProductionFact.SOURCE_ORDER_DEFECT, instance.date)
+    invalidate_day(instance.date)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_item_facts(sender, instance, **kwargs):
+    try:
+        created_at = instance.order.created_at
+    except Exception:
+        # Заказ уже удалён — срез поправит ночная пересборка
+        return
+    mark_dirty(DailyProductionFact.SOURCE_ORDER_ITEM, created_at)
+    invalidate_day(created_at)
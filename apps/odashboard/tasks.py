@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from .facts import history_start, rebuild_facts
+from .models import DailyProductionFact
+
+# Сколько последних дней пересобирает ночная задача
+BACKFILL_DAYS = 3
+
+
+@shared_task
+def backfill_production_facts(days=BACKFILL_DAYS):
+    """
+    Пересобирает дневную сводку производства за последние days дней.
+    Если сводка ещё пустая, собирает всю историю.
+    """
+    today = timezone.localdate()
+    if DailyProductionFact.objects.exists():
+        start = today - timedelta(days=days - 1)
+    else:
+        start = history_start() or today
+    created = rebuild_facts(start, today)
+    return {
+        'status': 'success',
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'facts_count': created,
+    }
@@ -1,3 +1,120 @@
+import importlib
+from datetime import timedelta
+
+from django.apps import apps as global_apps
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.clients.models import Client
+from apps.defects.models import Defect
+from apps.employee_tasks.models import EmployeeTask
+from apps.operations.workshops.models import Workshop
+from apps.orders.models import Order, OrderItem, OrderStage
+from apps.products.models import Product
+from apps.users.models import User
+from .facts import rebuild_facts
+from .models import DailyProductionFact
+
+
+class DailyProductionFactTest(TestCase):
+    """Дневная сводка производства: инкрементальное обновление и пересборка"""
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.employee = User.objects.create_user(username='worker', password='testpass123', workshop=self.workshop)
+        self.master = User.objects.create_user(username='master', password='testpass123', workshop=self.workshop)
+        client = Client.objects.create(name='Клиент')
+        self.product = Product.objects.create(name='Дверь', price=100)
+        self.order = Order.objects.create(name='Заказ', client=client)
+        self.item = OrderItem.objects.create(order=self.order, product=self.product, quantity=4)
+        self.stage = OrderStage.objects.create(
+            order=self.order, order_item=self.item, workshop=self.workshop,
+            operation='Распил', sequence=1, plan_quantity=10,
+        )
+        self.today = timezone.localdate()
+
+    def _create_task(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EmployeeTask.objects.create(stage=self.stage, employee=self.employee, **kwargs)
+
+    def _snapshot(self):
+        return sorted(
+            DailyProductionFact.objects.values_list(
+                'date', 'source', 'workshop_id', 'employee_id', 'product_id',
+                'tasks_count', 'assigned_quantity', 'completed_quantity', 'defective_quantity',
+                'defects_count', 'sales_quantity', 'revenue',
+            ),
+            key=str,
+        )
+
+    def test_task_saves_update_facts(self):
+        task = self._create_task(quantity=6, completed_quantity=2)
+        fact = DailyProductionFact.objects.get(source=DailyProductionFact.SOURCE_TASK)
+        self.assertEqual((fact.date, fact.workshop_id, fact.employee_id, fact.product_id), (self.today, self.workshop.id, self.employee.id, self.product.id))
+        self.assertEqual((fact.tasks_count, fact.assigned_quantity, fact.completed_quantity), (1, 6, 2))
+
+        task.completed_quantity = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        fact = DailyProductionFact.objects.get(source=DailyProductionFact.SOURCE_TASK)
+        self.assertEqual(fact.completed_quantity, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertFalse(DailyProductionFact.objects.filter(source=DailyProductionFact.SOURCE_TASK).exists())
+
+    def test_rebuild_matches_incremental(self):
+        self._create_task(quantity=6, completed_quantity=2)
+        task = self._create_task(quantity=3, completed_quantity=1)
+        # Брак создаёт записи Defect в pre_save задачи
+        task.defective_quantity = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=self.order, product=self.product, quantity=1)
+
+        incremental = self._snapshot()
+        rebuild_facts(self.today - timedelta(days=1), self.today)
+        self.assertEqual(self._snapshot(), incremental)
+        revenue = DailyProductionFact.objects.get(source=DailyProductionFact.SOURCE_ORDER_ITEM)
+        self.assertEqual((revenue.sales_quantity, int(revenue.revenue)), (5, 500))
+
+    def test_workshop_production_chart_buckets_by_completion_day(self):
+        now = timezone.now()
+        self._create_task(quantity=6, completed_quantity=4, completed_at=now)
+        # Задача создана сегодня, но завершена два дня назад — выпуск того дня
+        self._create_task(quantity=7, completed_quantity=7, completed_at=now - timedelta(days=2))
+        # Незавершённая задача в выпуск не попадает
+        self._create_task(quantity=5, completed_quantity=3)
+        self.client.force_login(self.master)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('workshop_production_chart'), {'period': 'week'})
+        # Один запрос к задачам и один к бракам на весь период, а не на каждый день
+        sql = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(sum('employee_tasks_employeetask' in q for q in sql), 1)
+        self.assertEqual(sum('defects_defect' in q for q in sql), 1)
+        data = response.json()
+        self.assertEqual(data['products'][-1], 4)
+        self.assertEqual(data['products'][-3], 7)
+        self.assertEqual(sum(data['products']), 11)
+
+    def test_workshop_production_chart_counts_defect_units(self):
+        Defect.objects.create(user=self.employee, product=self.product, quantity=3)
+        Defect.objects.create(user=self.employee, product=self.product)
+        self.client.force_login(self.master)
+        data = self.client.get(reverse('workshop_production_chart'), {'period': 'week'}).json()
+        # Как в обзоре цеха и сводке: единицы, а не записи
+        self.assertEqual(data['defective'][-1], 4)
+        self.assertEqual(sum(data['defective']), 4)
 
-# Create your tests here.
+    def test_migration_backfills_existing_history(self):
+        self._create_task(quantity=6, completed_quantity=2)
+        incremental = self._snapshot()
+        # Данные, накопленные до появления сводки
+        DailyProductionFact.objects.all().delete()
+        migration = importlib.import_module('apps.odashboard.migrations.0002_backfill_production_facts')
+        migration.backfill_facts(global_apps, None)
+        self.assertEqual(self._snapshot(), incremental)
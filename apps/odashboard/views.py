@@ -1,17 +1,25 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.http import HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.db.models import Count, Sum, Q
+from django.db.models.functions import TruncDate
 from datetime import datetime, timedelta
 from apps.users.models import User
 from apps.operations.workshops.models import Workshop
 from apps.employee_tasks.models import EmployeeTask
 from apps.defects.models import Defect
 from apps.orders.models import OrderStage
+from .models import DailyProductionFact
 
 # Create your views here.
 
+def _dashboard_context():
+    # Без потока SSE (синхронные воркеры gunicorn) счётчик уведомлений запрашивается один раз
+    return {'unread_stream': getattr(settings, 'NOTIFICATIONS_UNREAD_STREAM', False)}
+
+
 @login_required
 def dashboard(request):
     user = request.user
@@ -27,7 +35,7 @@ def dashboard(request):
     # Admin: use operations dashboard templates
     elif role == User.Role.ADMIN:
         template = 'odashboard_mobile.html' if is_mobile else 'odashboard.html'
-        return render(request, template)
+        return render(request, template, _dashboard_context())
 
     # Accountant: redirect to finance
     elif role == User.Role.ACCOUNTANT:
@@ -36,7 +44,7 @@ def dashboard(request):
     # Master: use workshop templates
     elif role == User.Role.MASTER:
         template = 'workshop_mobile.html' if is_mobile else 'workshop_master.html'
-        return render(request, template)
+        return render(request, template, _dashboard_context())
 
     # Worker: redirect to employee tasks
     elif role == User.Role.WORKER:
@@ -50,7 +58,7 @@ def workshop_dashboard(request):
     user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
     is_mobile = any(m in user_agent for m in ['android', 'iphone', 'ipad', 'mobile', 'opera mini', 'blackberry', 'windows phone'])
     template = 'workshop_mobile.html' if is_mobile else 'workshop_master.html'
-    return render(request, template)
+    return render(request, template, _dashboard_context())
 
 
 @login_required
@@ -68,16 +76,13 @@ def workshop_dashboard_overview(request):
         # Подсчитываем сотрудников в цехе
         total_employees = User.objects.filter(workshop=workshop, role__in=['worker', 'master']).count()
         
-        # Подсчитываем произведенные товары (завершенные задачи)
-        products_made = EmployeeTask.objects.filter(
-            stage__workshop=workshop,
-            completed_quantity__gt=0
-        ).aggregate(total=Sum('completed_quantity'))['total'] or 0
-        
-        # Подсчитываем браки
-        defective_products = Defect.objects.filter(
-            user__workshop=workshop
-        ).count()
+        # Произведенные товары (завершенные задачи) и браки цеха — из дневной сводки
+        totals = DailyProductionFact.objects.filter(workshop=workshop).aggregate(
+            products_made=Sum('completed_quantity'),
+            defective_products=Sum('defects_count'),
+        )
+        products_made = totals['products_made'] or 0
+        defective_products = totals['defective_products'] or 0
         
         # Подсчитываем активные заказы
         active_orders = OrderStage.objects.filter(
@@ -137,6 +142,30 @@ def workshop_production_chart(request):
             start_date = end_date - timedelta(days=days-1)
             date_format = '%a'
         
+        # Выпуск (completed_quantity задач по дню завершения) и браки цеха:
+        # по одному запросу с группировкой по дню вместо запросов на каждый день
+        period_start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+        period_end = timezone.make_aware(datetime.combine(start_date + timedelta(days=days - 1), datetime.max.time()))
+        daily_products = dict(
+            EmployeeTask.objects.filter(
+                stage__workshop=workshop,
+                completed_at__gte=period_start,
+                completed_at__lte=period_end
+            ).annotate(day=TruncDate('completed_at')).values('day').annotate(
+                total=Sum('completed_quantity')
+            ).values_list('day', 'total')
+        )
+        daily_defective = dict(
+            Defect.objects.filter(
+                user__workshop=workshop,
+                created_at__gte=period_start,
+                created_at__lte=period_end
+            ).annotate(day=TruncDate('created_at')).values('day').annotate(
+                # Единицы брака: запись может хранить несколько (Defect.quantity)
+                total=Sum('quantity')
+            ).values_list('day', 'total')
+        )
+        
         # Генерируем метки для графика
         labels = []
         products_data = []
@@ -151,26 +180,8 @@ def workshop_production_chart(request):
             else:  # year
                 labels.append(current_date.strftime(date_format))
             
-            # Подсчитываем данные за день
-            day_start = timezone.make_aware(datetime.combine(current_date, datetime.min.time()))
-            day_end = timezone.make_aware(datetime.combine(current_date, datetime.max.time()))
-            
-            # Произведенные товары за день
-            daily_products = EmployeeTask.objects.filter(
-                stage__workshop=workshop,
-                completed_at__gte=day_start,
-                completed_at__lte=day_end
-            ).aggregate(total=Sum('completed_quantity'))['total'] or 0
-            
-            # Браки за день
-            daily_defective = Defect.objects.filter(
-                user__workshop=workshop,
-                created_at__gte=day_start,
-                created_at__lte=day_end
-            ).count()
-            
-            products_data.append(daily_products)
-            defective_data.append(daily_defective)
+            products_data.append(daily_products.get(current_date) or 0)
+            defective_data.append(daily_defective.get(current_date) or 0)
             
             current_date += timedelta(days=1)
         
@@ -1,5 +1,4 @@
-from django.utils import timezone
-from .models import UserActivity
+from . import tracker
 
 class UserActivityMiddleware:
     def __init__(self, get_response):
@@ -9,10 +8,11 @@ class UserActivityMiddleware:
         # Обрабатываем запрос
         response = self.get_response(request)
         
-        # Обновляем активность пользователя, если он аутентифицирован
+        # Отмечаем активность пользователя, если он аутентифицирован;
+        # в базу трекер пишет пачками, не чаще раза в интервал
         if request.user.is_authenticated:
             try:
-                UserActivity.update_user_activity(request.user)
+                tracker.touch(request.user.pk)
             except Exception:
                 # Игнорируем ошибки при обновлении активности
                 pass
@@ -20,13 +20,23 @@ class UserActivity(models.Model):
     
     @classmethod
     def get_online_users(cls):
-        """Получить всех пользователей, которые были активны в последние 15 минут"""
-        threshold = timezone.now() - timedelta(minutes=15)
-        return cls.objects.filter(last_seen__gte=threshold, is_online=True)
+        """Получить всех пользователей, которые были активны в последние 15 минут.
+
+        Кроме записей в базе учитывается набор присутствия (apps.online.presence):
+        трекер обновляет запись пользователя не на каждый запрос.
+        """
+        from . import presence
+        now = timezone.now()
+        threshold = now - timedelta(minutes=15)
+        recent = models.Q(last_seen__gte=threshold)
+        hot = presence.online(now)
+        if hot:
+            recent |= models.Q(user_id__in=list(hot))
+        return cls.objects.filter(recent, is_online=True)
     
     @classmethod
     def update_user_activity(cls, user):
-        """Обновить активность пользователя"""
+        """Обновить активность пользователя сразу в базе (запросы отмечает apps.online.tracker)"""
         activity, created = cls.objects.get_or_create(user=user)
         activity.last_seen = timezone.now()
         activity.is_online = True
@@ -0,0 +1,237 @@
+"""
+Присутствие пользователей онлайн.
+
+Набор «кто онлайн» — пары (время последнего запроса, пользователь), упорядоченные
+по времени, поэтому отбор активных за окно — это бинарный поиск по границе.
+Хранилище задаёт настройка ONLINE_PRESENCE_STORE: 'cache' — Django cache, общий
+для процессов; 'local' — память процесса (тесты, один процесс). 'cache' требует
+общего кэша (CACHE_SHARED, Redis): иначе у каждого воркера был бы свой набор и
+своя блокировка, поэтому без него набор каждый раз читается из UserActivity. Набор пополняет
+трекер (apps.online.tracker) при сбросе буфера; пустое хранилище один раз
+заполняется из UserActivity. Набор хранится одним ключом, поэтому record()
+читает, объединяет и записывает его под блокировкой хранилища: иначе сбросы
+буферов разных процессов затирают друг друга.
+
+Страницы «Онлайн пользователи» при включённой настройке ONLINE_PRESENCE_STREAM
+получают не весь список, а изменения: event_stream() сравнивает состояния набора
+(diff) и отдаёт события Server-Sent Events snapshot/presence с пришедшими,
+ушедшими и обновлённым временем. Без неё страницы опрашивают online_users_api.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Окно «онлайн» — как в UserActivity.get_online_users
+WINDOW = timedelta(minutes=15)
+CACHE_KEY = 'online:presence'
+LOCK_KEY = 'online:presence:lock'
+# Блокировка истекает сама, если процесс упал, не сняв её
+LOCK_TIMEOUT = 5  # сек
+LOCK_RETRY_DELAY = 0.01  # сек
+
+
+def _prune(entries, threshold):
+    """Отбрасывает из упорядоченного списка (ts, user_id) всё раньше threshold"""
+    return entries[bisect.bisect_left(entries, (threshold,)):]
+
+
+def _merge(entries, seen):
+    """Новый упорядоченный список: последнее время каждого пользователя из entries и seen"""
+    latest = {user_id: ts for ts, user_id in entries}
+    for user_id, ts in seen.items():
+        if ts > latest.get(user_id, 0):
+            latest[user_id] = ts
+    return sorted((ts, user_id) for user_id, ts in latest.items())
+
+
+class LocalPresenceStore:
+    """Набор в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._entries = None
+
+    def locked(self):
+        return self._merge_lock
+
+    def load(self):
+        with self._lock:
+            return None if self._entries is None else list(self._entries)
+
+    def save(self, entries):
+        with self._lock:
+            self._entries = list(entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+
+
+class CachePresenceStore:
+    """Набор в Django cache, общий для процессов"""
+
+    @contextmanager
+    def locked(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        acquired = cache.add(LOCK_KEY, token, LOCK_TIMEOUT)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(LOCK_RETRY_DELAY)
+            acquired = cache.add(LOCK_KEY, token, LOCK_TIMEOUT)
+        if not acquired:
+            # Держатель не снял блокировку за её срок — считаем её брошенной
+            logger.warning("Не дождались блокировки набора присутствия, объединяем без неё")
+        try:
+            yield
+        finally:
+            if acquired and cache.get(LOCK_KEY) == token:
+                cache.delete(LOCK_KEY)
+
+    def load(self):
+        return cache.get(CACHE_KEY)
+
+    def save(self, entries):
+        cache.set(CACHE_KEY, entries, int(WINDOW.total_seconds()) * 2)
+
+    def clear(self):
+        cache.delete(CACHE_KEY)
+
+
+class DatabasePresenceStore:
+    """Набор из UserActivity при каждом чтении, когда общего кэша нет.
+
+    Трекер сам пишет last_seen в базу, поэтому сохранять набор не нужно.
+    """
+
+    def locked(self):
+        return nullcontext()
+
+    def load(self):
+        return None
+
+    def save(self, entries):
+        pass
+
+    def clear(self):
+        pass
+
+
+_stores = {'local': LocalPresenceStore(), 'cache': CachePresenceStore(), 'database': DatabasePresenceStore()}
+
+
+def store():
+    name = getattr(settings, 'ONLINE_PRESENCE_STORE', 'cache')
+    if name == 'cache' and not getattr(settings, 'CACHE_SHARED', False):
+        name = 'database'
+    return _stores[name]
+
+
+def _threshold(now=None):
+    return ((now or timezone.now()) - WINDOW).timestamp()
+
+
+def _entries(now=None):
+    """Упорядоченный набор за окно; пустое хранилище заполняется из базы"""
+    entries = store().load()
+    if entries is None:
+        from .models import UserActivity
+        rows = UserActivity.objects.filter(
+            last_seen__gte=(now or timezone.now()) - WINDOW, is_online=True,
+        ).values_list('user_id', 'last_seen')
+        entries = _merge([], {user_id: last_seen.timestamp() for user_id, last_seen in rows})
+        store().save(entries)
+    return _prune(entries, _threshold(now))
+
+
+def record(seen):
+    """Добавляет {user_id: время запроса} в набор"""
+    if not seen:
+        return
+    with store().locked():
+        entries = _merge(_entries(), {user_id: moment.timestamp() for user_id, moment in seen.items()})
+        store().save(_prune(entries, _threshold()))
+
+
+def online(now=None):
+    """{user_id: время последнего запроса}, самые свежие первыми"""
+    return {
+        user_id: datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        for ts, user_id in reversed(_entries(now))
+    }
+
+
+def diff(before, after):
+    """Изменения между двумя состояниями online(): пришедшие, ушедшие, обновлённое время"""
+    return {
+        'joined': [user_id for user_id in after if user_id not in before],
+        'left': [user_id for user_id in before if user_id not in after],
+        'seen': {
+            user_id: moment for user_id, moment in after.items()
+            if user_id in before and before[user_id] != moment
+        },
+    }
+
+
+def user_data(user, last_seen):
+    """Строка списка онлайн пользователей (как в online_users_api)"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name or '',
+        'last_name': user.last_name or '',
+        'email': user.email,
+        'last_seen': last_seen.isoformat(),
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+    }
+
+
+def _users_data(current, user_ids):
+    from django.contrib.auth import get_user_model
+    users = get_user_model().objects.in_bulk(user_ids)
+    return [user_data(users[user_id], current[user_id]) for user_id in user_ids if user_id in users]
+
+
+def _event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def event_stream(poll_interval=None, duration=None):
+    """SSE-поток: snapshot со всем списком, затем события presence только с изменениями.
+
+    Поток закрывается через duration секунд (меньше timeout воркера gunicorn),
+    EventSource переподключается сам (retry) и получает свежий snapshot.
+    """
+    poll_interval = poll_interval or getattr(settings, 'ONLINE_PRESENCE_POLL_INTERVAL', 5)
+    duration = duration or getattr(settings, 'ONLINE_PRESENCE_STREAM_DURATION', 25)
+    deadline = time.monotonic() + duration
+
+    current = online()
+    yield f"retry: {int(poll_interval * 1000)}\n\n"
+    yield _event('snapshot', {'users': _users_data(current, list(current)), 'total': len(current)})
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        previous, current = current, online()
+        changes = diff(previous, current)
+        if not any(changes.values()):
+            # Комментарий держит соединение через прокси
+            yield ": keepalive\n\n"
+            continue
+        yield _event('presence', {
+            'joined': _users_data(current, changes['joined']),
+            'left': changes['left'],
+            'seen': {user_id: moment.isoformat() for user_id, moment in changes['seen'].items()},
+            'total': len(current),
+        })
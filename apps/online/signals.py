@@ -18,16 +18,7 @@ def create_user_activity(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def update_user_activity_on_save(sender, instance, **kwargs):
-    """Обновляет активность пользователя при сохранении"""
+    """Обновляет активность пользователя при сохранении (через трекер, без записи в базу на каждое сохранение)"""
     if not kwargs.get('created', False):  # Только для существующих пользователей
-        try:
-            activity = UserActivity.objects.get(user=instance)
-            activity.last_seen = timezone.now()
-            activity.save(update_fields=['last_seen'])
-        except UserActivity.DoesNotExist:
-            # Если записи нет, создаем новую
-            UserActivity.objects.create(
-                user=instance,
-                last_seen=timezone.now(),
-                is_online=True
-            ) 
\ No newline at end of file
+        from . import tracker
+        tracker.touch(instance.pk)
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
@@ -150,3 +150,216 @@ class OnlineAppTestCase(TestCase):
         activity = UserActivity.objects.get(user=self.regular_user)
         self.assertTrue(activity.is_online)
         self.assertGreaterEqual(activity.last_seen, timezone.now() - timezone.timedelta(minutes=1))
+
+
+class ActivityTrackerLoadTest(TestCase):
+    """Число записей в базу на 1000 запросов: трекер против записи на каждый запрос"""
+
+    REQUESTS = 1000
+
+    def setUp(self):
+        from . import tracker
+        self.tracker = tracker
+        self.users = [
+            User.objects.create_user(username=f'load{i}', password='testpass123') for i in range(50)
+        ]
+        tracker.reset()
+        from django.core.cache import cache
+        cache.clear()
+
+    def _writes(self, handler):
+        from django.db import connection
+        from django.test import RequestFactory
+        from django.test.utils import CaptureQueriesContext
+        from apps.online.middleware import UserActivityMiddleware
+
+        factory = RequestFactory()
+        middleware = UserActivityMiddleware(lambda req: None)
+        with CaptureQueriesContext(connection) as ctx:
+            for i in range(self.REQUESTS):
+                request = factory.get('/api/poll/')
+                request.user = self.users[i % len(self.users)]
+                handler(middleware, request)
+            self.tracker.flush()
+        return [
+            q for q in ctx.captured_queries
+            if 'online_useractivity' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+
+    def test_writes_per_thousand_requests(self):
+        def direct(middleware, request):
+            UserActivity.update_user_activity(request.user)
+
+        legacy = self._writes(direct)
+        self.tracker.reset()
+        coalesced = self._writes(lambda middleware, request: middleware(request))
+
+        self.assertEqual(len(legacy), self.REQUESTS)
+        # Один UPDATE на пользователя за интервал: первый запрос пишется сразу
+        self.assertEqual(len(coalesced), len(self.users))
+        self.assertEqual(
+            set(UserActivity.get_online_users().values_list('user_id', flat=True)),
+            {user.pk for user in self.users},
+        )
+
+        # Следующая тысяча запросов в пределах интервала базу не трогает
+        self.assertEqual(len(self._writes(lambda middleware, request: middleware(request))), 0)
+
+
+class ActivityTrackerFlushTest(TestCase):
+    """Первый запрос виден сразу, буфер сбрасывается без новых запросов"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import tracker
+        self.tracker = tracker
+        tracker.reset()
+        cache.clear()
+        self.user = User.objects.create_user(username='tracked', password='testpass123')
+        UserActivity.objects.filter(user=self.user).update(last_seen=timezone.now() - timezone.timedelta(hours=1))
+
+    def tearDown(self):
+        self.tracker.reset()
+
+    def _online(self):
+        return set(UserActivity.get_online_users().values_list('user_id', flat=True))
+
+    def test_single_request_shows_user_online(self):
+        from django.test import RequestFactory
+        from apps.online.middleware import UserActivityMiddleware
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        # Новый процесс: буфер пуст, других запросов не будет
+        UserActivityMiddleware(lambda req: None)(request)
+        self.assertIn(self.user.pk, self._online())
+        self.assertEqual(self.tracker._pending, {})
+        activity = UserActivity.objects.get(user=self.user)
+        self.assertGreaterEqual(activity.last_seen, timezone.now() - timezone.timedelta(minutes=1))
+
+    @override_settings(ONLINE_ACTIVITY_FLUSH_TIMER=True)
+    def test_timer_flushes_idle_buffer(self):
+        from unittest import mock
+
+        self.tracker.touch(self.user.pk)
+        later = timezone.now() + timezone.timedelta(seconds=30)
+        with mock.patch('apps.online.tracker.threading.Timer') as timer:
+            self.tracker.touch(self.user.pk, now=later)
+            self.tracker.touch(self.user.pk, now=later)
+        # Один таймер на буфер, запросов после него больше нет
+        timer.assert_called_once()
+        self.assertEqual(self.tracker._pending, {self.user.pk: later})
+
+        callback = timer.call_args.args[1]
+        with mock.patch('apps.online.tracker.close_old_connections'):
+            callback()
+        self.assertEqual(self.tracker._pending, {})
+        self.assertEqual(self.tracker.presence.online()[self.user.pk], later)
+
+
+class PresenceTest(TestCase):
+    """Набор присутствия, изменения и поток SSE"""
+
+    def setUp(self):
+        from . import presence, tracker
+        self.presence = presence
+        tracker.reset()
+        self.staff = User.objects.create_user(username='presence_staff', password='testpass123', is_staff=True)
+        self.worker = User.objects.create_user(username='presence_worker', password='testpass123')
+        # Записи активности создаёт сигнал; оставляем онлайн только сотрудника staff
+        UserActivity.objects.filter(user=self.worker).update(last_seen=timezone.now() - timezone.timedelta(hours=1))
+
+    def test_online_set_and_diff(self):
+        before = self.presence.online()
+        self.assertEqual(list(before), [self.staff.pk])
+
+        self.presence.record({self.worker.pk: timezone.now()})
+        after = self.presence.online()
+        # Самые свежие первыми
+        self.assertEqual(list(after), [self.worker.pk, self.staff.pk])
+        self.assertEqual(self.presence.diff(before, after), {'joined': [self.worker.pk], 'left': [], 'seen': {}})
+        self.assertEqual(self.presence.diff(after, before)['left'], [self.worker.pk])
+
+    def test_stream_sends_snapshot_then_deltas(self):
+        import json
+        from itertools import islice
+        from unittest import mock
+
+        def worker_arrives(seconds):
+            self.presence.record({self.worker.pk: timezone.now()})
+
+        with mock.patch('apps.online.presence.time.sleep', side_effect=worker_arrives):
+            retry, snapshot, delta = islice(self.presence.event_stream(poll_interval=1, duration=60), 3)
+
+        self.assertTrue(retry.startswith('retry:'))
+        self.assertTrue(snapshot.startswith('event: snapshot'))
+        self.assertEqual([u['id'] for u in json.loads(snapshot.split('data: ', 1)[1])['users']], [self.staff.pk])
+        self.assertTrue(delta.startswith('event: presence'))
+        payload = json.loads(delta.split('data: ', 1)[1])
+        self.assertEqual([u['username'] for u in payload['joined']], ['presence_worker'])
+        self.assertEqual((payload['left'], payload['total']), ([], 2))
+
+    @override_settings(ONLINE_PRESENCE_STORE='cache')
+    def test_concurrent_records_are_not_lost(self):
+        import threading
+        import time
+        from unittest import mock
+
+        self.presence.store().clear()
+        self.presence.online()
+        others = [User.objects.create_user(username=f'racer{i}', password='testpass123') for i in range(4)]
+        merge = self.presence._merge
+
+        def slow_merge(entries, seen):
+            # Окно между чтением и записью набора, в котором другой поток успевает прочитать его же
+            time.sleep(0.05)
+            return merge(entries, seen)
+
+        with mock.patch('apps.online.presence._merge', side_effect=slow_merge):
+            threads = [threading.Thread(target=self.presence.record, args=({user.pk: timezone.now()},)) for user in others]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(set(self.presence.online()), {self.staff.pk} | {user.pk for user in others})
+        self.presence.store().clear()
+
+    @override_settings(ONLINE_PRESENCE_STORE='cache', CACHE_SHARED=False)
+    def test_cache_store_reads_activity_without_shared_cache(self):
+        from django.core.cache import cache
+        # Набор, оставшийся в памяти этого процесса, не читается
+        cache.set(self.presence.CACHE_KEY, [(timezone.now().timestamp(), self.worker.pk)], 60)
+        self.assertEqual(list(self.presence.online()), [self.staff.pk])
+        # Запись активности, сделанная другим процессом, видна сразу
+        UserActivity.objects.filter(user=self.worker).update(last_seen=timezone.now())
+        self.assertEqual(list(self.presence.online()), [self.worker.pk, self.staff.pk])
+        cache.delete(self.presence.CACHE_KEY)
+
+    def test_stream_is_off_by_default(self):
+        self.client.force_login(self.staff)
+        # С синхронными воркерами gunicorn страница опрашивает API, поток выключен
+        self.assertEqual(self.client.get(reverse('online:online_users_stream')).status_code, 404)
+
+        with override_settings(ONLINE_PRESENCE_STREAM=True):
+            response = self.client.get(reverse('online:online_users_stream'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.close()
+
+    def test_api_queries_do_not_grow_with_users(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_login(self.staff)
+        # Первый запрос заполняет набор присутствия из базы
+        self.client.get(reverse('online:online_users_api'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('online:online_users_api'))
+        few = len(ctx.captured_queries)
+
+        others = [User.objects.create_user(username=f'presence{i}', password='testpass123') for i in range(10)]
+        self.presence.record({user.pk: timezone.now() for user in others})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('online:online_users_api'))
+        self.assertGreaterEqual(response.json()['total'], 11)
+        self.assertEqual(len(ctx.captured_queries), few)
@@ -0,0 +1,127 @@
+"""
+Учёт активности пользователей без записи в базу на каждый запрос.
+
+Первый запрос пользователя за ONLINE_ACTIVITY_FLUSH_INTERVAL секунд пишется
+в UserActivity и набор присутствия (apps.online.presence) сразу: ключ
+cache.add на пользователя отмечает, что запись за интервал уже была. Следующие
+запросы за интервал только запоминают время в буфере процесса; буфер
+сбрасывается (flush) при запросе после истечения интервала и по таймеру
+процесса, поэтому время не застревает в процессе, к которому запросы больше не
+приходят. Сброс пишет время в набор присутствия, а в базу одним UPDATE (плюс
+bulk_create для новых) — только тех, чей ключ за интервал освободился.
+
+UserActivity.get_online_users берёт из набора присутствия тех, чья запись
+в базе ещё не догнала последний запрос.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from . import presence
+
+logger = logging.getLogger(__name__)
+
+FLUSHED_KEY = 'online:flushed'
+
+_lock = threading.Lock()
+_pending = {}
+_state = {'flushed_at': time.monotonic(), 'timer': None}
+
+
+def _interval():
+    return getattr(settings, 'ONLINE_ACTIVITY_FLUSH_INTERVAL', 60)
+
+
+def _claim(user_id):
+    """True, если за интервал пользователя ещё не записывал ни один процесс"""
+    return cache.add(f'{FLUSHED_KEY}:{user_id}', 1, _interval())
+
+
+def touch(user_id, now=None):
+    """Отмечает запрос пользователя: первый за интервал пишет сразу, остальные — в буфер"""
+    now = now or timezone.now()
+    if _claim(user_id):
+        presence.record({user_id: now})
+        _write({user_id: now})
+        return
+    with _lock:
+        _pending[user_id] = now
+        due = time.monotonic() - _state['flushed_at'] >= _interval()
+        if not due:
+            _schedule()
+    if due:
+        flush()
+
+
+def _schedule():
+    """Запускает таймер сброса буфера, если он ещё не запущен (вызывается под _lock)"""
+    if _state['timer'] is not None or not getattr(settings, 'ONLINE_ACTIVITY_FLUSH_TIMER', True):
+        return
+    timer = threading.Timer(_interval(), _flush_on_timer)
+    timer.daemon = True
+    _state['timer'] = timer
+    timer.start()
+
+
+def _flush_on_timer():
+    with _lock:
+        _state['timer'] = None
+    try:
+        flush()
+    except Exception as e:
+        logger.warning(f"Ошибка сброса буфера активности по таймеру: {e}")
+    finally:
+        # Поток таймера сам открыл соединение с базой
+        close_old_connections()
+
+
+def flush():
+    """Записывает буфер процесса в набор присутствия и UserActivity; возвращает число записанных пользователей"""
+    with _lock:
+        seen = dict(_pending)
+        _pending.clear()
+        _state['flushed_at'] = time.monotonic()
+    if not seen:
+        return 0
+    presence.record(seen)
+
+    # В базу — только те, кого за интервал ещё не записывал ни один процесс
+    due = {user_id: moment for user_id, moment in seen.items() if _claim(user_id)}
+    if due:
+        _write(due)
+    return len(due)
+
+
+def _write(due):
+    """Пишет {user_id: время} в UserActivity: один UPDATE и bulk_create для новых"""
+    from .models import UserActivity
+
+    last_seen = Case(
+        *[When(user_id=user_id, then=Value(moment)) for user_id, moment in due.items()],
+        output_field=DateTimeField(),
+    )
+    updated = UserActivity.objects.filter(user_id__in=due).update(last_seen=last_seen, is_online=True)
+    if updated == len(due):
+        return
+    existing = set(UserActivity.objects.filter(user_id__in=due).values_list('user_id', flat=True))
+    UserActivity.objects.bulk_create([
+        UserActivity(user_id=user_id, last_seen=moment, is_online=True)
+        for user_id, moment in due.items() if user_id not in existing
+    ])
+
+
+def reset():
+    """Очищает буфер процесса и набор присутствия (для тестов и замеров)"""
+    with _lock:
+        _pending.clear()
+        _state['flushed_at'] = time.monotonic()
+        if _state['timer'] is not None:
+            _state['timer'].cancel()
+            _state['timer'] = None
+    presence.store().clear()
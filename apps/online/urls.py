@@ -6,5 +6,6 @@ app_name = 'online'
 urlpatterns = [
     path('', views.online_users_view, name='online_users'),
     path('api/', views.online_users_api, name='online_users_api'),
+    path('stream/', views.online_users_stream, name='online_users_stream'),
     path('user/<int:user_id>/', views.user_activity_detail, name='user_activity_detail'),
 ] 
\ No newline at end of file
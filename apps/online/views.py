@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from .models import UserActivity
+from . import presence, tracker
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -21,15 +23,17 @@ def online_users_view(request):
         return redirect('home')
     
     # Обновляем активность текущего пользователя
-    UserActivity.update_user_activity(request.user)
+    tracker.touch(request.user.pk)
     
     # Получаем всех онлайн пользователей
-    online_users = UserActivity.get_online_users()
+    online_users = UserActivity.get_online_users().select_related('user')
     
     context = {
         'online_users': online_users,
         'total_online': online_users.count(),
         'current_time': timezone.now(),
+        # Без потока SSE страница опрашивает online_users_api
+        'presence_stream': getattr(settings, 'ONLINE_PRESENCE_STREAM', False),
     }
     
     return render(request, 'online/online_users.html', context)
@@ -41,20 +45,9 @@ def online_users_api(request):
     if not request.user.is_staff:
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    online_users = UserActivity.get_online_users()
+    online_users = UserActivity.get_online_users().select_related('user')
     
-    users_data = []
-    for activity in online_users:
-        users_data.append({
-            'id': activity.user.id,
-            'username': activity.user.username,
-            'first_name': activity.user.first_name or '',
-            'last_name': activity.user.last_name or '',
-            'email': activity.user.email,
-            'last_seen': activity.last_seen.isoformat(),
-            'is_staff': activity.user.is_staff,
-            'is_superuser': activity.user.is_superuser,
-        })
+    users_data = [presence.user_data(activity.user, activity.last_seen) for activity in online_users]
     
     return JsonResponse({
         'users': users_data,
@@ -62,6 +55,25 @@ def online_users_api(request):
         'timestamp': timezone.now().isoformat()
     })
 
+@login_required
+@user_passes_test(is_staff_user)
+def online_users_stream(request):
+    """Поток Server-Sent Events: полный список при подключении, дальше только изменения.
+
+    Включается настройкой ONLINE_PRESENCE_STREAM: подключение занимает воркер,
+    поэтому поток отдаётся только с асинхронными воркерами gunicorn (gevent).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    if not getattr(settings, 'ONLINE_PRESENCE_STREAM', False):
+        raise Http404("Поток присутствия отключён")
+    
+    response = StreamingHttpResponse(presence.event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @user_passes_test(is_staff_user)
 def user_activity_detail(request, user_id):
@@ -29,7 +29,8 @@ class WorkshopSerializer(serializers.ModelSerializer):
     def get_defects(self, obj):
         """Подсчитывает количество браков в цехе"""
         from apps.defects.models import Defect
-        return Defect.objects.filter(user__workshop=obj).count()
+        from django.db.models import Sum
+        return Defect.objects.filter(user__workshop=obj).aggregate(total=Sum('quantity'))['total'] or 0
     
     def get_productivity(self, obj):
         """Вычисляет производительность цеха"""
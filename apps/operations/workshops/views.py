@@ -376,7 +376,7 @@ def workshops_list(request):
 			active_tasks = EmployeeTask.objects.filter(stage__workshop=workshop).count()
 			
 			# Подсчитываем браки
-			defects = Defect.objects.filter(user__workshop=workshop).count()
+			defects = Defect.objects.filter(user__workshop=workshop).aggregate(total=Sum('quantity'))['total'] or 0
 			
 			# Вычисляем производительность на основе выполненных задач
 			completed_tasks = EmployeeTask.objects.filter(
@@ -0,0 +1,163 @@
+"""
+Данные графика выручки для дашбордов (DashboardRevenueChartAPIView).
+
+Каждая метрика считается одним сгруппированным по TruncDate запросом на
+весь диапазон, пропущенные дни заполняются нулями в Python. Закрытые дни
+(раньше сегодняшнего) кэшируются на REVENUE_CHART_CACHE_TIMEOUT секунд,
+пересчитывается только диапазон от первого некэшированного дня до сегодня.
+Сохранение задач, браков и позиций заказа сбрасывает ключ своего дня
+(invalidate_day, apps.odashboard.signals); срок жизни страхует от изменений
+в обход сигналов (QuerySet.update, смена цены продукта).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+PERIOD_DAYS = {'week': 7, 'month': 30, 'year': 365}
+DEFAULT_PERIOD = 'week'
+
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_GRANULARITY = 'day'
+
+METRICS = ('revenue', 'defects', 'orders_count', 'sales')
+
+# При изменении формата метрик увеличить версию — старые ключи перестанут читаться
+CACHE_VERSION = 1
+CACHE_KEY = 'orders:revenue_chart:v{version}:{day}'
+
+
+def _cache_key(day):
+    return CACHE_KEY.format(version=CACHE_VERSION, day=day.isoformat())
+
+
+def _timeout():
+    return getattr(settings, 'REVENUE_CHART_CACHE_TIMEOUT', 3600)
+
+
+def invalidate_day(moment):
+    """Сбрасывает закэшированные метрики дня, к которому относится moment"""
+    if moment is None:
+        return
+    key = _cache_key(timezone.localdate(moment) if isinstance(moment, datetime) else moment)
+    cache.delete(key)
+    # Другой процесс мог закэшировать день до коммита — сбрасываем ещё раз
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _empty_metrics():
+    return {'revenue': Decimal('0'), 'defects': 0, 'orders_count': 0, 'sales': 0}
+
+
+def compute_daily_metrics(start, end):
+    """Метрики по дням за [start, end] (даты в текущем часовом поясе): четыре запроса"""
+    from apps.employee_tasks.models import EmployeeTask
+    from .models import Order, OrderDefect, OrderItem
+
+    # Границы диапазона как datetime, чтобы фильтр мог использовать индекс по дате
+    since = timezone.make_aware(datetime.combine(start, time.min))
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+
+    days = {}
+    for offset in range((end - start).days + 1):
+        days[start + timedelta(days=offset)] = _empty_metrics()
+
+    orders = (
+        Order.objects.filter(created_at__gte=since, created_at__lt=until)
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(total=Count('id'))
+    )
+    for row in orders:
+        days[row['day']]['orders_count'] = row['total']
+
+    # Доход и продажи — по позициям заказов, созданных в этот день
+    items = (
+        OrderItem.objects.filter(order__created_at__gte=since, order__created_at__lt=until)
+        .annotate(day=TruncDate('order__created_at')).values('day')
+        .annotate(
+            revenue=Sum(F('product__price') * F('quantity'), output_field=DecimalField(max_digits=15, decimal_places=2)),
+            sales=Sum('quantity'),
+        )
+    )
+    for row in items:
+        days[row['day']]['revenue'] = row['revenue'] or Decimal('0')
+        days[row['day']]['sales'] = row['sales'] or 0
+
+    # Брак: сумма из OrderDefect + сумма defective_quantity из EmployeeTask
+    order_defects = (
+        OrderDefect.objects.filter(date__gte=since, date__lt=until)
+        .annotate(day=TruncDate('date')).values('day')
+        .annotate(total=Sum('quantity'))
+    )
+    employee_defects = (
+        EmployeeTask.objects.filter(created_at__gte=since, created_at__lt=until)
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(total=Sum('defective_quantity'))
+    )
+    for rows in (order_defects, employee_defects):
+        for row in rows:
+            days[row['day']]['defects'] += row['total'] or 0
+
+    return days
+
+
+def get_daily_metrics(start, end):
+    """Метрики по дням с кэшем закрытых дней"""
+    today = timezone.localdate()
+    last_closed = min(end, today - timedelta(days=1))
+    closed_days = [start + timedelta(days=offset) for offset in range((last_closed - start).days + 1)]
+    cached = cache.get_many([_cache_key(day) for day in closed_days])
+    days = {day: cached[_cache_key(day)] for day in closed_days if _cache_key(day) in cached}
+
+    missing = [day for day in closed_days if day not in days]
+    compute_from = missing[0] if missing else max(start, today)
+    if compute_from <= end:
+        fresh = compute_daily_metrics(compute_from, end)
+        days.update(fresh)
+        cache.set_many(
+            {_cache_key(day): metrics for day, metrics in fresh.items() if day < today},
+            timeout=_timeout(),
+        )
+    return days
+
+
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _bucket_label(day, granularity):
+    if granularity == 'month':
+        return day.strftime('%m.%Y')
+    return day.strftime('%d.%m')
+
+
+def revenue_chart(period=DEFAULT_PERIOD, granularity=DEFAULT_GRANULARITY):
+    """Ряды графика за период с группировкой по дням, неделям или месяцам"""
+    days_count = PERIOD_DAYS.get(period, PERIOD_DAYS[DEFAULT_PERIOD])
+    if granularity not in GRANULARITIES:
+        granularity = DEFAULT_GRANULARITY
+    end = timezone.localdate()
+    start = end - timedelta(days=days_count - 1)
+
+    buckets = {}
+    for day, metrics in sorted(get_daily_metrics(start, end).items()):
+        bucket = buckets.setdefault(_bucket_start(day, granularity), _empty_metrics())
+        for metric in METRICS:
+            bucket[metric] += metrics[metric]
+
+    chart = {'labels': [], 'revenue': [], 'defects': [], 'orders_count': [], 'sales': []}
+    for bucket_start, metrics in buckets.items():
+        chart['labels'].append(_bucket_label(bucket_start, granularity))
+        for metric in METRICS:
+            chart[metric].append(metrics[metric])
+    chart['granularity'] = granularity
+    return chart
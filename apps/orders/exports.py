@@ -0,0 +1,237 @@
+"""
+Экспорт заявок в Excel.
+
+Книги строятся в режиме openpyxl write_only: строки сразу сбрасываются во
+временные файлы, оформление задаётся общими именованными стилями (NamedStyle)
+вместо отдельных объектов Font/Border на каждую ячейку, а заявки читаются
+через .iterator(chunk_size=...), поэтому память не зависит от числа заявок.
+Книги формирует фоновая выгрузка (apps.exports) через export_requests и
+export_client_requests; файл пишется в переданный файловый объект.
+"""
+from django.db.models import Prefetch
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+EXPORT_CHUNK_SIZE = 500
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+REQUEST_STATUS_LABELS = {
+    'pending': 'Ожидает',
+    'approved': 'Одобрена',
+    'in_production': 'В производстве',
+    'rejected': 'Отклонена',
+}
+
+GLASS_OPERATIONS = ['Распил', 'ЧПУ', 'Пескоструй', 'УФ печать']
+REGULAR_OPERATIONS = ['Распил', 'ЧПУ', 'Пресс', 'Кромка', 'Шлифовка', 'Грунтовка', 'Покраска']
+
+# Сколько строк занимает цех в клиентском экспорте (по умолчанию 1)
+CLIENT_WORKSHOP_ROWS = {1: 3, 3: 2, 4: 2, 8: 2, 9: 6, 10: 2, 11: 2}
+# Цех ЧПУ в клиентский экспорт не попадает
+CLIENT_EXCLUDED_WORKSHOP_ID = 2
+
+
+def _build_named_styles():
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    center = Alignment(horizontal="center", vertical="center")
+
+    def style(name, **attrs):
+        named = NamedStyle(name=name)
+        for attr, value in attrs.items():
+            setattr(named, attr, value)
+        return named
+
+    return [
+        style('req_title', font=Font(bold=True, size=14)),
+        style('req_label', font=Font(bold=True, size=12)),
+        style('req_value', font=Font(size=12)),
+        style('req_value_bold', font=Font(size=12, bold=True)),
+        style('req_header', font=Font(bold=True, size=12), fill=header_fill, alignment=center, border=border),
+        style('req_cell', border=border),
+        style('req_total', font=Font(bold=True), border=border),
+        style('req_client_title', font=Font(bold=True, size=12), alignment=center),
+        style('req_client_header', font=Font(bold=True, size=10, color="FFFFFF"), fill=header_fill, alignment=center, border=border),
+        style('req_client_total', font=Font(bold=True), border=border, alignment=Alignment(horizontal="right")),
+    ]
+
+
+def _new_workbook():
+    wb = Workbook(write_only=True)
+    for named_style in _build_named_styles():
+        wb.add_named_style(named_style)
+    return wb
+
+
+def _cell(ws, value, style=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if style:
+        cell.style = style
+    return cell
+
+
+def _sheet_title(request_obj):
+    # Название листа ограничено 31 символом
+    sheet_name = f"Заявка {request_obj.id}"
+    if len(sheet_name) > 31:
+        sheet_name = f"Заявка{request_obj.id}"
+    return sheet_name
+
+
+def _request_title(request_obj):
+    return f"Заказ №{request_obj.id}-{request_obj.name} {request_obj.created_at.strftime('%d/%m/%y')}"
+
+
+def add_one_to_size(size):
+    """Добавляет 1 к размеру до пресса (например, 80-200 -> 81-201)"""
+    if not size:
+        return size
+    try:
+        parts = size.split('-')
+        if len(parts) == 2:
+            return f"{int(parts[0]) + 1}-{int(parts[1]) + 1}"
+        # Если размер не в формате X-Y, возвращаем как есть
+        return size
+    except (ValueError, TypeError):
+        return size
+
+
+def iter_requests(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Заявки с клиентом и позициями, читаемые порциями по chunk_size"""
+    from apps.finance.models import RequestItem
+    return queryset.select_related('client').prefetch_related(
+        Prefetch('items', queryset=RequestItem.objects.select_related('product').order_by('id'))
+    ).iterator(chunk_size=chunk_size)
+
+
+def write_requests_workbook(requests, fileobj):
+    """Общий экспорт: лист на каждую заявку с позициями, операциями и итогами"""
+    wb = _new_workbook()
+    for request_obj in requests:
+        ws = wb.create_sheet(title=_sheet_title(request_obj))
+        for column, width in zip('ABCDE', (8, 40, 15, 10, 50)):
+            ws.column_dimensions[column].width = width
+        ws.merged_cells.add('A1:E1')
+
+        client = request_obj.client
+        ws.append([_cell(ws, _request_title(request_obj), 'req_title')])
+        ws.append([])
+        ws.append([_cell(ws, "Клиент:", 'req_label'), _cell(ws, client.name, 'req_value')])
+        ws.append([_cell(ws, "Компания:", 'req_label'), _cell(ws, client.company or "", 'req_value')])
+        ws.append([_cell(ws, "Телефон:", 'req_label'), _cell(ws, client.phone or "", 'req_value')])
+        ws.append([])
+        ws.append([_cell(ws, header, 'req_header') for header in ['№', 'Материал', 'Размер', 'Шт', 'Операции']])
+
+        total_quantity = 0
+        for idx, item in enumerate(request_obj.items.all(), 1):
+            material = item.product.name
+            if item.glass_type:
+                material += f" ({item.glass_type})"
+            operations = GLASS_OPERATIONS if item.product.is_glass else REGULAR_OPERATIONS
+            total_quantity += item.quantity
+            ws.append([
+                _cell(ws, value, 'req_cell')
+                for value in (idx, material, item.size or "", item.quantity, ", ".join(operations))
+            ])
+
+        ws.append([
+            _cell(ws, "Общий", 'req_total'), None, None,
+            _cell(ws, f"{total_quantity}шт", 'req_total'),
+        ])
+        ws.append([])
+        ws.append([])
+        ws.append([_cell(ws, "Комментарий:", 'req_label'), _cell(ws, request_obj.comment or "", 'req_value')])
+        ws.append([_cell(ws, "Общая сумма:", 'req_label'), _cell(ws, f"{request_obj.total_amount or 0} сом", 'req_value_bold')])
+        ws.append([
+            _cell(ws, "Статус:", 'req_label'),
+            _cell(ws, REQUEST_STATUS_LABELS.get(request_obj.status, request_obj.status), 'req_value'),
+        ])
+    if not wb.worksheets:
+        wb.create_sheet(title="Заявки")
+    wb.save(fileobj)
+
+
+def _client_item_values(workshop_id, workshop_row, item):
+    """Значения столбцов материал/размер/шт для строки цеха и количество в итог"""
+    name = item.product.name
+    if workshop_id == 1 and workshop_row == 0:  # Распил
+        # До пресса x2 от количества заявки и +1 к размеру
+        quantity = item.quantity * 2
+        return (name, add_one_to_size(item.size or "80-200"), quantity), quantity
+    if workshop_id == 1 and workshop_row == 1:
+        return (f"{name} МДФ {item.size or '1,0'}", "", ""), 0
+    if workshop_id == 1 and workshop_row == 2:
+        return (f"{name} стекло", item.size or "30 40", ""), 0
+    if workshop_id == 3 and workshop_row == 0:  # Заготовка
+        return (f"{name} ГЛУХОЙ", add_one_to_size(item.size or "80-200"), item.quantity * 2), 0
+    if workshop_id in (4, 10) and workshop_row == 0:  # Пресс, Покраска — реальное количество
+        return (f"{name} ГЛУХОЙ", item.size or "80-200", item.quantity), 0
+    if workshop_id in (8, 9) and workshop_row == 0:  # Грунтовка, Шкурка белый
+        return ("", "", f"{item.quantity}шт"), 0
+    return ("", "", ""), 0
+
+
+def write_client_requests_workbook(requests, workshops, fileobj):
+    """Экспорт заявок клиента: по каждому цеху строки на каждую позицию, альбомная печать"""
+    workshops = [w for w in workshops if w.id != CLIENT_EXCLUDED_WORKSHOP_ID]
+    wb = _new_workbook()
+    for request_obj in requests:
+        ws = wb.create_sheet(title=_sheet_title(request_obj))
+        for column, width in zip('ABCDEFGHI', (8, 20, 35, 18, 12, 18, 15, 12, 12)):
+            ws.column_dimensions[column].width = width
+        ws.merged_cells.add('A1:I1')
+        ws.page_setup.orientation = 'landscape'
+        ws.sheet_properties.pageSetUpPr.fitToPage = True
+        ws.page_setup.fitToHeight = 1
+        ws.page_setup.fitToWidth = 1
+        ws.page_margins.left = ws.page_margins.right = 0.3
+        ws.page_margins.top = ws.page_margins.bottom = 0.3
+        ws.page_margins.header = ws.page_margins.footer = 0.2
+
+        ws.append([_cell(ws, _request_title(request_obj), 'req_client_title')])
+        ws.append([_cell(ws, header, 'req_client_header') for header in ['№', 'цеха', 'материал', 'размер', 'шт', '', '', '', '']])
+
+        items = list(request_obj.items.all())
+        for workshop_num, workshop in enumerate(workshops, 1):
+            for item in items:
+                for workshop_row in range(CLIENT_WORKSHOP_ROWS.get(workshop.id, 1)):
+                    # Первая строка цеха содержит номер и название
+                    if workshop_row == 0:
+                        head = (workshop_num, workshop.name)
+                    else:
+                        head = ("", "")
+                    values, _ = _client_item_values(workshop.id, workshop_row, item)
+                    ws.append([_cell(ws, value, 'req_cell') for value in head + values + ("", "", "", "")])
+
+        total_quantity = sum(item.quantity for item in items)
+        total_row = [_cell(ws, "общий", 'req_client_total')]
+        total_row += [_cell(ws, "", 'req_cell') for _ in range(5)]
+        total_row += [_cell(ws, f"{total_quantity}шт", 'req_total'), _cell(ws, "", 'req_cell'), _cell(ws, "", 'req_cell')]
+        ws.append(total_row)
+    if not wb.worksheets:
+        wb.create_sheet(title="Заявки")
+    wb.save(fileobj)
+
+
+def export_requests(params, fileobj):
+    """Фоновая выгрузка всех заявок (apps.exports)"""
+    from django.utils import timezone
+    from apps.finance.models import Request
+    requests = Request.objects.all().order_by('-created_at')
+    write_requests_workbook(iter_requests(requests), fileobj)
+    return f'заявки_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx', XLSX_CONTENT_TYPE
+
+
+def export_client_requests(params, fileobj):
+    """Фоновая выгрузка заявок клиента (apps.exports)"""
+    from django.utils import timezone
+    from apps.clients.models import Client
+    from apps.finance.models import Request
+    from apps.operations.workshops.models import Workshop
+    client = Client.objects.get(pk=params['client_id'])
+    requests = Request.objects.filter(client=client).order_by('-created_at')
+    workshops = list(Workshop.objects.exclude(id=CLIENT_EXCLUDED_WORKSHOP_ID).order_by('id'))
+    write_client_requests_workbook(iter_requests(requests), workshops, fileobj)
+    return f'заявки_{client.name}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx', XLSX_CONTENT_TYPE
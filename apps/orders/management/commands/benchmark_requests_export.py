@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.clients.models import Client
+from apps.finance.models import Request, RequestItem
+from apps.orders.exports import iter_requests, write_requests_workbook
+from apps.products.models import Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Замеряет потоковый экспорт заявок в Excel: пиковая память и время на N тестовых заявках (данные откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Количество заявок (по умолчанию 10000)')
+        parser.add_argument('--items', type=int, default=3, help='Позиций в каждой заявке (по умолчанию 3)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        items_per_request = options['items']
+        try:
+            with transaction.atomic():
+                self._create_data(count, items_per_request)
+                self._run_export(count)
+                # Тестовые данные не сохраняем
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _create_data(self, count, items_per_request):
+        self.stdout.write(f'Создаём {count} заявок по {items_per_request} позиции...')
+        client = Client.objects.create(name='Benchmark client')
+        door = Product.objects.create(name='Benchmark door')
+        glass = Product.objects.create(name='Benchmark glass', is_glass=True)
+        requests = Request.objects.bulk_create(
+            [Request(name=f'Benchmark {i}', client=client, comment='benchmark') for i in range(count)],
+            batch_size=1000,
+        )
+        RequestItem.objects.bulk_create(
+            [
+                RequestItem(request=req, product=glass if n % 2 else door, quantity=n + 1, size='80-200')
+                for req in requests for n in range(items_per_request)
+            ],
+            batch_size=2000,
+        )
+
+    def _run_export(self, count):
+        queryset = Request.objects.filter(name__startswith='Benchmark ').order_by('-created_at')
+        with tempfile.TemporaryFile() as fileobj:
+            tracemalloc.start()
+            started = time.perf_counter()
+            write_requests_workbook(iter_requests(queryset), fileobj)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            size = fileobj.seek(0, os.SEEK_END)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Экспорт {count} заявок: {elapsed:.2f} с, пик памяти {peak / 1024 / 1024:.1f} МБ, файл {size / 1024 / 1024:.1f} МБ'
+        ))
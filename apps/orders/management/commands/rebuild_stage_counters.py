@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.orders.models import OrderStage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики этапов (назначено/выполнено/брак) по задачам сотрудников или проверяет их согласованность'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не изменяя (код возврата 1 при расхождениях)'
+        )
+        parser.add_argument(
+            '--order',
+            type=int,
+            help='Ограничить обработку этапами одного заказа'
+        )
+
+    def handle(self, *args, **options):
+        queryset = OrderStage.objects.all()
+        if options['order']:
+            queryset = queryset.filter(order_id=options['order'])
+
+        if options['check']:
+            mismatches = OrderStage.check_progress_counters(queryset)
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS('Счётчики этапов согласованы с задачами'))
+                return
+            for row in mismatches:
+                details = ', '.join(
+                    f"{field}: {row[field]} != {row[f'actual_{field}']}"
+                    for field in OrderStage.PROGRESS_COUNTER_FIELDS
+                    if row[field] != row[f'actual_{field}']
+                )
+                self.stdout.write(f"  Этап {row['id']}: {details}")
+            raise CommandError(f'Найдено этапов с расхождениями: {len(mismatches)}')
+
+        updated = OrderStage.rebuild_progress_counters(queryset)
+        self.stdout.write(self.style.SUCCESS(f'Пересчитаны счётчики для {updated} этапов'))
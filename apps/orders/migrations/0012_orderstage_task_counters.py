@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 04:43
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_task_counters(apps, schema_editor):
+    OrderStage = apps.get_model('orders', 'OrderStage')
+    EmployeeTask = apps.get_model('employee_tasks', 'EmployeeTask')
+    counters = {
+        'tasks_assigned_quantity': 'quantity',
+        'tasks_completed_quantity': 'completed_quantity',
+        'tasks_defective_quantity': 'defective_quantity',
+    }
+    updates = {}
+    for field, task_field in counters.items():
+        total = EmployeeTask.objects.filter(stage=OuterRef('pk')).values('stage').annotate(
+            total=Sum(task_field)
+        ).values('total')
+        updates[field] = Coalesce(Subquery(total), 0)
+    OrderStage.objects.update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_add_preparation_specs'),
+        ('employee_tasks', '0008_employeetask_additional_penalties_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderstage',
+            name='tasks_assigned_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Назначено сотрудникам'),
+        ),
+        migrations.AddField(
+            model_name='orderstage',
+            name='tasks_completed_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Выполнено сотрудниками'),
+        ),
+        migrations.AddField(
+            model_name='orderstage',
+            name='tasks_defective_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Брак сотрудников'),
+        ),
+        migrations.RunPython(fill_task_counters, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Q, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
 from datetime import datetime, time, timedelta
 from django.utils import timezone
 
@@ -148,6 +150,12 @@ class OrderStage(models.Model):
     status = models.CharField('Статус', max_length=30, choices=STAGE_STATUS_CHOICES, default='in_progress')
     parallel_group = models.PositiveIntegerField('Группа параллельной обработки', null=True, blank=True, help_text='Для параллельных потоков (например, стекло)')
     
+    # Денормализованные счётчики по задачам сотрудников (EmployeeTask).
+    # Обновляются через F() из сигналов EmployeeTask, пересчитываются командой rebuild_stage_counters
+    tasks_assigned_quantity = models.PositiveIntegerField('Назначено сотрудникам', default=0)
+    tasks_completed_quantity = models.PositiveIntegerField('Выполнено сотрудниками', default=0)
+    tasks_defective_quantity = models.PositiveIntegerField('Брак сотрудников', default=0)
+    
     # Поля для спецификаций
     cnc_specs = models.TextField('Спецификации ЧПУ', blank=True, null=True)
     cutting_specs = models.TextField('Спецификации распила', blank=True, null=True)
@@ -174,23 +182,71 @@ class OrderStage(models.Model):
     @property
     def waiting_for_master(self):
         # Сколько ещё не распределено сотрудникам
-        assigned = sum(task.quantity for task in self.employee_tasks.all())
-        return max(0, self.plan_quantity - assigned)
+        return max(0, self.plan_quantity - self.tasks_assigned_quantity)
 
     @property
     def in_progress_count(self):
         # Сколько назначено сотрудникам, но не выполнено
-        return sum(task.quantity for task in self.employee_tasks.filter(is_completed=False))
+        return max(0, self.tasks_assigned_quantity - self.tasks_completed_quantity)
 
     @property
     def done_count(self):
         # Сколько сотрудники уже выполнили (сумма completed_quantity по EmployeeTask)
-        return sum(task.completed_quantity for task in self.employee_tasks.all())
+        return self.tasks_completed_quantity
 
     @property
     def defective_count(self):
         # Сумма брака по всем задачам этапа
-        return sum(task.defective_quantity for task in self.employee_tasks.all())
+        return self.tasks_defective_quantity
+
+    PROGRESS_COUNTER_FIELDS = {
+        'tasks_assigned_quantity': 'quantity',
+        'tasks_completed_quantity': 'completed_quantity',
+        'tasks_defective_quantity': 'defective_quantity',
+    }
+
+    @classmethod
+    def apply_progress_delta(cls, stage_id, assigned=0, completed=0, defective=0):
+        """Атомарно сдвигает счётчики этапа на дельту (UPDATE ... SET x = x + delta)"""
+        deltas = {
+            'tasks_assigned_quantity': assigned,
+            'tasks_completed_quantity': completed,
+            'tasks_defective_quantity': defective,
+        }
+        updates = {
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items() if delta
+        }
+        if stage_id and updates:
+            cls.objects.filter(pk=stage_id).update(**updates)
+
+    @classmethod
+    def _progress_subqueries(cls):
+        from apps.employee_tasks.models import EmployeeTask
+        subqueries = {}
+        for field, task_field in cls.PROGRESS_COUNTER_FIELDS.items():
+            total = EmployeeTask.objects.filter(stage=OuterRef('pk')).values('stage').annotate(
+                total=Sum(task_field)
+            ).values('total')
+            subqueries[field] = Coalesce(Subquery(total), 0)
+        return subqueries
+
+    @classmethod
+    def rebuild_progress_counters(cls, queryset=None):
+        """Пересчитывает счётчики с нуля одним UPDATE. Возвращает число обновлённых этапов"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(**cls._progress_subqueries())
+
+    @classmethod
+    def check_progress_counters(cls, queryset=None):
+        """Возвращает этапы, у которых сохранённые счётчики расходятся с суммами по задачам"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        actual = {f'actual_{field}': expr for field, expr in cls._progress_subqueries().items()}
+        mismatch = Q()
+        for field in cls.PROGRESS_COUNTER_FIELDS:
+            mismatch |= ~Q(**{field: F(f'actual_{field}')})
+        values = ['id'] + list(cls.PROGRESS_COUNTER_FIELDS) + list(actual)
+        return list(queryset.annotate(**actual).filter(mismatch).values(*values).order_by('id'))
 
     @property
     def transferred_count(self):
@@ -261,83 +317,13 @@ class OrderStage(models.Model):
     def confirm_stage(self, completed_qty):
         """
         Мастер подтверждает выполнение этапа. Если выполнено не всё — остаток остаётся, выполненное уходит дальше.
+        Переход выполняется атомарно движком apps.orders.workflow.
         """
-        from apps.orders.models import OrderStage
-        
-        # Проверяем, можно ли переходить к упаковке (для стеклянных изделий)
-        if not self.can_proceed_to_packaging():
-            return False, "Нельзя переходить к упаковке: резка стекла не завершена"
-        
-        if completed_qty >= self.plan_quantity:
-            self.completed_quantity = self.plan_quantity
-            self.status = 'done'
-            self.save()
-            
-            # Если это этап резки стекла, отмечаем его как завершенный
-            if self.is_glass_stage() and 'распил стекла' in (self.operation or '').lower():
-                if self.order_item:
-                    self.order_item.glass_cutting_completed = True
-                    self.order_item.glass_cutting_quantity = completed_qty
-                    self.order_item.save()
-            
-            # Если это этап упаковки, создаем запись в finished_goods
-            if self.is_packaging_stage():
-                self._create_finished_good(completed_qty)
-            
-            # Специальная логика для цеха ID4 (Пресс) - завершаем заказ
-            if self.workshop and self.workshop.id == 4:
-                # Завершаем весь заказ
-                self.order.status = 'completed'
-                self.order.save()
-                print(f"Заказ {self.order.id} завершен после выполнения этапа в цеху 4")
-                return True, "Заказ завершен"
-            
-            self._activate_next_stage(self.plan_quantity)
-        elif completed_qty > 0:
-            # Часть выполнено, часть — остаток
-            self.completed_quantity = completed_qty
-            self.status = 'partial'
-            self.save()
-            
-            # Если это этап резки стекла, отмечаем его как завершенный
-            if self.is_glass_stage() and 'распил стекла' in (self.operation or '').lower():
-                if self.order_item:
-                    self.order_item.glass_cutting_completed = True
-                    self.order_item.glass_cutting_quantity = completed_qty
-                    self.order_item.save()
-            
-            # Если это этап упаковки, создаем запись в finished_goods
-            if self.is_packaging_stage():
-                self._create_finished_good(completed_qty)
-            
-            # Специальная логика для цеха ID4 (Пресс) - завершаем заказ даже при частичном выполнении
-            if self.workshop and self.workshop.id == 4:
-                # Завершаем весь заказ
-                self.order.status = 'completed'
-                self.order.save()
-                print(f"Заказ {self.order.id} завершен после частичного выполнения этапа в цеху 4")
-                return True, "Заказ завершен"
-            
-            self._activate_next_stage(completed_qty)
-            # Создаём новый этап-остаток в этом же цехе
-            OrderStage.objects.create(
-                order=self.order,
-                order_item=self.order_item,
-                stage_type=self.stage_type,
-                workshop=self.workshop,
-                operation=self.operation,
-                sequence=self.sequence,
-                plan_quantity=self.plan_quantity - completed_qty,
-                completed_quantity=0,
-                deadline=None,  # Можно задать новый срок
-                status='in_progress',
-                parallel_group=self.parallel_group,
-            )
-        else:
-            # Ничего не сделано — этап остаётся в работе
-            pass
+        from apps.orders.workflow import confirm_stage
         
-        return True, "Этап подтвержден"
+        result = confirm_stage(self.pk, completed_qty)
+        self.refresh_from_db(fields=['completed_quantity', 'status'])
+        return result
     
     def _create_finished_good(self, quantity):
         """Создает запись в finished_goods при завершении упаковки"""
@@ -367,104 +353,23 @@ class OrderStage(models.Model):
         Активирует следующий этап, если он есть, и передаёт туда qty.
         Если следующего этапа нет — создаёт его по workflow.
         """
-        from apps.orders.models import OrderStage
-        
-        # Определяем, к какому потоку относится текущий этап
-        current_parallel_group = self.parallel_group
-        current_order_item = self.order_item
-        
-        # Ищем следующий этап в том же потоке
-        next_seq = self.sequence + 1
-        
-        if current_parallel_group is not None:
-            # Для параллельных потоков ищем следующий этап в той же группе
-            next_stage = OrderStage.objects.filter(
-                order=self.order,
-                order_item=current_order_item,
-                parallel_group=current_parallel_group,
-                sequence=next_seq
-            ).first()
-        else:
-            # Для основного потока ищем следующий этап
-            next_stage = OrderStage.objects.filter(
-                order=self.order,
-                order_item=current_order_item,
-                parallel_group__isnull=True,
-                sequence=next_seq
-            ).first()
+        from django.db import transaction
+        from apps.orders.workflow import activate_next_stage, create_stages
         
-        if next_stage:
-            # Активируем существующий этап
-            next_stage.plan_quantity += qty
-            next_stage.status = 'in_progress'
-            next_stage.save()
-        else:
-            # Создаем новый этап по workflow
-            if current_parallel_group is not None:
-                # Для параллельных потоков (стекло)
-                workflow_steps = [step for step in ORDER_WORKFLOW if step.get("parallel_group") == current_parallel_group]
-            else:
-                # Для основного потока (обычные товары)
-                workflow_steps = [step for step in ORDER_WORKFLOW if step.get("parallel_group") is None]
-            
-            if next_seq - 1 < len(workflow_steps):
-                step = workflow_steps[next_seq - 1]
-                from apps.operations.workshops.models import Workshop
-                try:
-                    workshop = Workshop.objects.get(pk=step["workshop"])
-                    
-                    OrderStage.objects.create(
-                        order=self.order,
-                        order_item=current_order_item,
-                        sequence=next_seq,
-                        stage_type='workshop',
-                        workshop=workshop,
-                        operation=step["operation"],
-                        plan_quantity=qty,
-                        deadline=timezone.now().replace(hour=18, minute=0, second=0, microsecond=0).date(),
-                        status='in_progress',
-                        parallel_group=current_parallel_group,
-                    )
-                except Workshop.DoesNotExist:
-                    print(f"Workshop with ID {step['workshop']} not found, cannot create next stage")
-            else:
-                # Если это последний этап в workflow
-                # Для стеклянного потока (parallel_group=1) — не создаём упаковку, этапы завершаются на цехе 5
-                if current_parallel_group is None:
-                    self._create_packaging_stage(qty)
-                else:
-                    return
+        with transaction.atomic():
+            next_stage = activate_next_stage(self, qty)
+            if next_stage is not None and next_stage.pk is None:
+                create_stages([next_stage])
     
     def _create_packaging_stage(self, qty):
         """
         Создает этап упаковки после завершения всех производственных этапов
         """
-        from apps.orders.models import OrderStage
-        from apps.operations.workshops.models import Workshop
-        
-        # Ищем цех упаковки (обычно это последний цех в списке)
-        try:
-            packaging_workshop = Workshop.objects.filter(name__icontains='упаковк').first()
-            if not packaging_workshop:
-                # Если не нашли цех упаковки, используем цех ID 12 (Упаковка готовой продукции)
-                packaging_workshop = Workshop.objects.get(pk=12)
-        except Workshop.DoesNotExist:
-            print("Packaging workshop not found, skipping packaging stage creation")
-            return
+        from apps.orders.workflow import build_packaging_stage, create_stages
         
-        # Создаем этап упаковки
-        OrderStage.objects.create(
-            order=self.order,
-            order_item=self.order_item,
-            sequence=self.sequence + 1,
-            stage_type='workshop',
-            workshop=packaging_workshop,
-            operation='Упаковка готовой продукции',
-            plan_quantity=qty,
-            deadline=timezone.now().replace(hour=18, minute=0, second=0, microsecond=0).date(),
-            status='in_progress',
-            parallel_group=self.parallel_group,  # Сохраняем группу для отслеживания потока
-        )
+        packaging_stage = build_packaging_stage(self, qty)
+        if packaging_stage is not None:
+            create_stages([packaging_stage])
 
 class OrderDefect(models.Model):
     DEFECT_STATUS_CHOICES = [
@@ -815,14 +720,17 @@ ORDER_WORKFLOW = [
     {"workshop": 11, "operation": WORKSHOP_OPERATIONS[11], "sequence": 10, "parallel_group": 1},
 ]
 
+# Цеха, в которых новый заказ стартует агрегированными этапами (Распил и Пресс)
+ORDER_START_WORKSHOPS = [1, 4]
+
 
 def create_order_stages(order):
-    from apps.operations.workshops.models import Workshop
+    from apps.orders.routing import start_steps
     
     # Получаем все позиции заказа
-    order_items = order.items.all()
+    order_items = list(order.items.select_related('product'))
     
-    if not order_items.exists():
+    if not order_items:
         # Если нет позиций, не создаем этапы
         print(f"Warning: No items found for order {order.id}, skipping stage creation")
         return
@@ -835,86 +743,94 @@ def create_order_stages(order):
     if now.hour >= 18:
         deadline_dt += timedelta(days=1)
     
-    # Создаем этапы для цехов ID1 и ID4 одновременно
-    try:
-        workshop_1 = Workshop.objects.get(pk=1)  # Цех ID 1 (Распил)
-        workshop_4 = Workshop.objects.get(pk=4)  # Цех ID 4 (Пресс)
-        total_qty = sum(item.quantity for item in order_items)
-        
-        # Определяем parallel_group в зависимости от наличия стеклянных товаров
-        parallel_group = 1 if has_glass_items else None
-        
-        # Создаем этап в цехе 1 (Распил)
-        stage_1, created_1 = OrderStage.objects.get_or_create(
+    total_qty = sum(item.quantity for item in order_items)
+    
+    # Определяем parallel_group в зависимости от наличия стеклянных товаров
+    parallel_group = 1 if has_glass_items else None
+    
+    # Создаем этапы во всех стартовых цехах (ID1 и ID4) одновременно
+    steps = start_steps(parallel_group)
+    if any(step.workshop is None for step in steps):
+        print(f"Workshop with ID {' or '.join(str(w) for w in ORDER_START_WORKSHOPS)} not found, skipping stage creation")
+        return
+    
+    for step in steps:
+        # Агрегированный этап для всех товаров
+        stage, created = OrderStage.objects.get_or_create(
             order=order,
-            order_item=None,  # Агрегированный этап для всех товаров
+            order_item=None,
             stage_type='workshop',
-            workshop=workshop_1,
-            sequence=1,
+            workshop=step.workshop,
+            sequence=step.sequence,
             parallel_group=parallel_group,
             defaults={
-                'operation': WORKSHOP_OPERATIONS[1],
+                'operation': step.operation,
                 'plan_quantity': total_qty,
                 'deadline': deadline_dt.date(),
                 'status': 'in_progress',
             }
         )
         
-        if not created_1:
+        if not created:
             # Обновляем плановое количество и статус
-            stage_1.plan_quantity = total_qty
-            stage_1.status = 'in_progress'
-            stage_1.deadline = deadline_dt.date()
-            stage_1.save(update_fields=['plan_quantity', 'status', 'deadline'])
-        
-        # Создаем этап в цехе 4 (Пресс) - для всех товаров
-        stage_4, created_4 = OrderStage.objects.get_or_create(
+            stage.plan_quantity = total_qty
+            stage.status = 'in_progress'
+            stage.deadline = deadline_dt.date()
+            stage.save(update_fields=['plan_quantity', 'status', 'deadline'])
+    
+    print(f"Created/updated stages for order {order.id}: {total_qty} items in workshops {', '.join(str(step.workshop.id) for step in steps)}")
+
+
+def build_initial_stages(order, order_items):
+    """
+    Несохранённые стартовые этапы для нового заказа (без запросов get_or_create).
+    Используется пакетным одобрением заявок: этапы сохраняются одним bulk_create.
+    Возвращает пустой список, если позиций нет или стартовые цеха не найдены.
+    """
+    from apps.orders.routing import start_steps
+    
+    if not order_items:
+        return []
+    
+    has_glass_items = any(item.product and item.product.is_glass for item in order_items)
+    parallel_group = 1 if has_glass_items else None
+    total_qty = sum(item.quantity for item in order_items)
+    
+    now = timezone.now()
+    deadline_dt = now.replace(hour=18, minute=0, second=0, microsecond=0)
+    if now.hour >= 18:
+        deadline_dt += timedelta(days=1)
+    
+    steps = start_steps(parallel_group)
+    if any(step.workshop is None for step in steps):
+        return []
+    
+    return [
+        OrderStage(
             order=order,
             order_item=None,  # Агрегированный этап для всех товаров
             stage_type='workshop',
-            workshop=workshop_4,
-            sequence=1,
+            workshop=step.workshop,
+            sequence=step.sequence,
             parallel_group=parallel_group,
-            defaults={
-                'operation': WORKSHOP_OPERATIONS[4],
-                'plan_quantity': total_qty,
-                'deadline': deadline_dt.date(),
-                'status': 'in_progress',
-            }
+            operation=step.operation,
+            plan_quantity=total_qty,
+            deadline=deadline_dt.date(),
+            status='in_progress',
         )
-        
-        if not created_4:
-            # Обновляем плановое количество и статус
-            stage_4.plan_quantity = total_qty
-            stage_4.status = 'in_progress'
-            stage_4.deadline = deadline_dt.date()
-            stage_4.save(update_fields=['plan_quantity', 'status', 'deadline'])
-        
-        print(f"Created/updated stages for order {order.id}: {total_qty} items in workshop 1, {total_qty} items in workshop 4")
-            
-    except Workshop.DoesNotExist:
-        print("Workshop with ID 1 or 4 not found, skipping stage creation")
+        for step in steps
+    ]
 
 
 def _create_stage_for_order_item(order, order_item):
     """Создает этап для конкретной позиции заказа с учетом типа товара"""
-    from apps.operations.workshops.models import Workshop
-    
-    # Определяем цех в зависимости от типа товара
-    if order_item.product and order_item.product.is_glass:
-        # Для стеклянных: стартуем в цехе 2
-        workshop_id = 2
-        operation = WORKSHOP_OPERATIONS[2]
-        parallel_group = 1
-    else:
-        workshop_id = 1  # Цех для обычных товаров
-        operation = WORKSHOP_OPERATIONS[1]
-        parallel_group = None
-    
-    try:
-        workshop = Workshop.objects.get(pk=workshop_id)
-    except Workshop.DoesNotExist:
-        print(f"Workshop with ID {workshop_id} not found, skipping stage creation")
+    from apps.orders.routing import next_step
+    
+    # Стеклянные позиции идут параллельным потоком (стартуют в цехе 2), остальные — основным (цех 1)
+    parallel_group = 1 if order_item.product and order_item.product.is_glass else None
+    step = next_step(parallel_group, 0)
+    if step is None or step.workshop is None:
+        print(f"First workshop for parallel group {parallel_group} not found, skipping stage creation")
         return
     
     now = timezone.now()
@@ -926,9 +842,9 @@ def _create_stage_for_order_item(order, order_item):
     OrderStage.objects.create(
         order=order,
         order_item=order_item,  # Привязываем к конкретной позиции
-        workshop=workshop,
-        operation=operation,
-        sequence=1,
+        workshop=step.workshop,
+        operation=step.operation,
+        sequence=step.sequence,
         stage_type='workshop',
         plan_quantity=order_item.quantity,  # Количество из позиции заказа
         deadline=deadline_dt.date(),
@@ -0,0 +1,109 @@
+"""
+Маршрутизация этапов заказа по цехам.
+
+ORDER_WORKFLOW компилируется один раз на процесс в таблицу
+(parallel_group, sequence) -> шаг, а строки Workshop кэшируются в памяти
+процесса (сбрасываются сигналами post_save/post_delete Workshop из
+orders.signals и, на всякий случай, по TTL). Все пути создания этапов
+получают цех и операцию через next_step()/start_steps(), без запросов
+Workshop.objects.get(pk=...) на каждый переход.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.db import transaction
+
+from .models import ORDER_START_WORKSHOPS, ORDER_WORKFLOW, WORKSHOP_OPERATIONS
+
+RouteStep = namedtuple('RouteStep', ['workshop', 'operation', 'sequence', 'parallel_group'])
+
+PACKAGING_OPERATION = 'Упаковка готовой продукции'
+PACKAGING_WORKSHOP_ID = 12
+
+
+class WorkflowRegistry:
+    """Скомпилированная таблица шагов workflow"""
+
+    def __init__(self, workflow):
+        self.steps = {}
+        for step in workflow:
+            self.steps[(step.get('parallel_group'), step['sequence'])] = step
+
+    def get(self, parallel_group, sequence):
+        return self.steps.get((parallel_group, sequence))
+
+    def __len__(self):
+        return len(self.steps)
+
+
+class WorkshopCache:
+    """Кэш цехов в памяти процесса: одна выборка всех цехов вместо запроса на каждый переход"""
+
+    ttl = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workshops = None
+        self._loaded_at = 0
+
+    def _load(self):
+        from apps.operations.workshops.models import Workshop
+        with self._lock:
+            if self._workshops is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._workshops = Workshop.objects.in_bulk()
+                self._loaded_at = time.monotonic()
+            return self._workshops
+
+    def get(self, workshop_id):
+        workshop = self._load().get(workshop_id)
+        if workshop is None:
+            # Цех мог появиться в другом процессе — перечитываем один раз
+            self.clear()
+            workshop = self._load().get(workshop_id)
+        return workshop
+
+    def packaging(self):
+        """Цех упаковки: по названию, иначе цех ID 12 (Упаковка готовой продукции)"""
+        workshops = self._load()
+        for workshop in sorted(workshops.values(), key=lambda w: w.pk):
+            if 'упаковк' in (workshop.name or '').lower():
+                return workshop
+        return workshops.get(PACKAGING_WORKSHOP_ID)
+
+    def clear(self):
+        with self._lock:
+            self._workshops = None
+
+
+registry = WorkflowRegistry(ORDER_WORKFLOW)
+workshop_cache = WorkshopCache()
+
+
+def invalidate_workshop_cache():
+    """Сбрасывает кэш цехов сейчас и после коммита текущей транзакции"""
+    workshop_cache.clear()
+    transaction.on_commit(workshop_cache.clear)
+
+
+def next_step(parallel_group, sequence):
+    """
+    Шаг, следующий за sequence в потоке parallel_group (sequence=0 — первый шаг).
+    После последнего шага основного потока возвращает упаковку; для
+    стеклянного потока — None. Если цех шага не найден, workshop будет None.
+    """
+    next_seq = sequence + 1
+    step = registry.get(parallel_group, next_seq)
+    if step:
+        return RouteStep(workshop_cache.get(step['workshop']), step['operation'], next_seq, parallel_group)
+    if parallel_group is not None or sequence == 0:
+        return None
+    return RouteStep(workshop_cache.packaging(), PACKAGING_OPERATION, next_seq, parallel_group)
+
+
+def start_steps(parallel_group):
+    """Стартовые агрегированные этапы нового заказа (цеха ORDER_START_WORKSHOPS)"""
+    return [
+        RouteStep(workshop_cache.get(workshop_id), WORKSHOP_OPERATIONS[workshop_id], 1, parallel_group)
+        for workshop_id in ORDER_START_WORKSHOPS
+    ]
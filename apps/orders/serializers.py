@@ -408,4 +408,87 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 class OrderStageConfirmSerializer(serializers.Serializer):
-    completed_quantity = serializers.IntegerField(min_value=0) 
\ No newline at end of file
+    completed_quantity = serializers.IntegerField(min_value=0) 
+
+class OrderBoardSerializer(serializers.ModelSerializer):
+    """
+    Облегчённое представление заказа для доски мастера.
+    Ожидает queryset из OrderViewSet.get_board_queryset(): активные этапы
+    предзагружены в board_stages, позиции — в board_items, а has_glass
+    и regular_quantity посчитаны аннотациями, поэтому сериализация
+    не делает дополнительных запросов.
+    """
+    client = serializers.SerializerMethodField()
+    status_display = serializers.CharField(read_only=True)
+    total_quantity = serializers.SerializerMethodField()
+    has_glass_items = serializers.BooleanField(source='has_glass', read_only=True)
+    has_regular_items = serializers.SerializerMethodField()
+    workshops_info = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'name', 'client', 'status', 'status_display', 'comment', 'created_at',
+            'total_quantity', 'has_glass_items', 'has_regular_items', 'workshops_info'
+        ]
+
+    def get_client(self, obj):
+        if not obj.client:
+            return None
+        return {'id': obj.client.id, 'name': _safe_str(obj.client.name)}
+
+    def get_total_quantity(self, obj):
+        items_sum = sum((it.quantity or 0) for it in obj.board_items)
+        return items_sum if items_sum > 0 else (obj.quantity or 0)
+
+    def get_has_regular_items(self, obj):
+        return [
+            {
+                'id': it.id,
+                'quantity': it.quantity,
+                'size': _safe_str(it.size),
+                'color': _safe_str(it.color),
+                'product': {'id': it.product.id, 'name': _safe_str(it.product.name)},
+            }
+            for it in obj.board_items
+            if it.product and not it.product.is_glass
+        ]
+
+    def get_workshops_info(self, obj):
+        return build_workshops_info(obj.board_stages, obj.regular_quantity or 0)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for key in ['name', 'comment']:
+            if key in data:
+                data[key] = _safe_str(data.get(key))
+        return data
+
+
+def build_workshops_info(stages, regular_quantity):
+    """
+    Группирует активные этапы заказа по цехам.
+    Для цехов с ID >= 6 стеклянные позиции не учитываются, а агрегированный
+    этап получает суммарное количество нестеклянных позиций (regular_quantity).
+    """
+    workshops_info = {}
+    for stage in stages:
+        if stage.workshop_id and stage.workshop_id >= 6:
+            if stage.order_item is None:
+                quantity = regular_quantity
+            elif stage.order_item.product and stage.order_item.product.is_glass:
+                continue
+            else:
+                quantity = stage.plan_quantity
+        else:
+            quantity = stage.plan_quantity
+
+        workshop_name = stage.workshop.name if stage.workshop else 'Не указан'
+        if workshop_name not in workshops_info:
+            workshops_info[workshop_name] = {
+                'type': 'Стеклянные товары' if stage.parallel_group == 1 else 'Обычные товары',
+                'quantity': 0,
+                'operation': stage.operation,
+            }
+        workshops_info[workshop_name]['quantity'] += quantity
+    return workshops_info
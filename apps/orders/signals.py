@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from apps.orders.models import OrderStage
 from apps.notifications.models import Notification
+from apps.operations.workshops.models import Workshop
+from apps.orders.routing import invalidate_workshop_cache
 
 
 @receiver(post_save, sender=OrderStage)
@@ -47,4 +49,11 @@ def notify_masters_on_new_stage(sender, instance: OrderStage, created: bool, **k
 			)
 		except Exception:
 			# Silently ignore failures to avoid breaking order flow
-			continue 
\ No newline at end of file
+			continue
+
+
+@receiver(post_save, sender=Workshop)
+@receiver(post_delete, sender=Workshop)
+def reset_workshop_cache(sender, instance, **kwargs):
+	# Кэш цехов маршрутизации этапов должен видеть новые/изменённые цеха
+	invalidate_workshop_cache()
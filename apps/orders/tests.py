@@ -1,3 +1,441 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.clients.models import Client
+from apps.operations.workshops.models import Workshop
+from apps.products.models import Product
+from apps.users.models import User
+from .models import Order, OrderDefect, OrderItem, OrderStage
+
+
+class OrderBoardQueryCountTest(TestCase):
+    """Доска цехов (OrderViewSet.by_workshop) не должна делать запросов на каждый заказ"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='master', password='testpass123')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(self.user)
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.workshop_1 = Workshop.objects.create(name='Распиловка')
+        self.workshop_7 = Workshop.objects.create(name='Покраска')
+        # Цех с ID >= 6 для проверки фильтрации стекла
+        Workshop.objects.filter(pk=self.workshop_7.pk).update(id=7)
+        self.workshop_7 = Workshop.objects.get(pk=7)
+        self.door = Product.objects.create(name='Дверь', is_glass=False)
+        self.glass = Product.objects.create(name='Стекло', is_glass=True)
+
+    def _create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(name=f'Заказ {i}', client=self.client_obj)
+            OrderItem.objects.create(order=order, product=self.door, quantity=3)
+            glass_item = OrderItem.objects.create(order=order, product=self.glass, quantity=2)
+            OrderStage.objects.create(
+                order=order, workshop=self.workshop_1, operation='Распил',
+                sequence=1, plan_quantity=5, status='in_progress',
+            )
+            OrderStage.objects.create(
+                order=order, workshop=self.workshop_7, operation='Покраска',
+                sequence=2, plan_quantity=5, status='in_progress',
+            )
+            OrderStage.objects.create(
+                order=order, order_item=glass_item, workshop=self.workshop_7, operation='Покраска',
+                sequence=2, plan_quantity=2, status='partial', parallel_group=1,
+            )
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client_api.get(reverse('orders:api-orders-by-workshop'), {'workshop_id': 7})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_does_not_depend_on_orders(self):
+        self._create_orders(2)
+        queries_small, _ = self._count_queries()
+        self._create_orders(8)
+        queries_large, data = self._count_queries()
+        self.assertEqual(queries_small, queries_large)
+        self.assertEqual(data['count'], 10)
+
+    def test_workshops_info_skips_glass_for_late_workshops(self):
+        self._create_orders(1)
+        _, data = self._count_queries()
+        order_data = data['results'][0]
+        self.assertTrue(order_data['has_glass_items'])
+        self.assertEqual(order_data['total_quantity'], 5)
+        self.assertEqual(len(order_data['has_regular_items']), 1)
+        # Агрегированный этап в цехе 7 учитывает только нестеклянные позиции
+        self.assertEqual(order_data['workshops_info']['Покраска']['quantity'], 3)
+        self.assertEqual(order_data['workshops_info']['Распиловка']['quantity'], 5)
+
+
+class OrderStageProgressCountersTest(TestCase):
+    """Денормализованные счётчики этапа обновляются из сигналов EmployeeTask"""
+
+    def setUp(self):
+        from apps.employee_tasks.models import EmployeeTask
+        self.EmployeeTask = EmployeeTask
+        self.employee = User.objects.create_user(username='worker', password='testpass123')
+        client = Client.objects.create(name='Клиент')
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.order = Order.objects.create(name='Заказ', client=client)
+        self.stage = OrderStage.objects.create(
+            order=self.order, workshop=self.workshop, operation='Распил',
+            sequence=1, plan_quantity=10,
+        )
+        self.other_stage = OrderStage.objects.create(
+            order=self.order, workshop=self.workshop, operation='Распил',
+            sequence=1, plan_quantity=10, parallel_group=1,
+        )
+
+    def _counters(self, stage):
+        stage.refresh_from_db()
+        return stage.tasks_assigned_quantity, stage.tasks_completed_quantity, stage.tasks_defective_quantity
+
+    def test_counters_follow_task_lifecycle(self):
+        task = self.EmployeeTask.objects.create(stage=self.stage, employee=self.employee, quantity=6)
+        other = self.EmployeeTask.objects.create(stage=self.stage, employee=self.employee, quantity=2)
+        self.assertEqual(self._counters(self.stage), (8, 0, 0))
+
+        task.completed_quantity = 4
+        task.defective_quantity = 1
+        task.save()
+        self.assertEqual(self._counters(self.stage), (8, 4, 1))
+        self.assertEqual(self.stage.waiting_for_master, 2)
+        self.assertEqual(self.stage.done_count, 4)
+        self.assertEqual(self.order.total_done_count, 4)
+
+        task.stage = self.other_stage
+        task.save()
+        self.assertEqual(self._counters(self.stage), (2, 0, 0))
+        self.assertEqual(self._counters(self.other_stage), (6, 4, 1))
+
+        other.delete()
+        self.assertEqual(self._counters(self.stage), (0, 0, 0))
+        self.assertEqual(OrderStage.check_progress_counters(), [])
+
+    def test_rebuild_and_check(self):
+        self.EmployeeTask.objects.create(stage=self.stage, employee=self.employee, quantity=5, completed_quantity=3)
+        OrderStage.objects.filter(pk=self.stage.pk).update(tasks_assigned_quantity=0, tasks_completed_quantity=0)
+
+        mismatches = OrderStage.check_progress_counters()
+        self.assertEqual([row['id'] for row in mismatches], [self.stage.pk])
+
+        OrderStage.rebuild_progress_counters()
+        self.assertEqual(self._counters(self.stage), (5, 3, 0))
+        self.assertEqual(OrderStage.check_progress_counters(), [])
+
+
+class StageWorkflowEngineTest(TestCase):
+    """Переходы этапов через apps.orders.workflow сохраняют количество"""
+
+    def setUp(self):
+        client = Client.objects.create(name='Клиент')
+        self.order = Order.objects.create(name='Заказ', client=client)
+        self.cutting = Workshop.objects.create(name='Распиловка')
+        self.packaging = Workshop.objects.create(name='Цех упаковки')
+
+    def test_partial_confirm_moves_done_part_and_keeps_remainder(self):
+        stage = OrderStage.objects.create(
+            order=self.order, workshop=self.cutting, operation='Распил', sequence=1, plan_quantity=10,
+        )
+        ok, _ = stage.confirm_stage(4)
+        self.assertTrue(ok)
+        self.assertEqual(stage.status, 'partial')
+
+        packaging_stage = OrderStage.objects.get(order=self.order, sequence=2)
+        self.assertEqual(packaging_stage.workshop, self.packaging)
+        self.assertEqual(packaging_stage.plan_quantity, 4)
+        remainder = OrderStage.objects.get(order=self.order, sequence=1, status='in_progress')
+        self.assertEqual(remainder.plan_quantity, 6)
+
+        # Повторное подтверждение того же этапа не должно передавать количество ещё раз
+        ok, _ = stage.confirm_stage(4)
+        self.assertFalse(ok)
+        remainder.confirm_stage(6)
+        packaging_stage.refresh_from_db()
+        self.assertEqual(packaging_stage.plan_quantity, 10)
+
+    def test_sibling_confirmations_lock_order_before_creating_next_stage(self):
+        from . import workflow
+        siblings = [
+            OrderStage.objects.create(
+                order=self.order, workshop=self.cutting, operation='Распил', sequence=1, plan_quantity=qty,
+            )
+            for qty in (4, 6)
+        ]
+        calls = []
+        lock_order = Order.objects.select_for_update
+        activate_next_stage = workflow.activate_next_stage
+
+        def locked(*args, **kwargs):
+            calls.append('order')
+            return lock_order(*args, **kwargs)
+
+        def activated(*args, **kwargs):
+            calls.append('next')
+            return activate_next_stage(*args, **kwargs)
+
+        with mock.patch.object(Order.objects, 'select_for_update', side_effect=locked), \
+                mock.patch.object(workflow, 'activate_next_stage', side_effect=activated):
+            for stage in siblings:
+                self.assertTrue(workflow.confirm_stage(stage.pk, stage.plan_quantity)[0])
+
+        # Следующий этап ищется и создаётся только под блокировкой заказа
+        self.assertEqual(calls, ['order', 'next', 'order', 'next'])
+        next_stage = OrderStage.objects.get(order=self.order, sequence=2)
+        self.assertEqual(next_stage.plan_quantity, 10)
+
+
+
+class WorkflowRoutingTest(TestCase):
+    """Скомпилированный ORDER_WORKFLOW и кэш цехов маршрутизации"""
+
+    def setUp(self):
+        for pk, name in [(1, 'Распиловка'), (2, 'ЧПУ'), (3, 'Заготовка'), (12, 'Цех упаковки')]:
+            Workshop.objects.create(pk=pk, name=name)
+
+    def test_registry_matches_order_workflow(self):
+        from .models import ORDER_WORKFLOW
+        from .routing import registry
+        self.assertEqual(len(registry), len(ORDER_WORKFLOW))
+        self.assertEqual(registry.get(1, 2)['workshop'], 3)
+        self.assertIsNone(registry.get(None, 2))
+
+    def test_next_step_uses_cached_workshops(self):
+        from .routing import next_step
+        next_step(1, 0)
+        with self.assertNumQueries(0):
+            first_glass = next_step(1, 0)
+            second_glass = next_step(1, 1)
+            packaging = next_step(None, 1)
+            last_glass = next_step(1, 10)
+        self.assertEqual(first_glass.workshop.pk, 2)
+        self.assertEqual(second_glass.workshop.pk, 3)
+        self.assertEqual(packaging.workshop.pk, 12)
+        self.assertEqual(packaging.sequence, 2)
+        self.assertIsNone(last_glass)
+
+    def test_workshop_save_invalidates_cache(self):
+        from .routing import next_step
+        self.assertEqual(next_step(None, 0).workshop.name, 'Распиловка')
+        workshop = Workshop.objects.get(pk=1)
+        workshop.name = 'Распил'
+        workshop.save()
+        self.assertEqual(next_step(None, 0).workshop.name, 'Распил')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StageWorkflowConcurrencyTest(TransactionTestCase):
+    """Параллельные подтверждения одного заказа не теряют и не дублируют количество"""
+
+    stages_count = 10
+    stage_quantity = 10
+
+    def setUp(self):
+        client = Client.objects.create(name='Клиент')
+        self.order = Order.objects.create(name='Заказ', client=client)
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.stages = [
+            OrderStage.objects.create(
+                order=self.order, workshop=self.workshop, operation='Распил',
+                sequence=1, plan_quantity=self.stage_quantity,
+            )
+            for _ in range(self.stages_count)
+        ]
+        self.next_stage = OrderStage.objects.create(
+            order=self.order, workshop=self.workshop, operation='Распил',
+            sequence=2, plan_quantity=0, status='waiting', parallel_group=None,
+            comment='next',
+        )
+
+    def test_parallel_confirmations_conserve_quantity(self):
+        from .workflow import confirm_stage
+
+        results = []
+        errors = []
+
+        def worker(stage_id):
+            try:
+                results.append(confirm_stage(stage_id, self.stage_quantity)[0])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        # Каждый этап подтверждают два мастера одновременно
+        threads = [
+            threading.Thread(target=worker, args=(stage.pk,))
+            for stage in self.stages for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(results.count(True), self.stages_count)
+        self.next_stage.refresh_from_db()
+        self.assertEqual(self.next_stage.plan_quantity, self.stages_count * self.stage_quantity)
+        self.assertFalse(
+            OrderStage.objects.filter(pk__in=[s.pk for s in self.stages]).exclude(status='done').exists()
+        )
+
+    def test_parallel_confirmations_create_one_next_stage(self):
+        from .workflow import confirm_stage
+
+        # Следующего этапа нет — его (упаковку) создаёт первое подтверждение
+        self.next_stage.delete()
+        Workshop.objects.create(name='Цех упаковки')
+        errors = []
+
+        def worker(stage_id):
+            try:
+                confirm_stage(stage_id, self.stage_quantity)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(stage.pk,)) for stage in self.stages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        next_stages = OrderStage.objects.filter(order=self.order, sequence=2)
+        self.assertEqual(next_stages.count(), 1)
+        self.assertEqual(next_stages.get().plan_quantity, self.stages_count * self.stage_quantity)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RequestsExcelExportTest(TestCase):
+    """Экспорт заявок в Excel через фоновую выгрузку (apps.exports)"""
+
+    def setUp(self):
+        from apps.finance.models import Request, RequestItem
+        self.user = User.objects.create_user(username='accountant', password='testpass123')
+        self.client.force_login(self.user)
+        self.client_obj = Client.objects.create(name='Клиент', company='ООО Тест')
+        for pk, name in [(1, 'Распиловка'), (2, 'ЧПУ'), (4, 'Пресс')]:
+            Workshop.objects.create(pk=pk, name=name)
+        door = Product.objects.create(name='Дверь')
+        self.requests = []
+        for i in range(3):
+            req = Request.objects.create(name=f'Заявка {i}', client=self.client_obj, total_amount=100)
+            RequestItem.objects.create(request=req, product=door, quantity=2, size='80-200')
+            RequestItem.objects.create(request=req, product=door, quantity=3)
+            self.requests.append(req)
+
+    def _load(self, url):
+        import io
+        from openpyxl import load_workbook
+        from apps.exports.tasks import run_export_job
+        with mock.patch('core.celery.app.send_task', side_effect=lambda name, args: run_export_job(*args)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_export_all_requests(self):
+        wb = self._load(reverse('orders:export_requests_excel'))
+        self.assertEqual(len(wb.worksheets), 3)
+        ws = wb[f'Заявка {self.requests[0].id}']
+        self.assertIn('A1:E1', [str(r) for r in ws.merged_cells.ranges])
+        self.assertEqual(ws['B3'].value, 'Клиент')
+        self.assertEqual(ws['B8'].value, 'Дверь')
+        self.assertEqual(ws['D10'].value, '5шт')
+        self.assertTrue(ws['A7'].font.bold)
+        self.assertEqual(ws['B15'].value, 'Ожидает')
+
+    def test_export_client_requests(self):
+        wb = self._load(reverse('orders:export_requests_excel_for_client', args=[self.client_obj.id]))
+        ws = wb[f'Заявка {self.requests[0].id}']
+        # Распил: первая строка позиции — x2 и +1 к размеру
+        self.assertEqual([ws.cell(row=3, column=c).value for c in range(1, 6)], [1, 'Распиловка', 'Дверь', '81-201', 4])
+        # 2 позиции x 3 строки распила + 2 позиции x 2 строки пресса, затем итог
+        self.assertEqual(ws.cell(row=3 + 6, column=2).value, 'Пресс')
+        self.assertEqual(ws.cell(row=3 + 10, column=1).value, 'общий')
+        self.assertEqual(ws.cell(row=3 + 10, column=7).value, '5шт')
+
+
+class RevenueChartTest(TestCase):
+    """График выручки: группировка одним запросом на метрику и кэш закрытых дней"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='director', password='testpass123')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(self.user)
+        self.client_obj = Client.objects.create(name='Клиент')
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.door = Product.objects.create(name='Дверь', price=100)
+        self.today = timezone.localdate()
+        self._order(self.today, quantity=2)
+        self._order(self.today - timedelta(days=2), quantity=3)
+        self._order(self.today - timedelta(days=2), quantity=1)
+        self.url = reverse('orders:dashboard-revenue-chart')
+
+    def _order(self, day, quantity):
+        order = Order.objects.create(name='Заказ', client=self.client_obj)
+        OrderItem.objects.create(order=order, product=self.door, quantity=quantity)
+        created = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=12)))
+        Order.objects.filter(pk=order.pk).update(created_at=created)
+        OrderDefect.objects.create(order=order, workshop=self.workshop, quantity=1)
+        OrderDefect.objects.filter(order=order).update(date=created)
+        return order
+
+    def test_daily_series_with_gaps(self):
+        from .charts import revenue_chart
+        with self.assertNumQueries(4):
+            revenue_chart('week')
+        data = self.client_api.get(self.url, {'period': 'week'}).data
+        self.assertEqual(len(data['labels']), 7)
+        self.assertEqual(data['labels'][-1], self.today.strftime('%d.%m'))
+        self.assertEqual(data['orders_count'], [0, 0, 0, 0, 2, 0, 1])
+        self.assertEqual(data['sales'], [0, 0, 0, 0, 4, 0, 2])
+        self.assertEqual([int(v) for v in data['revenue']], [0, 0, 0, 0, 400, 0, 200])
+        self.assertEqual(data['defects'], [0, 0, 0, 0, 2, 0, 1])
+
+    def test_closed_days_are_cached(self):
+        from .charts import revenue_chart
+        revenue_chart('month')
+        self._order(self.today - timedelta(days=2), quantity=5)
+        self._order(self.today, quantity=5)
+        # Пересчитывается только сегодняшний день
+        with self.assertNumQueries(4):
+            data = revenue_chart('month')
+        self.assertEqual(data['sales'][-3], 4)
+        self.assertEqual(data['sales'][-1], 7)
+
+    def test_editing_past_day_invalidates_its_cache(self):
+        from .charts import revenue_chart
+        past_order = Order.objects.filter(created_at__date__lt=self.today).first()
+        revenue_chart('month')
+        item = past_order.items.get()
+        item.quantity += 10
+        item.save()
+        OrderDefect.objects.filter(order=past_order).get().delete()
+        data = revenue_chart('month')
+        self.assertEqual(data['sales'][-3], 14)
+        self.assertEqual(data['defects'][-3], 1)
+
+    def test_month_granularity(self):
+        data = self.client_api.get(self.url, {'period': 'year', 'granularity': 'month'}).data
+        self.assertEqual(data['granularity'], 'month')
+        self.assertEqual(data['labels'][-1], self.today.strftime('%m.%Y'))
+        self.assertEqual(sum(data['orders_count']), 3)
+        self.assertLessEqual(len(data['labels']), 13)
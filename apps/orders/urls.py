@@ -3,7 +3,7 @@ from .views import OrderViewSet, OrderPageView, OrderCreateAPIView, OrderStageCo
 from .api import WorkshopStagesView, StageDetailView
 from django.urls import path, include
 from django.views.generic import TemplateView, RedirectView
-from .views import AdminRequestsView, AdminClientRequestsView, ApproveRequestAPIView, ExportRequestsExcelView, ExportRequestsExcelForClientView
+from .views import AdminRequestsView, AdminClientRequestsView, ApproveRequestAPIView, ApproveRequestsBulkAPIView, ExportRequestsExcelView, ExportRequestsExcelForClientView
 
 app_name = 'orders'
 
@@ -23,6 +23,12 @@ urlpatterns = [
     path('plans/master/', PlansMasterView.as_view(), name='plans-master'),
     path('plans/master/<int:stage_id>/', PlansMasterDetailView.as_view(), name='plans-master-detail'),
     
+    # Доска цехов: активные заказы с разбивкой по цехам
+    path('api/orders/by-workshop/', OrderViewSet.as_view({'get': 'by_workshop'}), name='api-orders-by-workshop'),
+    
+    # Дашборд: график выручки
+    path('dashboard/revenue-chart/', DashboardRevenueChartAPIView.as_view(), name='dashboard-revenue-chart'),
+    
     # API для планов мастера и этапов
     path('api/stages/', WorkshopStagesView.as_view(), name='api-stages-list'),
     path('api/stages/<int:stage_id>/', StageDetailView.as_view(), name='api-stages-detail'),
@@ -32,6 +38,7 @@ urlpatterns = [
     
     # API для одобрения заявок
     path('api/requests/approve/<int:request_id>/', ApproveRequestAPIView.as_view(), name='approve-request'),
+    path('api/requests/approve/bulk/', ApproveRequestsBulkAPIView.as_view(), name='approve-requests-bulk'),
     path('export/excel/', ExportRequestsExcelView.as_view(), name='export_requests_excel'),
     path('export/excel/client/<int:client_id>/', ExportRequestsExcelForClientView.as_view(), name='export_requests_excel_for_client'),
 ] 
\ No newline at end of file
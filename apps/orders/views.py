@@ -6,18 +6,16 @@ from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, F, Q, Max
+from django.db.models import Sum, Count, F, Q, Max, Exists, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
 from django.db import models
 from django.utils import timezone
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
 from .models import Order, OrderItem, OrderStage, OrderDefect
-from .serializers import OrderSerializer, OrderItemSerializer, OrderStageConfirmSerializer, OrderStageSerializer
+from .serializers import OrderSerializer, OrderItemSerializer, OrderStageConfirmSerializer, OrderStageSerializer, OrderBoardSerializer
 from apps.employee_tasks.models import EmployeeTask
 from apps.employees.models import User
 
@@ -28,69 +26,59 @@ class OrderViewSet(viewsets.ModelViewSet):
 	serializer_class = OrderSerializer
 	permission_classes = [permissions.IsAuthenticated]
 	
+	def get_board_queryset(self, workshop_id=None):
+		"""
+		Queryset доски цехов: заказы с активными этапами.
+		Всё, что нужно OrderBoardSerializer, посчитано аннотациями (has_glass,
+		regular_quantity) или предзагружено (board_stages, board_items), поэтому
+		число запросов не зависит от количества заказов.
+		"""
+		active_statuses = ['in_progress', 'partial']
+		active_stages = OrderStage.objects.filter(order=OuterRef('pk'), status__in=active_statuses)
+		if workshop_id:
+			active_stages = active_stages.filter(workshop_id=workshop_id)
+			if workshop_id >= 6:
+				# Для цехов с ID >= 6 интересуют только нестеклянные и агрегированные этапы
+				active_stages = active_stages.filter(
+					Q(order_item__isnull=True) | Q(order_item__product__is_glass=False)
+				)
+
+		regular_quantity = OrderItem.objects.filter(
+			order=OuterRef('pk'), product__is_glass=False
+		).values('order').annotate(total=Sum('quantity')).values('total')
+
+		return Order.objects.filter(
+			Exists(active_stages)
+		).select_related('client').annotate(
+			has_glass=Exists(OrderItem.objects.filter(order=OuterRef('pk'), product__is_glass=True)),
+			regular_quantity=Coalesce(Subquery(regular_quantity), 0),
+		).prefetch_related(
+			Prefetch(
+				'stages',
+				queryset=OrderStage.objects.filter(status__in=active_statuses).select_related('workshop', 'order_item__product').order_by('id'),
+				to_attr='board_stages',
+			),
+			Prefetch(
+				'items',
+				queryset=OrderItem.objects.select_related('product').order_by('id'),
+				to_attr='board_items',
+			),
+		).order_by('-created_at', '-id')
+
 	@action(detail=False, methods=['get'])
 	def by_workshop(self, request):
-		"""Получает заказы с разделением по цехам"""
+		"""Получает заказы с разделением по цехам (доска мастера, постранично)"""
 		workshop_id = request.query_params.get('workshop_id')
-		
-		queryset = Order.objects.filter(
-			stages__status__in=['in_progress', 'partial']
-		).distinct().order_by('-created_at')
-		
-		if workshop_id:
-			workshop_id_int = int(workshop_id)
-			queryset = queryset.filter(
-				stages__workshop_id=workshop_id
-			)
-			if workshop_id_int >= 6:
-				queryset = queryset.filter(
-					Q(stages__order_item__product__is_glass=False) | Q(stages__order_item__isnull=True)
-				)
-			queryset = queryset.distinct().order_by('-created_at')
-		
-		# Добавляем информацию о цехах
-		orders_data = []
-		for order in queryset:
-			order_data = OrderSerializer(order).data
-			
-			# Добавляем информацию о цехах
-			workshops_info = {}
-			stages_query = order.stages.filter(status__in=['in_progress', 'partial'])
-			for stage in stages_query:
-				if stage.workshop and stage.workshop.id >= 6:
-					# Для цехов с ID >= 6 учитываем только товары с is_glass=False
-					if stage.order_item and stage.order_item.product.is_glass:
-						continue  # Пропускаем стеклянные товары
-					elif stage.order_item is None:  # aggregated
-						# Для агрегированных этапов суммируем только нестеклянные товары
-						quantity = sum(it.quantity for it in order.items.filter(product__is_glass=False))
-					else:
-						# Для обычных этапов проверяем, что товар не стеклянный
-						if not stage.order_item.product.is_glass:
-							quantity = stage.plan_quantity
-						else:
-							continue  # Пропускаем стеклянные товары
-				else:
-					quantity = stage.plan_quantity
-				
-				workshop_name = stage.workshop.name if stage.workshop else 'Не указан'
-				workshop_type = 'Стеклянные товары' if stage.parallel_group == 1 else 'Обычные товары'
-				
-				if workshop_name not in workshops_info:
-					workshops_info[workshop_name] = {
-						'type': workshop_type,
-						'quantity': 0,
-						'operation': stage.operation
-					}
-				workshops_info[workshop_name]['quantity'] += quantity
-			
-			order_data['workshops_info'] = workshops_info
-			order_data['has_glass_items'] = order.has_glass_items
-			order_data['has_regular_items'] = order.regular_items
-			
-			orders_data.append(order_data)
-		
-		return Response(orders_data)
+		try:
+			workshop_id = int(workshop_id) if workshop_id else None
+		except (TypeError, ValueError):
+			return Response({'error': 'Некорректный workshop_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+		queryset = self.get_board_queryset(workshop_id)
+		page = self.paginate_queryset(queryset)
+		if page is not None:
+			return self.get_paginated_response(OrderBoardSerializer(page, many=True).data)
+		return Response(OrderBoardSerializer(queryset, many=True).data)
 	
 	def update(self, request, *args, **kwargs):
 		instance = self.get_object()
@@ -490,14 +478,17 @@ class OrderStageNoTransferAPIView(APIView):
 class DashboardOverviewAPIView(APIView):
 	permission_classes = [permissions.IsAuthenticated]
 	def get(self, request):
-		# Доход — сумма (цена продукта * количество) по всем позициям заявок
-		total_income = OrderItem.objects.aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-		# Продажи — сумма quantity по всем позициям
-		product_sales = OrderItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
-		# Брак — сумма quantity по всем OrderDefect + сумма defective_quantity по всем EmployeeTask
-		order_defects_total = OrderDefect.objects.aggregate(total=Sum('quantity'))['total'] or 0
-		employee_tasks_defects_total = EmployeeTask.objects.aggregate(total=Sum('defective_quantity'))['total'] or 0
-		defective_products = order_defects_total + employee_tasks_defects_total
+		# Доход, продажи и брак (OrderDefect + defective_quantity задач) — из дневной сводки
+		from apps.odashboard.models import DailyProductionFact
+		totals = DailyProductionFact.objects.aggregate(
+			revenue=Sum('revenue'),
+			sales=Sum('sales_quantity'),
+			order_defects=Sum('order_defects_quantity'),
+			task_defects=Sum('defective_quantity'),
+		)
+		total_income = totals['revenue'] or 0
+		product_sales = totals['sales'] or 0
+		defective_products = (totals['order_defects'] or 0) + (totals['task_defects'] or 0)
 		# Сотрудники — всего
 		total_employees = User.objects.count()
 		return Response({
@@ -509,45 +500,13 @@ class DashboardOverviewAPIView(APIView):
 		})
 
 class DashboardRevenueChartAPIView(APIView):
+	"""График выручки: ?period=week|month|year, ?granularity=day|week|month (см. apps.orders.charts)"""
 	permission_classes = [permissions.IsAuthenticated]
 	def get(self, request):
+		from .charts import revenue_chart
 		period = request.GET.get('period', 'week')
-		now = timezone.now()
-		if period == 'month':
-			days = 30
-		elif period == 'year':
-			days = 365
-		else:
-			days = 7
-		labels = []
-		revenue = []
-		defects = []
-		orders_count = []
-		sales = []
-		for i in range(days):
-			day = now - timezone.timedelta(days=days - i - 1)
-			day_orders = Order.objects.filter(created_at__date=day.date())
-			# Доход за день — по позициям, относящимся к заказам этого дня
-			day_income = OrderItem.objects.filter(order__in=day_orders).aggregate(total=Sum(F('product__price') * F('quantity')))['total'] or 0
-			# Брак: сумма из OrderDefect + сумма defective_quantity из EmployeeTask за этот день
-			day_order_defects = OrderDefect.objects.filter(date__date=day.date()).aggregate(total=Sum('quantity'))['total'] or 0
-			day_employee_defects = EmployeeTask.objects.filter(created_at__date=day.date()).aggregate(total=Sum('defective_quantity'))['total'] or 0
-			day_defects = day_order_defects + day_employee_defects
-			day_orders_num = day_orders.count()
-			# Продажи — сумма quantities по позициям заказов этого дня
-			day_sales = OrderItem.objects.filter(order__in=day_orders).aggregate(total=Sum('quantity'))['total'] or 0
-			labels.append(day.strftime('%d.%m'))
-			revenue.append(day_income)
-			defects.append(day_defects)
-			orders_count.append(day_orders_num)
-			sales.append(day_sales)
-		return Response({
-			'labels': labels,
-			'revenue': revenue,
-			'defects': defects,
-			'orders_count': orders_count,
-			'sales': sales
-		})
+		granularity = request.GET.get('granularity', 'day')
+		return Response(revenue_chart(period, granularity))
 
 class StageViewSet(viewsets.ReadOnlyModelViewSet):
 	queryset = OrderStage.objects.select_related(
@@ -720,408 +679,43 @@ class ApproveRequestAPIView(APIView):
 			}, status=500)
 
 
-@method_decorator(login_required, name='dispatch')
-class ExportRequestsExcelView(View):
-	"""Экспорт заявок в Excel файл"""
-	def get(self, request):
+class ApproveRequestsBulkAPIView(APIView):
+	"""API для пакетного одобрения заявок: {"request_ids": [1, 2, ...]}"""
+	permission_classes = [permissions.IsAuthenticated]
+	
+	def post(self, request):
 		from apps.finance.models import Request
-		from apps.clients.models import Client
 		
-		# Получаем все заявки с детальной информацией
-		requests = Request.objects.select_related('client').prefetch_related('items__product').all().order_by('-created_at')
-		
-		# Создаем Excel файл
-		wb = Workbook()
-		
-		# Удаляем дефолтный лист
-		wb.remove(wb.active)
-		
-		# Стили для заголовков
-		header_font = Font(bold=True, size=12)
-		header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-		header_alignment = Alignment(horizontal="center", vertical="center")
-		border = Border(
-			left=Side(style='thin'),
-			right=Side(style='thin'),
-			top=Side(style='thin'),
-			bottom=Side(style='thin')
-		)
-		
-		# Создаем лист для каждой заявки
-		for request_obj in requests:
-			# Создаем лист с названием заявки (обрезаем до 31 символа)
-			sheet_name = f"Заявка {request_obj.id}"
-			if len(sheet_name) > 31:
-				sheet_name = f"Заявка{request_obj.id}"
-			
-			ws = wb.create_sheet(title=sheet_name)
-			
-			# Заголовок заявки
-			ws['A1'] = f"Заказ №{request_obj.id}-{request_obj.name} {request_obj.created_at.strftime('%d/%m/%y')}"
-			ws['A1'].font = Font(bold=True, size=14)
-			ws.merge_cells('A1:E1')
-			
-			# Информация о клиенте
-			ws['A3'] = "Клиент:"
-			ws['A3'].font = header_font
-			ws['B3'] = request_obj.client.name
-			ws['B3'].font = Font(size=12)
-			
-			ws['A4'] = "Компания:"
-			ws['A4'].font = header_font
-			ws['B4'] = request_obj.client.company or ""
-			ws['B4'].font = Font(size=12)
-			
-			ws['A5'] = "Телефон:"
-			ws['A5'].font = header_font
-			ws['B5'] = request_obj.client.phone or ""
-			ws['B5'].font = Font(size=12)
-			
-			# Заголовки таблицы
-			headers = ['№', 'Материал', 'Размер', 'Шт', 'Операции']
-			for col, header in enumerate(headers, 1):
-				cell = ws.cell(row=7, column=col, value=header)
-				cell.font = header_font
-				cell.fill = header_fill
-				cell.alignment = header_alignment
-				cell.border = border
-			
-			# Данные товаров
-			row = 8
-			for idx, item in enumerate(request_obj.items.all(), 1):
-				# Определяем материал
-				material = item.product.name
-				if item.glass_type:
-					material += f" ({item.glass_type})"
-				
-				# Размер
-				size = item.size or ""
-				
-				# Количество
-				quantity = item.quantity
-				
-				# Операции (на основе типа продукта)
-				operations = []
-				if item.product.is_glass:
-					operations.extend(['Распил', 'ЧПУ', 'Пескоструй', 'УФ печать'])
-				else:
-					operations.extend(['Распил', 'ЧПУ', 'Пресс', 'Кромка', 'Шлифовка', 'Грунтовка', 'Покраска'])
-				
-				operations_text = ", ".join(operations)
-				
-				# Записываем данные
-				ws.cell(row=row, column=1, value=idx).border = border
-				ws.cell(row=row, column=2, value=material).border = border
-				ws.cell(row=row, column=3, value=size).border = border
-				ws.cell(row=row, column=4, value=quantity).border = border
-				ws.cell(row=row, column=5, value=operations_text).border = border
-				
-				row += 1
-			
-			# Итоговая строка
-			total_quantity = sum(item.quantity for item in request_obj.items.all())
-			ws.cell(row=row, column=1, value="Общий").font = Font(bold=True)
-			ws.cell(row=row, column=1).border = border
-			ws.cell(row=row, column=4, value=f"{total_quantity}шт").font = Font(bold=True)
-			ws.cell(row=row, column=4).border = border
-			
-			# Настройка ширины столбцов
-			ws.column_dimensions['A'].width = 8
-			ws.column_dimensions['B'].width = 40
-			ws.column_dimensions['C'].width = 15
-			ws.column_dimensions['D'].width = 10
-			ws.column_dimensions['E'].width = 50
-			
-			# Дополнительная информация
-			row += 3
-			ws.cell(row=row, column=1, value="Комментарий:").font = header_font
-			ws.cell(row=row, column=2, value=request_obj.comment or "").font = Font(size=12)
-			
-			row += 1
-			ws.cell(row=row, column=1, value="Общая сумма:").font = header_font
-			ws.cell(row=row, column=2, value=f"{request_obj.total_amount or 0} сом").font = Font(size=12, bold=True)
-			
-			row += 1
-			ws.cell(row=row, column=1, value="Статус:").font = header_font
-			status_display = {
-				'pending': 'Ожидает',
-				'approved': 'Одобрена',
-				'in_production': 'В производстве',
-				'rejected': 'Отклонена'
-			}.get(request_obj.status, request_obj.status)
-			ws.cell(row=row, column=2, value=status_display).font = Font(size=12)
-		
-		# Создаем ответ
-		response = HttpResponse(
-			content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-		)
-		response['Content-Disposition'] = f'attachment; filename="заявки_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
+		request_ids = request.data.get('request_ids') or []
+		try:
+			request_ids = [int(pk) for pk in request_ids]
+		except (TypeError, ValueError):
+			return Response({'error': 'request_ids должен быть списком целых чисел'}, status=400)
+		if not request_ids:
+			return Response({'error': 'Не переданы заявки для одобрения'}, status=400)
 		
-		# Сохраняем файл
-		wb.save(response)
-		return response
+		results = Request.bulk_approve_and_create_orders(request_ids, request.user)
+		return Response({
+			'approved': sum(1 for r in results if r['success']),
+			'failed': sum(1 for r in results if not r['success']),
+			'results': results,
+		})
+
+
+@method_decorator(login_required, name='dispatch')
+class ExportRequestsExcelView(View):
+	"""Экспорт заявок в Excel файл (фоновая выгрузка, см. apps.exports)"""
+	def get(self, request):
+		from apps.exports.services import export_response
+		return export_response(request, 'requests_excel', {})
 
 
 @method_decorator(login_required, name='dispatch')
 class ExportRequestsExcelForClientView(View):
 	"""Экспорт заявок конкретного клиента в Excel файл с точным форматом как на фотографии"""
 	def get(self, request, client_id):
-		from apps.finance.models import Request
 		from apps.clients.models import Client
-		from apps.operations.workshops.models import Workshop
+		from apps.exports.services import export_response
 		
-		# Получаем клиента
 		client = get_object_or_404(Client, pk=client_id)
-		
-		# Получаем все заявки клиента с детальной информацией
-		requests = Request.objects.filter(client=client).select_related('client').prefetch_related('items__product').order_by('-created_at')
-		
-		# Получаем цеха из БД (кроме ID 2)
-		workshops = Workshop.objects.exclude(id=2).order_by('id')
-		
-		# Создаем Excel файл
-		wb = Workbook()
-		
-		# Удаляем дефолтный лист
-		wb.remove(wb.active)
-		
-		# Стили для заголовков
-		header_font = Font(bold=True, size=10, color="FFFFFF")  # Уменьшаем размер с 12 до 10
-		header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-		header_alignment = Alignment(horizontal="center", vertical="center")
-		border = Border(
-			left=Side(style='thin'),
-			right=Side(style='thin'),
-			top=Side(style='thin'),
-			bottom=Side(style='thin')
-		)
-		
-		# Создаем лист для каждой заявки
-		for request_obj in requests:
-			# Создаем лист с названием заявки (обрезаем до 31 символа)
-			sheet_name = f"Заявка {request_obj.id}"
-			if len(sheet_name) > 31:
-				sheet_name = f"Заявка{request_obj.id}"
-			
-			ws = wb.create_sheet(title=sheet_name)
-			
-			# Заголовок заявки (точно как на фотографии)
-			ws['A1'] = f"Заказ №{request_obj.id}-{request_obj.name} {request_obj.created_at.strftime('%d/%m/%y')}"
-			ws['A1'].font = Font(bold=True, size=12)  # Уменьшаем размер шрифта с 14 до 12
-			ws.merge_cells('A1:I1')  # Объединяем все 9 столбцов
-			ws['A1'].alignment = Alignment(horizontal="center", vertical="center")
-			
-			# Заголовки таблицы (точно как на фотографии)
-			headers = ['№', 'цеха', 'материал', 'размер', 'шт', '', '', '', '']
-			for col, header in enumerate(headers, 1):
-				cell = ws.cell(row=2, column=col, value=header)
-				cell.font = header_font
-				cell.fill = header_fill
-				cell.alignment = header_alignment
-				cell.border = border
-			
-			# Данные товаров (точно как на фотографии)
-			row = 3
-			workshop_num = 1
-			total_quantity = 0
-			
-			# Получаем товары из заявки
-			items = list(request_obj.items.all())
-			
-			# Создаем данные для каждого цеха из БД
-			for workshop in workshops:
-				# Определяем количество строк для каждого цеха
-				if workshop.id == 1:  # Распил
-					rows_for_workshop = 3
-				elif workshop.id == 2:  # ЧПУ (исключен)
-					continue
-				elif workshop.id == 3:  # Заготовка
-					rows_for_workshop = 2
-				elif workshop.id == 4:  # Пресс
-					rows_for_workshop = 2
-				elif workshop.id == 8:  # Грутовка
-					rows_for_workshop = 2
-				elif workshop.id == 9:  # Шкурка белый
-					rows_for_workshop = 6
-				elif workshop.id == 10:  # Покраска
-					rows_for_workshop = 2
-				elif workshop.id == 11:  # Упаковка
-					rows_for_workshop = 2
-				else:
-					rows_for_workshop = 1
-				
-				# Для каждого товара создаем отдельные строки
-				for item in items:
-					for workshop_row in range(rows_for_workshop):
-						# Первая строка цеха содержит номер и название
-						if workshop_row == 0:
-							ws.cell(row=row, column=1, value=workshop_num).border = border
-							ws.cell(row=row, column=2, value=workshop.name).border = border
-						else:
-							# Последующие строки цеха пустые в первых двух столбцах
-							ws.cell(row=row, column=1, value="").border = border
-							ws.cell(row=row, column=2, value="").border = border
-						
-						# Заполняем данные товаров только для определенных цехов
-						if workshop.id == 1 and workshop_row == 0:  # Распил
-							material = item.product.name  # Только название товара без скобок
-							size = item.size or "80-200"
-							# До пресса x2 от количества заявки
-							quantity = item.quantity * 2
-							# Добавляем 1 к размеру до пресса
-							size_with_plus_one = self.add_one_to_size(size)
-							total_quantity += quantity
-							
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value=size_with_plus_one).border = border
-							ws.cell(row=row, column=5, value=quantity).border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 1 and workshop_row == 1:  # Распил вторая строка
-							# Берем данные из БД
-							material = f"{item.product.name} МДФ {item.size or '1,0'}"
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value="").border = border
-							ws.cell(row=row, column=5, value="").border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 1 and workshop_row == 2:  # Распил третья строка
-							# Берем данные из БД
-							material = f"{item.product.name} стекло"
-							size = item.size or "30 40"
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value=size).border = border
-							ws.cell(row=row, column=5, value="").border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 3 and workshop_row == 0:  # Заготовка
-							material = f"{item.product.name} ГЛУХОЙ"  # Убираем скобки с цветом
-							size = item.size or "80-200"
-							# До пресса x2 от количества заявки
-							quantity = item.quantity * 2
-							# Добавляем 1 к размеру до пресса
-							size_with_plus_one = self.add_one_to_size(size)
-							
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value=size_with_plus_one).border = border
-							ws.cell(row=row, column=5, value=quantity).border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 4 and workshop_row == 0:  # Пресс
-							material = f"{item.product.name} ГЛУХОЙ"  # Убираем скобки с цветом
-							size = item.size or "80-200"
-							# На прессе и после - реальное количество
-							quantity = item.quantity
-							
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value=size).border = border
-							ws.cell(row=row, column=5, value=quantity).border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 8 and workshop_row == 0:  # Грутовка
-							quantity = item.quantity  # Реальное количество из БД
-							ws.cell(row=row, column=3, value="").border = border
-							ws.cell(row=row, column=4, value="").border = border
-							ws.cell(row=row, column=5, value=f"{quantity}шт").border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 9 and workshop_row == 0:  # Шкурка белый
-							quantity = item.quantity  # Реальное количество из БД
-							ws.cell(row=row, column=3, value="").border = border
-							ws.cell(row=row, column=4, value="").border = border
-							ws.cell(row=row, column=5, value=f"{quantity}шт").border = border
-							ws.cell(row=row, column=6, value="").border = border
-							
-						elif workshop.id == 10 and workshop_row == 0:  # Покраска
-							material = f"{item.product.name} ГЛУХОЙ"  # Убираем скобки с цветом
-							size = item.size or "80-200"
-							# На прессе и после - реальное количество
-							quantity = item.quantity
-							
-							ws.cell(row=row, column=3, value=material).border = border
-							ws.cell(row=row, column=4, value=size).border = border
-							ws.cell(row=row, column=5, value=quantity).border = border
-							ws.cell(row=row, column=6, value="").border = border
-						
-						else:
-							# Для всех остальных строк заполняем пустые ячейки с границами
-							ws.cell(row=row, column=3, value="").border = border
-							ws.cell(row=row, column=4, value="").border = border
-							ws.cell(row=row, column=5, value="").border = border
-							ws.cell(row=row, column=6, value="").border = border
-						
-						# Заполняем пустые столбцы 7-9 границами для всех строк
-						for col in range(7, 10):
-							ws.cell(row=row, column=col, value="").border = border
-						
-						row += 1
-				
-				workshop_num += 1
-			
-			# Итоговая строка (точно как на фотографии)
-			ws.cell(row=row, column=1, value="общий").font = Font(bold=True)
-			ws.cell(row=row, column=1).border = border
-			ws.cell(row=row, column=1).alignment = Alignment(horizontal="right")
-			
-			# Вычисляем общее количество из БД
-			total_from_db = sum(item.quantity for item in items) if items else 0
-			ws.cell(row=row, column=7, value=f"{total_from_db}шт").font = Font(bold=True)  # В 7-м столбце как на фотографии
-			ws.cell(row=row, column=7).border = border
-			
-			# Заполняем границы для итоговой строки
-			for col in range(2, 10):
-				ws.cell(row=row, column=col, value="").border = border
-			
-			# Настройка ширины столбцов для растягивания на всю ширину листа
-			ws.column_dimensions['A'].width = 8   # №
-			ws.column_dimensions['B'].width = 20  # цеха
-			ws.column_dimensions['C'].width = 35  # материал - увеличиваем
-			ws.column_dimensions['D'].width = 18  # размер - увеличиваем
-			ws.column_dimensions['E'].width = 12  # шт - увеличиваем
-			ws.column_dimensions['F'].width = 18  # 6-й столбец - увеличиваем
-			ws.column_dimensions['G'].width = 15  # 7-й столбец - увеличиваем
-			ws.column_dimensions['H'].width = 12  # 8-й столбец - увеличиваем
-			ws.column_dimensions['I'].width = 12  # 9-й столбец - увеличиваем
-			
-			# Настройка ориентации страницы на альбомную
-			ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-			ws.page_setup.fitToPage = True
-			ws.page_setup.fitToHeight = 1
-			ws.page_setup.fitToWidth = 1
-			
-			# Настройка отступов страницы для максимального использования пространства
-			ws.page_margins.left = 0.3
-			ws.page_margins.right = 0.3
-			ws.page_margins.top = 0.3
-			ws.page_margins.bottom = 0.3
-			ws.page_margins.header = 0.2
-			ws.page_margins.footer = 0.2
-		
-		# Создаем ответ
-		response = HttpResponse(
-			content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-		)
-		response['Content-Disposition'] = f'attachment; filename="заявки_{client.name}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-		
-		# Сохраняем файл
-		wb.save(response)
-		return response
-	
-	def add_one_to_size(self, size):
-		"""Добавляет 1 к размеру до пресса (например, 80-200 -> 81-201)"""
-		if not size:
-			return size
-		
-		try:
-			# Разбиваем размер по дефису
-			parts = size.split('-')
-			if len(parts) == 2:
-				first_part = int(parts[0]) + 1
-				second_part = int(parts[1]) + 1
-				return f"{first_part}-{second_part}"
-			else:
-				# Если размер не в формате X-Y, возвращаем как есть
-				return size
-		except (ValueError, TypeError):
-			# Если не удается преобразовать в числа, возвращаем как есть
-			return size
\ No newline at end of file
+		return export_response(request, 'client_requests_excel', {'client_id': client.pk})
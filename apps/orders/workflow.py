@@ -0,0 +1,186 @@
+"""
+Движок переходов этапов заказа.
+
+Подтверждение этапа мастером выполняется как одна атомарная операция:
+заказ, подтверждаемый этап и следующий этап потока блокируются через
+select_for_update, количество в следующий этап добавляется через F(),
+а новые этапы (следующий по workflow, упаковка, остаток) создаются одним
+bulk_create. Следующий шаг и его цех берутся из apps.orders.routing.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Order, OrderStage
+from .routing import PACKAGING_OPERATION, next_step, workshop_cache
+
+logger = logging.getLogger(__name__)
+
+# Статусы, после которых этап уже передал количество дальше
+CONFIRMED_STATUSES = ('done', 'partial', 'completed')
+
+# Цех, после которого заказ считается завершённым
+ORDER_FINISH_WORKSHOP_ID = 4
+
+
+def _default_deadline():
+    return timezone.now().replace(hour=18, minute=0, second=0, microsecond=0).date()
+
+
+def confirm_stage(stage_id, completed_qty):
+    """
+    Подтверждает выполнение этапа: выполненное уходит на следующий этап,
+    невыполненный остаток остаётся новым этапом в этом же цехе.
+    Возвращает (успех, сообщение).
+    """
+    with transaction.atomic():
+        # Подтверждения этапов одного заказа идут по очереди: иначе два соседних
+        # этапа (частичный и его остаток) при отсутствии следующего этапа
+        # создадут каждый свой — блокировать пока нечего
+        order_id = OrderStage.objects.values_list('order_id', flat=True).get(pk=stage_id)
+        Order.objects.select_for_update().only('pk').get(pk=order_id)
+        stage = OrderStage.objects.select_for_update().select_related(
+            'order', 'order_item', 'workshop'
+        ).get(pk=stage_id)
+
+        if stage.status in CONFIRMED_STATUSES:
+            return False, "Этап уже подтвержден"
+
+        # Проверяем, можно ли переходить к упаковке (для стеклянных изделий)
+        if not stage.can_proceed_to_packaging():
+            return False, "Нельзя переходить к упаковке: резка стекла не завершена"
+
+        if completed_qty <= 0:
+            # Ничего не сделано — этап остаётся в работе
+            return True, "Этап подтвержден"
+
+        is_full = completed_qty >= stage.plan_quantity
+        transfer_qty = stage.plan_quantity if is_full else completed_qty
+        stage.completed_quantity = transfer_qty
+        stage.status = 'done' if is_full else 'partial'
+        stage.save(update_fields=['completed_quantity', 'status', 'date', 'updated_at'])
+
+        # Если это этап резки стекла, отмечаем позицию как порезанную
+        if stage.is_glass_stage() and 'распил стекла' in (stage.operation or '').lower() and stage.order_item:
+            stage.order_item.glass_cutting_completed = True
+            stage.order_item.glass_cutting_quantity = completed_qty
+            stage.order_item.save(update_fields=['glass_cutting_completed', 'glass_cutting_quantity'])
+
+        # Если это этап упаковки, создаем запись в finished_goods
+        if stage.is_packaging_stage():
+            stage._create_finished_good(completed_qty)
+
+        # Специальная логика для цеха ID4 (Пресс) - завершаем заказ
+        if stage.workshop_id == ORDER_FINISH_WORKSHOP_ID:
+            Order.objects.filter(pk=stage.order_id).update(status='completed')
+            logger.info("Заказ %s завершен после выполнения этапа в цеху 4", stage.order_id)
+            return True, "Заказ завершен"
+
+        new_stages = []
+        next_stage = activate_next_stage(stage, transfer_qty)
+        if next_stage is not None and next_stage.pk is None:
+            new_stages.append(next_stage)
+        if not is_full:
+            new_stages.append(OrderStage(
+                order_id=stage.order_id,
+                order_item_id=stage.order_item_id,
+                stage_type=stage.stage_type,
+                workshop_id=stage.workshop_id,
+                operation=stage.operation,
+                sequence=stage.sequence,
+                plan_quantity=stage.plan_quantity - completed_qty,
+                completed_quantity=0,
+                deadline=None,
+                status='in_progress',
+                parallel_group=stage.parallel_group,
+            ))
+        create_stages(new_stages)
+
+    return True, "Этап подтвержден"
+
+
+def activate_next_stage(stage, qty):
+    """
+    Передаёт qty на следующий этап потока. Существующий этап блокируется
+    и увеличивается через F(); иначе возвращается несохранённый этап,
+    построенный по workflow (или этап упаковки в конце основного потока).
+    Должна вызываться внутри транзакции.
+    """
+    next_seq = stage.sequence + 1
+    next_stage = OrderStage.objects.select_for_update().filter(
+        order_id=stage.order_id,
+        order_item_id=stage.order_item_id,
+        parallel_group=stage.parallel_group,
+        sequence=next_seq,
+    ).order_by('id').first()
+
+    if next_stage:
+        now = timezone.now()
+        OrderStage.objects.filter(pk=next_stage.pk).update(
+            plan_quantity=F('plan_quantity') + qty,
+            status='in_progress',
+            date=now,
+            updated_at=now,
+        )
+        return next_stage
+
+    step = next_step(stage.parallel_group, stage.sequence)
+    if step is None:
+        # Последний этап стеклянного потока — упаковку не создаём
+        return None
+    if step.workshop is None:
+        logger.warning("Workshop for step %s of group %s not found, cannot create next stage", step.sequence, step.parallel_group)
+        return None
+    return OrderStage(
+        order_id=stage.order_id,
+        order_item_id=stage.order_item_id,
+        sequence=step.sequence,
+        stage_type='workshop',
+        workshop=step.workshop,
+        operation=step.operation,
+        plan_quantity=qty,
+        deadline=_default_deadline(),
+        status='in_progress',
+        parallel_group=stage.parallel_group,
+    )
+
+
+def build_packaging_stage(stage, qty):
+    """Несохранённый этап упаковки после завершения всех производственных этапов"""
+    packaging_workshop = workshop_cache.packaging()
+    if not packaging_workshop:
+        logger.warning("Packaging workshop not found, skipping packaging stage creation")
+        return None
+    return OrderStage(
+        order_id=stage.order_id,
+        order_item_id=stage.order_item_id,
+        sequence=stage.sequence + 1,
+        stage_type='workshop',
+        workshop=packaging_workshop,
+        operation=PACKAGING_OPERATION,
+        plan_quantity=qty,
+        deadline=_default_deadline(),
+        status='in_progress',
+        parallel_group=stage.parallel_group,
+    )
+
+
+def create_stages(stages):
+    """
+    Создаёт этапы одним bulk_create. bulk_create не шлёт post_save, поэтому
+    сигнал отправляется вручную после коммита — уведомления мастеров
+    (orders.signals) продолжают работать.
+    """
+    if not stages:
+        return []
+    created = OrderStage.objects.bulk_create(stages)
+
+    def _notify():
+        for obj in created:
+            post_save.send(sender=OrderStage, instance=obj, created=True, update_fields=None, raw=False, using=obj._state.db)
+
+    transaction.on_commit(_notify)
+    return created
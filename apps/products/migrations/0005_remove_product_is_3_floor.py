@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 04:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_is_3_floor'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='is_3_floor',
+        ),
+    ]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.services'
+
+    def ready(self):
+        # Сброс кэша выбора услуг (apps.services.resolver)
+        import apps.services.signals  # noqa: F401
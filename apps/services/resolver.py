@@ -0,0 +1,190 @@
+"""
+Кэш выбора услуг для расчёта заработка и штрафов.
+
+Правила выбора:
+- услуга товара в цехе — первая активная (по названию) из product.services
+  этого цеха, иначе любая его услуга в цехе;
+- услуга цеха — активная услуга с названием операции, иначе первая активная;
+- услуга по названию — первая услуга цеха с таким названием.
+
+Результаты хранятся в двух слоях: LRU в памяти процесса и Django cache,
+общий для процессов (CACHE_SHARED, Redis). При изменении услуг или
+product.services (signals.py) поколение кэша увеличивается: локальный слой
+текущего процесса очищается сразу, остальные процессы замечают новое поколение
+не позже чем через SERVICE_PRICE_GENERATION_TTL секунд.
+
+Записи LRU живут не дольше SERVICE_PRICE_LOCAL_TTL секунд, так что пропущенное
+поколение не оставляет старую цену навсегда. Без общего кэша поколение другим
+процессам не видно, и Django cache (такая же память процесса) не используется:
+процесс видит изменение цены не позже чем через SERVICE_PRICE_LOCAL_TTL.
+Счётчики попаданий — stats().
+"""
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Service
+
+ServicePrice = namedtuple('ServicePrice', 'pk name workshop_id service_price defect_penalty is_active')
+
+GENERATION_KEY = 'services:resolver:generation'
+KEY_PREFIX = 'services:resolver'
+
+# Значение «услуга не найдена» — тоже кэшируется
+_MISSING = 'missing'
+
+_lock = threading.Lock()
+_local = OrderedDict()
+_generation = {'value': None, 'checked_at': 0.0}
+_stats = Counter()
+
+
+def _timeout():
+    return getattr(settings, 'SERVICE_PRICE_CACHE_TIMEOUT', 3600)
+
+
+def _local_size():
+    return getattr(settings, 'SERVICE_PRICE_LOCAL_CACHE_SIZE', 4096)
+
+
+def _local_ttl():
+    return getattr(settings, 'SERVICE_PRICE_LOCAL_TTL', 30)
+
+
+def _shared():
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+def _to_price(service):
+    return ServicePrice(
+        service.pk, service.name, service.workshop_id,
+        service.service_price, service.defect_penalty, service.is_active,
+    )
+
+
+def _current_generation():
+    """Поколение кэша; общее значение перечитывается не чаще раза в GENERATION_TTL"""
+    now = time.monotonic()
+    ttl = getattr(settings, 'SERVICE_PRICE_GENERATION_TTL', 5)
+    with _lock:
+        if _generation['value'] is not None and now - _generation['checked_at'] < ttl:
+            return _generation['value']
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        value = 1
+        cache.add(GENERATION_KEY, value, None)
+    with _lock:
+        if value != _generation['value']:
+            _local.clear()
+        _generation['value'] = value
+        _generation['checked_at'] = now
+    return value
+
+
+def _lookup(key, loader):
+    generation = _current_generation()
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None and entry[1] > now:
+            _local.move_to_end(key)
+            _stats['local_hits'] += 1
+            value = entry[0]
+            return None if value == _MISSING else value
+
+    value = None
+    cache_key = f'{KEY_PREFIX}:v{generation}:{key}'
+    if _shared():
+        value = cache.get(cache_key)
+    hit = value is not None
+    if not hit:
+        value = loader()
+        value = _MISSING if value is None else value
+        if _shared():
+            cache.set(cache_key, value, _timeout())
+
+    with _lock:
+        _stats['cache_hits' if hit else 'misses'] += 1
+        # (значение, срок годности в часах time.monotonic)
+        _local[key] = (value, now + _local_ttl())
+        _local.move_to_end(key)
+        while len(_local) > _local_size():
+            _local.popitem(last=False)
+    return None if value == _MISSING else value
+
+
+def _workshop_services(workshop_id):
+    """Все услуги цеха, упорядоченные по названию"""
+    def load():
+        services = Service.objects.filter(workshop_id=workshop_id).order_by('name', 'pk')
+        return tuple(_to_price(service) for service in services)
+    return _lookup(f'workshop:{workshop_id}', load) or ()
+
+
+def product_service(product_id, workshop_id):
+    """Услуга товара в цехе: первая активная, иначе любая"""
+    if not product_id or not workshop_id:
+        return None
+
+    def load():
+        services = Service.objects.filter(products__id=product_id, workshop_id=workshop_id)
+        service = services.filter(is_active=True).order_by('name', 'pk').first() or services.order_by('name', 'pk').first()
+        return _to_price(service) if service else None
+    return _lookup(f'product:{product_id}:{workshop_id}', load)
+
+
+def workshop_service(workshop_id, operation=None):
+    """Активная услуга цеха с названием операции, иначе первая активная услуга цеха"""
+    if not workshop_id:
+        return None
+    active = [service for service in _workshop_services(workshop_id) if service.is_active]
+    if operation and operation.strip():
+        for service in active:
+            if service.name == operation:
+                return service
+    return active[0] if active else None
+
+
+def named_service(workshop_id, name):
+    """Первая услуга цеха с указанным названием (без учёта активности)"""
+    if not workshop_id or not name:
+        return None
+    for service in _workshop_services(workshop_id):
+        if service.name == name:
+            return service
+    return None
+
+
+def invalidate():
+    """Сбрасывает кэш во всех процессах: новое поколение ключей"""
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = int(time.time())
+        cache.set(GENERATION_KEY, generation, None)
+    with _lock:
+        _local.clear()
+        _generation['value'] = generation
+        _generation['checked_at'] = time.monotonic()
+        _stats['invalidations'] += 1
+
+
+def stats():
+    """Счётчики текущего процесса: local_hits, cache_hits, misses, invalidations"""
+    with _lock:
+        counters = dict(_stats)
+        size = len(_local)
+    for name in ('local_hits', 'cache_hits', 'misses', 'invalidations'):
+        counters.setdefault(name, 0)
+    lookups = counters['local_hits'] + counters['cache_hits'] + counters['misses']
+    counters['hit_rate'] = round((lookups - counters['misses']) / lookups, 3) if lookups else 0.0
+    counters['local_size'] = size
+    return counters
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
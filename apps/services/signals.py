@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.products.models import Product
+from . import resolver
+from .models import Service
+
+
+def _invalidate_resolver():
+    # Сразу — для текущего процесса, после коммита — чтобы другие процессы
+    # не закэшировали в новом поколении данные до коммита
+    resolver.invalidate()
+    transaction.on_commit(resolver.invalidate)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_on_service_change(sender, **kwargs):
+    _invalidate_resolver()
+
+
+@receiver(m2m_changed, sender=Product.services.through)
+def invalidate_on_product_services_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidate_resolver()
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from apps.operations.workshops.models import Workshop
+from apps.products.models import Product
+from . import resolver
+from .models import Service
+
+
+class ServiceResolverTest(TestCase):
+    """Кэш выбора услуг: попадания, промахи и сброс по сигналам"""
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.product = Product.objects.create(name='Дверь', price=100)
+        self.inactive = Service.objects.create(name='А-распил', workshop=self.workshop, service_price=5, is_active=False)
+        self.service = Service.objects.create(name='Распил', workshop=self.workshop, service_price=10, defect_penalty=3)
+        self.product.services.add(self.inactive, self.service)
+        resolver.reset_stats()
+
+    def test_lookups_are_cached(self):
+        first = resolver.product_service(self.product.id, self.workshop.id)
+        self.assertEqual((first.pk, first.service_price), (self.service.pk, 10))
+        with self.assertNumQueries(0):
+            again = resolver.product_service(self.product.id, self.workshop.id)
+        self.assertEqual(again, first)
+        stats = resolver.stats()
+        self.assertEqual((stats['misses'], stats['local_hits']), (1, 1))
+
+    def test_local_layer_falls_back_to_shared_cache(self):
+        resolver.workshop_service(self.workshop.id, 'Распил')
+        with resolver._lock:
+            resolver._local.clear()
+        with self.assertNumQueries(0):
+            found = resolver.workshop_service(self.workshop.id, 'Распил')
+        self.assertEqual(found.pk, self.service.pk)
+        self.assertEqual(resolver.stats()['cache_hits'], 1)
+
+    def test_workshop_rules(self):
+        self.assertEqual(resolver.workshop_service(self.workshop.id, 'Нет такой').pk, self.service.pk)
+        # По названию находится и неактивная услуга
+        self.assertEqual(resolver.named_service(self.workshop.id, 'А-распил').pk, self.inactive.pk)
+        self.assertIsNone(resolver.named_service(self.workshop.id, 'Нет такой'))
+
+    def test_invalidated_by_signals(self):
+        resolver.product_service(self.product.id, self.workshop.id)
+        self.service.service_price = 12
+        self.service.save()
+        self.assertEqual(resolver.product_service(self.product.id, self.workshop.id).service_price, 12)
+
+        self.product.services.remove(self.service)
+        # Осталась только неактивная услуга товара
+        self.assertEqual(resolver.product_service(self.product.id, self.workshop.id).pk, self.inactive.pk)
+        self.product.services.clear()
+        self.assertIsNone(resolver.product_service(self.product.id, self.workshop.id))
+        self.assertEqual(resolver.stats()['invalidations'], 3)
+
+    @override_settings(CACHE_SHARED=False, SERVICE_PRICE_LOCAL_TTL=30)
+    def test_local_entries_expire_without_shared_cache(self):
+        from unittest import mock
+        resolver.invalidate()
+        self.assertEqual(resolver.product_service(self.product.id, self.workshop.id).service_price, 10)
+        # Цену поменял другой процесс: поколение этого процесса о ней не знает
+        Service.objects.filter(pk=self.service.pk).update(service_price=15)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.product_service(self.product.id, self.workshop.id).service_price, 10)
+
+        later = resolver.time.monotonic() + 31
+        with mock.patch('apps.services.resolver.time.monotonic', return_value=later):
+            self.assertEqual(resolver.product_service(self.product.id, self.workshop.id).service_price, 15)
+        # Память процесса как «общий» кэш не используется
+        self.assertEqual(resolver.stats()['cache_hits'], 0)
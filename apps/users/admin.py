@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from .models import BalanceEntry, BalanceSnapshot, User
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -27,7 +27,44 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     
-    readonly_fields = ('last_login', 'date_joined', 'created_at', 'updated_at')
+    # Баланс меняется только записями журнала начислений (BalanceEntry)
+    readonly_fields = ('last_login', 'date_joined', 'created_at', 'updated_at', 'balance')
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('workshop')
+
+
+@admin.register(BalanceEntry)
+class BalanceEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'amount', 'source', 'comment', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'source', 'comment')
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    fields = ('user', 'kind', 'amount', 'comment')
+
+    def save_model(self, request, obj, form, change):
+        # Через журнал, чтобы сдвинуть и проекцию баланса
+        from .ledger import post_entries
+        post_entries([obj])
+
+    def has_change_permission(self, request, obj=None):
+        # Журнал только дополняется: исправления — новой корректировкой
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period_end', 'balance', 'created_at')
+    list_filter = ('period_end',)
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
+
+    def ready(self):
+        # Штрафы за опоздания в журнале начислений (apps.users.ledger)
+        import apps.users.signals  # noqa: F401
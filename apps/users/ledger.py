@@ -0,0 +1,183 @@
+"""
+Журнал начислений сотрудников.
+
+Баланс меняется только добавлением записей BalanceEntry: заработок и штрафы
+по задачам, штрафы за опоздания, выплаты, корректировки. User.balance — это
+проекция журнала: post_entries сдвигает её сгруппированным UPDATE в той же
+транзакции, rebuild_balance пересобирает её из журнала.
+
+Снимки BalanceSnapshot делаются на первое число месяца (take_snapshots), поэтому
+баланс на дату и отчёт за период считаются по последнему снимку и записям после
+него, а не по всей истории.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Max, Sum, Value, When
+from django.utils import timezone
+
+from .models import BalanceEntry, BalanceSnapshot, User
+
+logger = logging.getLogger(__name__)
+
+# Сотрудников в одном UPDATE баланса (ограничение на число параметров запроса)
+BALANCE_BATCH_SIZE = 500
+
+
+def _to_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def _boundary(day):
+    """Начало дня day в текущем часовом поясе"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _as_moment(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return _boundary(value)
+    return value
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def entry(user_id, kind, amount, source='', comment=''):
+    """Несохранённая запись журнала"""
+    return BalanceEntry(user_id=user_id, kind=kind, amount=_to_decimal(amount), source=source, comment=comment)
+
+
+def task_entries(task, old_net_earnings, old_penalties, comment=''):
+    """Записи по изменению заработка задачи: начисление и штраф за брак.
+
+    Сумма записей равна изменению чистого заработка задачи.
+    """
+    penalties_delta = _to_decimal(task.penalties) - _to_decimal(old_penalties)
+    net_delta = _to_decimal(task.net_earnings) - _to_decimal(old_net_earnings)
+    source = f'task:{task.pk}'
+    return [
+        entry(task.employee_id, BalanceEntry.Kind.TASK_EARNINGS, net_delta + penalties_delta, source, comment),
+        entry(task.employee_id, BalanceEntry.Kind.PENALTY, -penalties_delta, source, comment),
+    ]
+
+
+def shift_balances(deltas):
+    """Сдвигает проекцию User.balance на {user_id: delta} сгруппированными UPDATE"""
+    deltas = [(pk, delta) for pk, delta in deltas.items() if delta]
+    updated = 0
+    for start in range(0, len(deltas), BALANCE_BATCH_SIZE):
+        chunk = deltas[start:start + BALANCE_BATCH_SIZE]
+        shift = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in chunk],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        updated += User.objects.filter(pk__in=[pk for pk, _ in chunk]).update(balance=F('balance') + shift)
+    return updated
+
+
+def post_entries(entries):
+    """Добавляет записи в журнал и сдвигает балансы; нулевые записи пропускаются"""
+    entries = [item for item in entries if item.amount]
+    if not entries:
+        return []
+    deltas = defaultdict(Decimal)
+    for item in entries:
+        deltas[item.user_id] += item.amount
+    with transaction.atomic():
+        BalanceEntry.objects.bulk_create(entries, batch_size=BALANCE_BATCH_SIZE)
+        shift_balances(deltas)
+    return entries
+
+
+def post(user_id, kind, amount, source='', comment=''):
+    """Добавляет одну запись; возвращает её или None для нулевой суммы"""
+    created = post_entries([entry(user_id, kind, amount, source, comment)])
+    return created[0] if created else None
+
+
+def balances_as_of(moment, user_ids=None):
+    """Балансы {user_id: сумма} на момент moment (дата — начало дня).
+
+    Берётся последний снимок не позже moment и записи журнала после него.
+    """
+    moment = _as_moment(moment)
+    snapshots = BalanceSnapshot.objects.filter(period_end__lte=timezone.localdate(moment))
+    entries = BalanceEntry.objects.filter(created_at__lt=moment)
+    if user_ids is not None:
+        snapshots = snapshots.filter(user_id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+
+    balances = defaultdict(Decimal)
+    period_end = snapshots.aggregate(last=Max('period_end'))['last']
+    if period_end:
+        # Снимок пишется для всех ненулевых балансов, отсутствие строки — ноль
+        for user_id, balance in snapshots.filter(period_end=period_end).values_list('user_id', 'balance'):
+            balances[user_id] = balance
+        entries = entries.filter(created_at__gte=_boundary(period_end))
+    for row in entries.values('user_id').annotate(total=Sum('amount')):
+        balances[row['user_id']] += row['total']
+    return dict(balances)
+
+
+def balance_as_of(user_id, moment):
+    """Баланс сотрудника на момент moment"""
+    return balances_as_of(moment, [user_id]).get(user_id, Decimal('0'))
+
+
+def take_snapshots(period_end):
+    """Записывает снимки балансов на начало дня period_end; возвращает число снимков"""
+    if _boundary(period_end) > timezone.now():
+        raise ValueError("Нельзя снять баланс на дату в будущем")
+    with transaction.atomic():
+        # Снимки производные: повторный вызов пересчитывает их заново
+        BalanceSnapshot.objects.filter(period_end=period_end).delete()
+        balances = balances_as_of(period_end)
+        snapshots = [
+            BalanceSnapshot(user_id=user_id, period_end=period_end, balance=balance)
+            for user_id, balance in balances.items() if balance
+        ]
+        BalanceSnapshot.objects.bulk_create(snapshots, batch_size=BALANCE_BATCH_SIZE)
+    return len(snapshots)
+
+
+def rebuild_balance(user_ids=None):
+    """Пересобирает User.balance из журнала; возвращает число исправленных балансов"""
+    with transaction.atomic():
+        users = User.objects.select_for_update().only('pk', 'balance')
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        users = list(users)
+        balances = balances_as_of(timezone.now(), [user.pk for user in users])
+        changed = []
+        for user in users:
+            expected = balances.get(user.pk, Decimal('0'))
+            if user.balance != expected:
+                logger.warning(f"Баланс сотрудника {user.pk} расходится с журналом: {user.balance} != {expected}")
+                user.balance = expected
+                changed.append(user)
+        User.objects.bulk_update(changed, ['balance'], batch_size=BALANCE_BATCH_SIZE)
+    return len(changed)
+
+
+def period_report(start, end, user_ids=None):
+    """Отчёт за период [start, end): {user_id: {'opening', <тип записи>..., 'closing'}}"""
+    start, end = _as_moment(start), _as_moment(end)
+    opening = balances_as_of(start, user_ids)
+    entries = BalanceEntry.objects.filter(created_at__gte=start, created_at__lt=end)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+
+    report = {}
+    for user_id, balance in opening.items():
+        report[user_id] = {'opening': balance, 'closing': balance}
+    for row in entries.values('user_id', 'kind').annotate(total=Sum('amount')):
+        line = report.setdefault(row['user_id'], {'opening': Decimal('0'), 'closing': Decimal('0')})
+        line[row['kind']] = row['total']
+        line['closing'] += row['total']
+    return report
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.users.ledger import month_start, rebuild_balance, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает балансы сотрудников из журнала начислений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Пересобрать только баланс пользователя с этим ID')
+        parser.add_argument('--snapshot', action='store_true', help='Заново снять балансы на начало текущего месяца')
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            count = take_snapshots(month_start(timezone.localdate()))
+            self.stdout.write(f'Снимков баланса записано: {count}')
+
+        changed = rebuild_balance(options['user'])
+        self.stdout.write(self.style.SUCCESS(f'Пересборка завершена. Исправлено балансов: {changed}'))
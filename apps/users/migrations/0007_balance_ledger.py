@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-17 05:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """Текущие балансы становятся начальными остатками журнала начислений"""
+    User = apps.get_model('users', 'User')
+    BalanceEntry = apps.get_model('users', 'BalanceEntry')
+    entries = [
+        BalanceEntry(user_id=pk, kind='opening', amount=balance, comment='Остаток до ведения журнала')
+        for pk, balance in User.objects.exclude(balance=0).values_list('pk', 'balance')
+    ]
+    BalanceEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_user_options_user_balance_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Начальный остаток'), ('task_earnings', 'Заработок по задаче'), ('penalty', 'Штраф за брак'), ('attendance_fine', 'Штраф за опоздание'), ('payout', 'Выплата'), ('adjustment', 'Корректировка')], max_length=20, verbose_name='Тип')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма')),
+                ('source', models.CharField(blank=True, db_index=True, max_length=50, verbose_name='Источник')),
+                ('comment', models.CharField(blank=True, max_length=255, verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Запись журнала начислений',
+                'verbose_name_plural': 'Журнал начислений',
+                'ordering': ['-created_at', '-pk'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='users_entry_user_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_end', models.DateField(verbose_name='Граница периода')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Баланс')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Снимок баланса',
+                'verbose_name_plural': 'Снимки баланса',
+                'ordering': ['-period_end'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period_end'), name='users_snapshot_user_period_uniq')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
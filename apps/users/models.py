@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 import re
 from decimal import Decimal
 
@@ -35,7 +37,8 @@ class User(AbstractUser):
     contract_number = models.CharField('Номер трудового договора', max_length=50, blank=True)
     notes = models.TextField('Примечания', blank=True)
     
-    # Поле для баланса пользователя
+    # Проекция журнала начислений (BalanceEntry); напрямую не изменяется,
+    # пересобирается apps.users.ledger.rebuild_balance
     balance = models.DecimalField(
         'Баланс',
         max_digits=12,
@@ -68,24 +71,33 @@ class User(AbstractUser):
         else:
             return self.username
 
-    def add_to_balance(self, amount):
-        """Пополняет баланс пользователя"""
+    def add_to_balance(self, amount, comment=''):
+        """Пополняет баланс пользователя (корректировка в журнале начислений)"""
+        from . import ledger
         if isinstance(amount, (int, float)):
             amount = Decimal(str(amount))
-        self.balance += amount
-        self.save(update_fields=['balance'])
+        ledger.post(self.pk, BalanceEntry.Kind.ADJUSTMENT, amount, comment=comment)
+        self.refresh_from_db(fields=['balance'])
         return self.balance
 
-    def subtract_from_balance(self, amount):
-        """Списывает с баланса пользователя"""
+    def subtract_from_balance(self, amount, comment=''):
+        """Списывает с баланса пользователя (выплата в журнале начислений)"""
+        from . import ledger
         if isinstance(amount, (int, float)):
             amount = Decimal(str(amount))
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save(update_fields=['balance'])
-            return self.balance
-        else:
-            raise ValueError("Недостаточно средств на балансе")
+        with transaction.atomic():
+            # Блокируем строку, чтобы две выплаты не прошли проверку одновременно
+            balance = User.objects.select_for_update().values_list('balance', flat=True).get(pk=self.pk)
+            if balance < amount:
+                raise ValueError("Недостаточно средств на балансе")
+            ledger.post(self.pk, BalanceEntry.Kind.PAYOUT, -amount, comment=comment)
+        self.refresh_from_db(fields=['balance'])
+        return self.balance
+
+    def balance_as_of(self, moment):
+        """Баланс пользователя на момент moment по журналу начислений"""
+        from . import ledger
+        return ledger.balance_as_of(self.pk, moment)
 
     def get_balance_display(self):
         """Возвращает отформатированный баланс для отображения"""
@@ -187,3 +199,64 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+
+
+class BalanceEntry(models.Model):
+    """Запись журнала начислений сотрудника. Записи только добавляются"""
+
+    class Kind(models.TextChoices):
+        OPENING = 'opening', 'Начальный остаток'
+        TASK_EARNINGS = 'task_earnings', 'Заработок по задаче'
+        PENALTY = 'penalty', 'Штраф за брак'
+        ATTENDANCE_FINE = 'attendance_fine', 'Штраф за опоздание'
+        PAYOUT = 'payout', 'Выплата'
+        ADJUSTMENT = 'adjustment', 'Корректировка'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='balance_entries',
+        verbose_name='Сотрудник'
+    )
+    kind = models.CharField('Тип', max_length=20, choices=Kind.choices)
+    amount = models.DecimalField('Сумма', max_digits=12, decimal_places=2)
+    # Источник записи: task:<id>, attendance:<id>; пусто для ручных операций
+    source = models.CharField('Источник', max_length=50, blank=True, db_index=True)
+    comment = models.CharField('Комментарий', max_length=255, blank=True)
+    created_at = models.DateTimeField('Дата', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Запись журнала начислений'
+        verbose_name_plural = 'Журнал начислений'
+        ordering = ['-created_at', '-pk']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='users_entry_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.get_kind_display()} {self.amount}"
+
+
+class BalanceSnapshot(models.Model):
+    """Баланс сотрудника на начало дня period_end: учтены все записи журнала до этой даты"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+        verbose_name='Сотрудник'
+    )
+    period_end = models.DateField('Граница периода')
+    balance = models.DecimalField('Баланс', max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Снимок баланса'
+        verbose_name_plural = 'Снимки баланса'
+        ordering = ['-period_end']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period_end'], name='users_snapshot_user_period_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} на {self.period_end}"
@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.attendance.models import AttendanceRecord
+
+from . import ledger
+from .models import BalanceEntry
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def post_attendance_fine(sender, instance, **kwargs):
+    """Проводит штраф за опоздание через журнал начислений (LEDGER_ATTENDANCE_FINES).
+
+    Записывается разница с уже проведённой по этой отметке суммой, поэтому
+    пересчёт штрафа не удваивает списание.
+    """
+    if not getattr(settings, 'LEDGER_ATTENDANCE_FINES', False):
+        return
+    source = f'attendance:{instance.pk}'
+    posted = BalanceEntry.objects.filter(source=source).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    fine = Decimal(str(instance.penalty_amount or 0))
+    ledger.post(instance.employee_id, BalanceEntry.Kind.ATTENDANCE_FINE, -fine - posted, source=source)
@@ -0,0 +1,14 @@
+from celery import shared_task
+from django.utils import timezone
+
+from .ledger import month_start, take_snapshots
+from .models import BalanceSnapshot
+
+
+@shared_task
+def snapshot_balances():
+    """Снимает балансы на начало текущего месяца, если снимка ещё нет"""
+    period_end = month_start(timezone.localdate())
+    if BalanceSnapshot.objects.filter(period_end=period_end).exists():
+        return 0
+    return take_snapshots(period_end)
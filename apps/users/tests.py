@@ -1,3 +1,99 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.attendance.models import AttendanceRecord
+
+from . import ledger
+from .models import BalanceEntry, BalanceSnapshot, User
+
+
+def _moment(year, month, day, hour=12):
+    return timezone.make_aware(datetime(year, month, day, hour))
+
+
+class BalanceLedgerTest(TestCase):
+    """Журнал начислений, снимки и проекция User.balance"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='worker', password='testpass123')
+        self.other = User.objects.create_user(username='worker2', password='testpass123')
+
+    def _post(self, user, kind, amount, when):
+        item = ledger.post(user.pk, kind, amount)
+        # Записи прошлых месяцев: переносим дату проведения
+        BalanceEntry.objects.filter(pk=item.pk).update(created_at=when)
+        return item
+
+    def test_balance_operations_write_entries(self):
+        self.assertEqual(self.user.add_to_balance(100), Decimal('100'))
+        self.assertEqual(self.user.subtract_from_balance(30, comment='Аванс'), Decimal('70'))
+        with self.assertRaises(ValueError):
+            self.user.subtract_from_balance(500)
+
+        kinds = list(BalanceEntry.objects.filter(user=self.user).order_by('pk').values_list('kind', 'amount'))
+        self.assertEqual(kinds, [
+            (BalanceEntry.Kind.ADJUSTMENT, Decimal('100')),
+            (BalanceEntry.Kind.PAYOUT, Decimal('-30')),
+        ])
+        # Нулевые записи не создаются
+        self.assertIsNone(ledger.post(self.user.pk, BalanceEntry.Kind.ADJUSTMENT, 0))
+
+    def test_balance_as_of_uses_last_snapshot(self):
+        self._post(self.user, BalanceEntry.Kind.TASK_EARNINGS, 100, _moment(2026, 1, 10))
+        self._post(self.user, BalanceEntry.Kind.PENALTY, -20, _moment(2026, 1, 20))
+        self._post(self.other, BalanceEntry.Kind.TASK_EARNINGS, 50, _moment(2026, 1, 15))
+        self._post(self.user, BalanceEntry.Kind.PAYOUT, -30, _moment(2026, 2, 5))
+
+        self.assertEqual(ledger.take_snapshots(date(2026, 2, 1)), 2)
+        self.assertEqual(
+            BalanceSnapshot.objects.get(user=self.user, period_end=date(2026, 2, 1)).balance,
+            Decimal('80'),
+        )
+        # Записи до снимка больше не читаются: баланс считается от снимка
+        BalanceEntry.objects.filter(created_at__lt=_moment(2026, 2, 1, 0)).delete()
+
+        self.assertEqual(ledger.balance_as_of(self.user.pk, _moment(2026, 2, 10)), Decimal('50'))
+        self.assertEqual(self.user.balance_as_of(date(2026, 2, 1)), Decimal('80'))
+        self.assertEqual(ledger.balance_as_of(self.other.pk, _moment(2026, 3, 1)), Decimal('50'))
+
+    def test_snapshot_in_future_rejected(self):
+        with self.assertRaises(ValueError):
+            ledger.take_snapshots(timezone.localdate().replace(year=timezone.localdate().year + 1))
+
+    def test_period_report(self):
+        self._post(self.user, BalanceEntry.Kind.TASK_EARNINGS, 100, _moment(2026, 1, 10))
+        self._post(self.user, BalanceEntry.Kind.TASK_EARNINGS, 40, _moment(2026, 2, 3))
+        self._post(self.user, BalanceEntry.Kind.PENALTY, -5, _moment(2026, 2, 4))
+        self._post(self.user, BalanceEntry.Kind.PAYOUT, -60, _moment(2026, 2, 28))
+        self._post(self.user, BalanceEntry.Kind.PAYOUT, -10, _moment(2026, 3, 2))
+
+        report = ledger.period_report(date(2026, 2, 1), date(2026, 3, 1))
+        self.assertEqual(report[self.user.pk], {
+            'opening': Decimal('100'),
+            BalanceEntry.Kind.TASK_EARNINGS: Decimal('40'),
+            BalanceEntry.Kind.PENALTY: Decimal('-5'),
+            BalanceEntry.Kind.PAYOUT: Decimal('-60'),
+            'closing': Decimal('75'),
+        })
+
+    def test_rebuild_balance_restores_projection(self):
+        self.user.add_to_balance(100)
+        User.objects.filter(pk=self.user.pk).update(balance=Decimal('999'))
+        self.assertEqual(ledger.rebuild_balance(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('100'))
+        self.assertEqual(ledger.rebuild_balance(), 0)
+
+    @override_settings(LEDGER_ATTENDANCE_FINES=True)
+    def test_attendance_fine_posted_once(self):
+        record = AttendanceRecord.objects.create(
+            employee=self.user,
+            check_in=timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time().replace(hour=10))),
+        )
+        record.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('-500'))
+        self.assertEqual(BalanceEntry.objects.filter(source=f'attendance:{record.pk}').count(), 1)
@@ -3,7 +3,6 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
 from apps.operations.workshops.models import Workshop
-from apps.employee_tasks.models import EmployeeTask
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import timedelta
@@ -199,18 +198,26 @@ class MasterWorkshopsStatsView(APIView):
         # Убираем дубликаты
         master_workshops = list(set(master_workshops))
         
-        # Периоды для статистики
-        now = timezone.now()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
+        # Периоды для статистики (по дням дневной сводки)
+        today = timezone.localdate()
+        week_ago = today - timedelta(days=7)
+        month_ago = today - timedelta(days=30)
+        
+        workshop_ids = [w.id for w in master_workshops]
+        facts = self._collect_facts(workshop_ids, week_ago, month_ago)
+        employees = dict(
+            User.objects.filter(workshop_id__in=workshop_ids)
+            .values('workshop_id').annotate(total=Count('id'))
+            .values_list('workshop_id', 'total')
+        )
         
         # Общая статистика по всем цехам мастера
-        total_stats = self._calculate_total_stats(master_workshops, week_ago, month_ago)
+        total_stats = self._calculate_total_stats(master_workshops, facts, employees)
         
         # Статистика по каждому цеху
         workshops_stats = []
         for workshop in master_workshops:
-            workshop_stats = self._calculate_workshop_stats(workshop, week_ago, month_ago)
+            workshop_stats = self._calculate_workshop_stats(workshop, facts, employees)
             workshops_stats.append(workshop_stats)
         
         return Response({
@@ -218,56 +225,46 @@ class MasterWorkshopsStatsView(APIView):
             'workshops': workshops_stats
         })
     
-    def _calculate_total_stats(self, workshops, week_ago, month_ago):
-        """Рассчитывает общую статистику по всем цехам мастера"""
-        # Получаем все задачи по цехам мастера
-        workshop_ids = [w.id for w in workshops]
-        all_tasks = EmployeeTask.objects.filter(stage__workshop_id__in=workshop_ids)
-        
-        # Статистика за неделю
-        week_tasks = all_tasks.filter(created_at__gte=week_ago)
-        week_completed = week_tasks.aggregate(
-            total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
-        )
-        
-        # Статистика за месяц
-        month_tasks = all_tasks.filter(created_at__gte=month_ago)
-        month_completed = month_tasks.aggregate(
-            total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
-        )
-        
-        # Общая статистика
-        total_completed = all_tasks.aggregate(
+    def _collect_facts(self, workshop_ids, week_ago, month_ago):
+        """Суммы по задачам цехов за неделю, месяц и всё время — один запрос к дневной сводке"""
+        from apps.odashboard.models import DailyProductionFact
+        rows = DailyProductionFact.objects.filter(
+            source=DailyProductionFact.SOURCE_TASK,
+            workshop_id__in=workshop_ids,
+        ).values('workshop_id').annotate(
+            week_total=Sum('completed_quantity', filter=Q(date__gte=week_ago)),
+            week_defects=Sum('defective_quantity', filter=Q(date__gte=week_ago)),
+            month_total=Sum('completed_quantity', filter=Q(date__gte=month_ago)),
+            month_defects=Sum('defective_quantity', filter=Q(date__gte=month_ago)),
             total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
+            defects=Sum('defective_quantity'),
+            quantity=Sum('assigned_quantity'),
         )
-        
-        # Количество сотрудников
-        total_employees = sum(w.users.count() for w in workshops)
+        return {
+            row['workshop_id']: {key: value or 0 for key, value in row.items() if key != 'workshop_id'}
+            for row in rows
+        }
+    
+    def _build_stats(self, stats):
+        total_completed_quantity = stats.get('total', 0)
+        total_defects = stats.get('defects', 0)
+        total_quantity = stats.get('quantity', 0)
         
         # Эффективность (процент выполненных задач без брака)
-        total_quantity = all_tasks.aggregate(total=Sum('quantity'))['total'] or 0
-        total_completed_quantity = total_completed['total'] or 0
-        total_defects = total_completed['defects'] or 0
-        
         efficiency = 0
         if total_quantity > 0:
             efficiency = round(((total_completed_quantity - total_defects) / total_quantity) * 100, 1)
         
         return {
-            'total_workshops': len(workshops),
-            'total_employees': total_employees,
             'week_stats': {
-                'completed_works': week_completed['total'] or 0,
-                'defects': week_completed['defects'] or 0,
-                'efficiency': self._calculate_efficiency(week_completed['total'] or 0, week_completed['defects'] or 0)
+                'completed_works': stats.get('week_total', 0),
+                'defects': stats.get('week_defects', 0),
+                'efficiency': self._calculate_efficiency(stats.get('week_total', 0), stats.get('week_defects', 0))
             },
             'month_stats': {
-                'completed_works': month_completed['total'] or 0,
-                'defects': month_completed['defects'] or 0,
-                'efficiency': self._calculate_efficiency(month_completed['total'] or 0, month_completed['defects'] or 0)
+                'completed_works': stats.get('month_total', 0),
+                'defects': stats.get('month_defects', 0),
+                'efficiency': self._calculate_efficiency(stats.get('month_total', 0), stats.get('month_defects', 0))
             },
             'total_stats': {
                 'completed_works': total_completed_quantity,
@@ -276,63 +273,27 @@ class MasterWorkshopsStatsView(APIView):
             }
         }
     
-    def _calculate_workshop_stats(self, workshop, week_ago, month_ago):
-        """Рассчитывает статистику по конкретному цеху"""
-        # Получаем задачи цеха
-        workshop_tasks = EmployeeTask.objects.filter(stage__workshop=workshop)
-        
-        # Статистика за неделю
-        week_tasks = workshop_tasks.filter(created_at__gte=week_ago)
-        week_completed = week_tasks.aggregate(
-            total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
-        )
-        
-        # Статистика за месяц
-        month_tasks = workshop_tasks.filter(created_at__gte=month_ago)
-        month_completed = month_tasks.aggregate(
-            total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
-        )
-        
-        # Общая статистика
-        total_completed = workshop_tasks.aggregate(
-            total=Sum('completed_quantity'),
-            defects=Sum('defective_quantity')
-        )
-        
-        # Количество сотрудников
-        employees_count = workshop.users.count()
-        
-        # Эффективность
-        total_quantity = workshop_tasks.aggregate(total=Sum('quantity'))['total'] or 0
-        total_completed_quantity = total_completed['total'] or 0
-        total_defects = total_completed['defects'] or 0
-        
-        efficiency = 0
-        if total_quantity > 0:
-            efficiency = round(((total_completed_quantity - total_defects) / total_quantity) * 100, 1)
+    def _calculate_total_stats(self, workshops, facts, employees):
+        """Рассчитывает общую статистику по всем цехам мастера"""
+        totals = {}
+        for workshop in workshops:
+            for key, value in facts.get(workshop.id, {}).items():
+                totals[key] = totals.get(key, 0) + value
         
+        return {
+            'total_workshops': len(workshops),
+            'total_employees': sum(employees.get(w.id, 0) for w in workshops),
+            **self._build_stats(totals),
+        }
+    
+    def _calculate_workshop_stats(self, workshop, facts, employees):
+        """Рассчитывает статистику по конкретному цеху"""
         return {
             'id': workshop.id,
             'name': workshop.name,
             'description': workshop.description,
-            'employees_count': employees_count,
-            'week_stats': {
-                'completed_works': week_completed['total'] or 0,
-                'defects': week_completed['defects'] or 0,
-                'efficiency': self._calculate_efficiency(week_completed['total'] or 0, week_completed['defects'] or 0)
-            },
-            'month_stats': {
-                'completed_works': month_completed['total'] or 0,
-                'defects': month_completed['defects'] or 0,
-                'efficiency': self._calculate_efficiency(month_completed['total'] or 0, month_completed['defects'] or 0)
-            },
-            'total_stats': {
-                'completed_works': total_completed_quantity,
-                'defects': total_defects,
-                'efficiency': efficiency
-            }
+            'employees_count': employees.get(workshop.id, 0),
+            **self._build_stats(facts.get(workshop.id, {})),
         }
     
     def _calculate_efficiency(self, completed, defects):
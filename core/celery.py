@@ -45,6 +45,8 @@ app.conf.update(
         'apps.defects.tasks.*': {'queue': 'defects'},
         'apps.employee_tasks.tasks.*': {'queue': 'tasks'},
         'apps.inventory.tasks.*': {'queue': 'inventory'},
+        'apps.exports.tasks.*': {'queue': 'exports'},
+        'apps.notifications.tasks.*': {'queue': 'notifications'},
     },
     
     # Queue configuration
@@ -74,6 +76,14 @@ app.conf.update(
             'exchange': 'inventory',
             'routing_key': 'inventory',
         },
+        'exports': {
+            'exchange': 'exports',
+            'routing_key': 'exports',
+        },
+        'notifications': {
+            'exchange': 'notifications',
+            'routing_key': 'notifications',
+        },
     },
     
     # Task execution settings
@@ -108,6 +118,30 @@ app.conf.update(
             'task': 'apps.attendance.tasks.auto_checkout_after_6pm',
             'schedule': 3600.0,  # Every hour (will check if it's after 6pm)
         },
+        'backfill-production-facts': {
+            'task': 'apps.odashboard.tasks.backfill_production_facts',
+            'schedule': 86400.0,  # Daily
+        },
+        'cleanup-old-exports': {
+            'task': 'apps.exports.tasks.cleanup_old_exports',
+            'schedule': 86400.0,  # Daily
+        },
+        'process-task-side-effects': {
+            'task': 'apps.employee_tasks.tasks.process_task_side_effects',
+            'schedule': 60.0,  # Every minute (страховка, если событие не разбудило consumer)
+        },
+        'snapshot-balances': {
+            'task': 'apps.users.tasks.snapshot_balances',
+            'schedule': 86400.0,  # Daily (снимок на первое число месяца, если его ещё нет)
+        },
+        'reconcile-unread-counters': {
+            'task': 'apps.notifications.tasks.reconcile_unread_counters',
+            'schedule': 600.0,  # Every 10 minutes (сверка счётчиков непрочитанных с базой)
+        },
+        'retry-stalled-deliveries': {
+            'task': 'apps.notifications.tasks.retry_stalled_deliveries',
+            'schedule': 300.0,  # Every 5 minutes (страховка, если задача доставки потерялась)
+        },
         'cleanup-old-attendance': {
             'task': 'apps.attendance.tasks.cleanup_old_attendance_records',
             'schedule': 604800.0,  # Weekly
@@ -1,9 +1,18 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.conf import settings
+from django.db import connections
 from apps.users.models import User
 
+logger = logging.getLogger(__name__)
+
 
 class RoleBasedRedirectMiddleware:
     """
@@ -64,4 +73,110 @@ class AuthenticationErrorMiddleware:
             from .error_views import custom_401
             return custom_401(request)
         
-        return response 
\ No newline at end of file
+        return response
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос превысил бюджет SQL-запросов (поднимается при QUERY_BUDGET_RAISE = True)"""
+
+
+class QueryTracker:
+    """
+    Обёртка для connection.execute_wrapper: считает запросы, время БД
+    и повторы одинаковых по форме SQL (признак N+1).
+    """
+
+    _literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+    _in_lists = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[self.shape(sql)] += 1
+
+    @classmethod
+    def shape(cls, sql):
+        """Форма запроса: литералы и списки IN (...) заменены заглушками"""
+        sql = cls._in_lists.sub('IN (...)', sql)
+        return cls._literals.sub('?', sql)
+
+    def repeated(self, max_repeats):
+        """Формы SQL, выполненные больше max_repeats раз, по убыванию"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > max_repeats]
+
+    def violations(self, max_queries=None, max_repeats=None):
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f"{self.count} запросов при бюджете {max_queries}")
+        if max_repeats is not None:
+            for shape, n in self.repeated(max_repeats):
+                problems.append(f"N+1: {n} одинаковых запросов: {shape[:300]}")
+        return problems
+
+    def track(self):
+        """Контекст, подключающий трекер ко всем соединениям БД"""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает SQL-запросы и время БД на каждый HTTP-запрос, добавляет
+    заголовок Server-Timing и пишет в лог запросы, превысившие бюджет
+    (QUERY_BUDGET_MAX_QUERIES) или повторяющие одну форму SQL больше
+    QUERY_BUDGET_MAX_REPEATS раз. Бюджет для отдельных URL задаётся
+    префиксами в QUERY_BUDGET_PATHS. При QUERY_BUDGET_RAISE = True
+    (тесты) превышение поднимает QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', True) or self.is_exempt(request.path):
+            return self.get_response(request)
+
+        tracker = QueryTracker()
+        started = time.perf_counter()
+        with tracker.track():
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = (
+            f'db;dur={tracker.duration * 1000:.1f};desc="{tracker.count} queries", '
+            f'app;dur={total * 1000:.1f}'
+        )
+
+        problems = tracker.violations(
+            self.budget_for(request.path),
+            getattr(settings, 'QUERY_BUDGET_MAX_REPEATS', 10),
+        )
+        if problems:
+            message = f"{request.method} {request.path}: " + '; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def is_exempt(self, path):
+        return any(path.startswith(prefix) for prefix in getattr(settings, 'QUERY_BUDGET_EXEMPT_PATHS', ()))
+
+    def budget_for(self, path):
+        budget = getattr(settings, 'QUERY_BUDGET_MAX_QUERIES', 50)
+        # Самый длинный подходящий префикс
+        matched = ''
+        for prefix, value in getattr(settings, 'QUERY_BUDGET_PATHS', {}).items():
+            if path.startswith(prefix) and len(prefix) > len(matched):
+                matched, budget = prefix, value
+        return budget
@@ -64,10 +64,12 @@ INSTALLED_APPS = [
     'apps.director',
     'apps.support',
     'apps.online',
+    'apps.exports',  # фоновые выгрузки
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',  # Бюджет SQL-запросов, N+1 и Server-Timing
     'whitenoise.middleware.WhiteNoiseMiddleware',   
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -164,6 +166,92 @@ STATIC_ROOT = BASE_DIR / "staticfiles"      # куда collectstatic будет
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Бюджет SQL-запросов на HTTP-запрос (core.middleware.QueryBudgetMiddleware)
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGET_MAX_QUERIES = 50   # больше — предупреждение в лог
+QUERY_BUDGET_MAX_REPEATS = 10   # одна форма SQL больше N раз — вероятный N+1
+QUERY_BUDGET_RAISE = False      # в тестах можно включить, чтобы превышение падало исключением
+QUERY_BUDGET_PATHS = {}         # бюджеты по префиксам URL, например {'/admin/': 200}
+QUERY_BUDGET_EXEMPT_PATHS = ('/static/', '/media/')
+
+# Фоновые выгрузки (apps.exports): файлы лежат в MEDIA_ROOT/exports
+EXPORT_JOB_REUSE_TTL = 600      # сек, одинаковые параметры за это время отдают уже готовый файл
+EXPORT_FILE_RETENTION = 86400   # сек, после этого файлы удаляет cleanup_old_exports
+
+# Кэш выбора услуг для расчёта заработка (apps.services.resolver)
+SERVICE_PRICE_CACHE_TIMEOUT = 3600      # сек, срок жизни записей в Django cache
+SERVICE_PRICE_LOCAL_CACHE_SIZE = 4096   # записей в LRU процесса
+SERVICE_PRICE_LOCAL_TTL = 30            # сек, срок жизни записи LRU процесса (без общего кэша — задержка смены цены)
+SERVICE_PRICE_GENERATION_TTL = 5        # сек, как часто процесс сверяет поколение кэша
+
+# Трассировка расчёта заработка (apps.employee_tasks.tracing): доля сохранений задач от 0 до 1
+EARNINGS_TRACE_SAMPLE_RATE = 0
+
+# Браки по задачам (apps.defects): True — N единиц брака одной записью с quantity=N
+DEFECTS_GROUP_UNITS = False
+
+# Уведомления о нехватке сырья при списании (EmployeeTask.consume_materials)
+LOW_STOCK_NOTIFICATION_INTERVAL = 3600  # сек, не чаще одного уведомления по материалу
+
+# Побочные эффекты сохранения задачи (apps.employee_tasks.side_effects):
+# 'async' — через outbox и Celery, 'sync' — сразу в запросе (по умолчанию в тестах)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+EMPLOYEE_TASK_SIDE_EFFECTS = os.environ.get('EMPLOYEE_TASK_SIDE_EFFECTS', 'sync' if TESTING else 'async')
+
+# Кэш, общий для всех процессов (воркеры gunicorn, Celery): Redis из REDIS_URL (DEPLOYMENT.md).
+# Без него у каждого процесса своя память, и кэши, которые меняются на месте
+# (счётчики непрочитанных, набор присутствия, поколение цен услуг), работают от
+# базы — CACHE_SHARED = False. Тесты идут в одном процессе, им хватает памяти процесса.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+            'KEY_PREFIX': 'smart_factory',
+        }
+    }
+CACHE_SHARED = bool(REDIS_URL) or TESTING
+
+# Кэш закрытых дней графика выручки (apps.orders.charts), сбрасывается при записи источников
+REVENUE_CHART_CACHE_TIMEOUT = 3600  # сек
+
+# Кэш статистики заработка (apps.employee_tasks.stats), сбрасывается при записи задач
+EARNINGS_STATS_CACHE_TIMEOUT = 60  # сек
+
+# Активность пользователей (apps.online.tracker): запись в базу не чаще раза в интервал
+ONLINE_ACTIVITY_FLUSH_INTERVAL = 60  # сек
+# Таймер процесса сбрасывает буфер, даже если новых запросов нет (в тестах — вручную через flush)
+ONLINE_ACTIVITY_FLUSH_TIMER = not TESTING
+# Набор присутствия (apps.online.presence): 'cache' — общий для процессов, 'local' — память процесса
+ONLINE_PRESENCE_STORE = 'local' if TESTING else 'cache'
+# Поток SSE занимает воркер gunicorn на всё подключение: с синхронными воркерами
+# (gunicorn.conf.py) страница опрашивает API, поток включают только с gevent (DEPLOYMENT.md)
+ONLINE_PRESENCE_STREAM = os.environ.get('ONLINE_PRESENCE_STREAM', 'False') == 'True'
+ONLINE_PRESENCE_POLL_INTERVAL = 5  # сек, как часто поток SSE проверяет изменения
+ONLINE_PRESENCE_STREAM_DURATION = 25  # сек, меньше timeout воркера gunicorn (30), после этого клиент переподключается
+
+# Счётчики непрочитанных уведомлений (apps.notifications.counters)
+NOTIFICATIONS_UNREAD_CACHE_TIMEOUT = 86400  # сек, ключ без записей пересчитывается по базе
+# Поток SSE счётчика, как и поток присутствия, только с воркерами gevent (DEPLOYMENT.md);
+# без него дашборды запрашивают счётчик один раз при загрузке
+NOTIFICATIONS_UNREAD_STREAM = os.environ.get('NOTIFICATIONS_UNREAD_STREAM', 'False') == 'True'
+NOTIFICATIONS_UNREAD_POLL_INTERVAL = 5  # сек, как часто поток SSE проверяет счётчик
+NOTIFICATIONS_UNREAD_STREAM_DURATION = 25  # сек, меньше timeout воркера gunicorn (30), после этого клиент переподключается
+
+# Доставка уведомлений (apps.notifications.delivery): 'async' — Celery, 'sync' — сразу после коммита
+NOTIFICATION_DELIVERY = os.environ.get('NOTIFICATION_DELIVERY', 'sync' if TESTING else 'async')
+# Адаптеры каналов (apps.notifications.channels): 'live' — отправка, 'local' — в памяти, без сети
+NOTIFICATION_CHANNEL_BACKEND = 'local' if TESTING else 'live'
+NOTIFICATION_DELIVERY_BATCH_SIZE = 100  # уведомлений в одной задаче (и одном SMTP-соединении)
+NOTIFICATION_RETRY_BACKOFF = 30  # сек, задержка первого повтора, дальше удваивается
+NOTIFICATION_DELIVERY_STALE_AFTER = 900  # сек без смены статуса — запись возвращается в очередь (больше задержек повторов)
+NOTIFICATION_DELIVERY_MAX_AGE = 86400  # сек от создания уведомления, после этого зависшая запись — недоставлена
+
+# Журнал начислений (apps.users.ledger): проводить штрафы за опоздания по балансу
+LEDGER_ATTENDANCE_FINES = False
+
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 # рекомендую
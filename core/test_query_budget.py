@@ -0,0 +1,106 @@
+"""
+Бюджеты SQL-запросов: QueryBudgetMiddleware и основные API-эндпоинты
+"""
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.clients.models import Client
+from apps.operations.workshops.models import Workshop
+from apps.orders.models import Order, OrderItem, OrderStage
+from apps.products.models import Product
+from apps.users.models import User
+from .middleware import QueryBudgetExceeded, QueryTracker
+from .testing import QueryBudgetMixin
+
+
+class QueryTrackerTest(TestCase):
+
+    def test_shape_ignores_literals_and_in_lists(self):
+        self.assertEqual(
+            QueryTracker.shape("SELECT * FROM t WHERE id IN (%s, %s, %s) AND n = 'abc' AND x = 5"),
+            QueryTracker.shape("SELECT * FROM t WHERE id IN (%s) AND n = 'def' AND x = 7"),
+        )
+
+    def test_detects_repeated_queries(self):
+        tracker = QueryTracker()
+        with tracker.track():
+            for user_id in range(5):
+                list(User.objects.filter(pk=user_id))
+        self.assertEqual(tracker.count, 5)
+        self.assertEqual(len(tracker.repeated(3)), 1)
+        self.assertEqual(tracker.violations(max_queries=10, max_repeats=10), [])
+        self.assertEqual(len(tracker.violations(max_queries=3, max_repeats=3)), 2)
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='director', password='testpass123')
+        self.client.force_login(self.user)
+        self.url = reverse('orders:dashboard-revenue-chart')
+
+    def test_server_timing_header(self):
+        response = self.client.get(self.url)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('queries', response['Server-Timing'])
+
+    @override_settings(QUERY_BUDGET_MAX_QUERIES=1)
+    def test_logs_budget_violation(self):
+        with self.assertLogs('core.middleware', level='WARNING') as logs:
+            self.client.get(self.url)
+        self.assertIn(self.url, logs.output[0])
+
+    @override_settings(QUERY_BUDGET_MAX_QUERIES=1, QUERY_BUDGET_RAISE=True)
+    def test_raises_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGET_MAX_QUERIES=1, QUERY_BUDGET_PATHS={'/orders/dashboard/': 50}, QUERY_BUDGET_RAISE=True)
+    def test_path_budget_override(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class ApiQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Основные API не должны делать запросов на каждую строку"""
+
+    ORDERS = 15
+
+    def setUp(self):
+        self.workshop = Workshop.objects.create(name='Распиловка')
+        self.user = User.objects.create_user(username='master', password='testpass123', workshop=self.workshop)
+        Workshop.objects.filter(pk=self.workshop.pk).update(manager=self.user)
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(self.user)
+        client = Client.objects.create(name='Клиент')
+        door = Product.objects.create(name='Дверь', price=100)
+        for i in range(self.ORDERS):
+            order = Order.objects.create(name=f'Заказ {i}', client=client)
+            item = OrderItem.objects.create(order=order, product=door, quantity=2)
+            OrderStage.objects.create(
+                order=order, order_item=item, workshop=self.workshop, operation='Распил',
+                sequence=1, plan_quantity=2, status='in_progress',
+            )
+
+    def test_workshop_board(self):
+        with self.assertQueryBudget(15, max_repeats=3):
+            response = self.client_api.get(reverse('orders:api-orders-by-workshop'), {'workshop_id': self.workshop.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_revenue_chart(self):
+        with self.assertQueryBudget(10, max_repeats=3):
+            response = self.client_api.get(reverse('orders:dashboard-revenue-chart'), {'period': 'year'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_dashboard_overview(self):
+        self.client.force_login(self.user)
+        with self.assertQueryBudget(10, max_repeats=3):
+            response = self.client.get(reverse('workshop_dashboard_overview'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_master_workshops_stats(self):
+        with self.assertQueryBudget(10, max_repeats=3):
+            response = self.client_api.get('/api/workshops/api/master-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['workshops']), 1)
@@ -0,0 +1,22 @@
+"""
+Помощники для тестов.
+
+QueryBudgetMixin.assertQueryBudget — проверка бюджета SQL-запросов
+(общее число и повторы одной формы SQL) на блоке кода, тем же трекером,
+что и core.middleware.QueryBudgetMiddleware.
+"""
+from contextlib import contextmanager
+
+from .middleware import QueryTracker
+
+
+class QueryBudgetMixin:
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_repeats=None):
+        tracker = QueryTracker()
+        with tracker.track():
+            yield tracker
+        problems = tracker.violations(max_queries, max_repeats)
+        if problems:
+            self.fail('Превышен бюджет запросов:\n' + '\n'.join(problems))
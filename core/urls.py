@@ -56,6 +56,7 @@ urlpatterns = [
 	path('error/', custom_error, name='custom_error'),
 	path('support/', include('apps.support.urls')),
 	path('online/', include('apps.online.urls')),
+	path('exports/', include('apps.exports.urls')),
 	# Тестовые URL для проверки страниц ошибок (только для разработки)
 	path('test/error/400/', test_400_view, name='test_400'),
 	path('test/error/401/', test_401_view, name='test_401'),